@@ -0,0 +1,289 @@
+import contextlib
+import gzip
+import json
+import random
+import threading
+import time
+
+from src.python.common.graph_common import get_shared_session, set_shared_session
+from src.python.common.json_codec import dumps, loads
+from src.python.common.persisted_queries import persisted_query_hash
+
+# Keys whose values never reach a fixture file, wherever they appear in variables or responses
+SENSITIVE_KEYS = {"email", "password", "pw", "otp", "user_code", "token", "access_token", "refresh_token",
+                  "collection_token", "lightlytics_collection_token", "flow_logs_token", "secret", "api_key"}
+SCRUBBED = "***"
+# Variables that select a page; with paginate=True they are left out of the key and served by slicing
+PAGINATION_VARIABLES = ("skip", "limit")
+FIXTURE_FORMAT = 1
+
+
+def scrub(value):
+    """ Replace the values of SENSITIVE_KEYS, recursively.
+        :param value (object)   - Decoded JSON.
+        :returns (object)       - A scrubbed copy.
+    """
+    if isinstance(value, dict):
+        return {key: SCRUBBED if key in SENSITIVE_KEYS and item is not None else scrub(item)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [scrub(item) for item in value]
+    return value
+
+
+def request_key(payload, paginate=False):
+    """ Build the key a request is recorded and replayed under.
+        :param payload (dict)   - The request payload; persisted queries are keyed by their hash like full ones.
+        :param paginate (bool)  - Leave the PAGINATION_VARIABLES out.
+        :returns (str)          - The key.
+    """
+    query = payload.get("query")
+    if query:
+        query_hash = persisted_query_hash(query)
+    else:
+        query_hash = ((payload.get("extensions") or {}).get("persistedQuery") or {}).get("sha256Hash")
+    variables = scrub(payload.get("variables") or {})
+    if paginate:
+        variables = {key: value for key, value in variables.items() if key not in PAGINATION_VARIABLES}
+    return json.dumps([payload.get("operationName"), query_hash, variables], sort_keys=True, default=str)
+
+
+def _request_payload(json_payload, data, headers):
+    # GraphCommon sends gzipped bytes when compress_requests is on
+    if json_payload is not None:
+        return json_payload
+    if (headers or {}).get("Content-Encoding") == "gzip":
+        data = gzip.decompress(data)
+    return loads(data)
+
+
+def load_fixture(path):
+    """ Read a fixture file.
+        :param path (str)   - Path of a gzipped JSON lines fixture, as written by GraphRecorder.save().
+        :returns (list)     - Exchanges, dicts with "request", "status_code" and "response".
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as fixture:
+        lines = [json.loads(line) for line in fixture if line.strip()]
+    if lines and lines[0].get("format") == FIXTURE_FORMAT:
+        lines = lines[1:]
+    return lines
+
+
+class GraphRecorder:
+    def __init__(self, session, path=None):
+        """ Session wrapper recording GraphQL request/response pairs for ReplaySession.
+            Credentials and tokens are scrubbed before they are kept, headers aren't kept at all.
+            :param session (Session)    - The session sending the requests.
+            :param path (str)           - Fixture file written by save(); Defaults to none, see exchanges.
+        """
+        self.session = session
+        self.path = path
+        self.exchanges = []
+        self._lock = threading.Lock()
+
+    def post(self, url, json=None, data=None, headers=None, stream=False, **kwargs):
+        res = self.session.post(url, json=json, data=data, headers=headers, stream=stream, **kwargs)
+        payload = _request_payload(json, data, headers)
+        try:
+            # A streamed body is read here, the caller reads it again from the copy cached on the response
+            response = loads(res.content)
+        except ValueError:
+            response = {"raw": res.text}
+        exchange = {"request": scrub({key: payload.get(key) for key in ("operationName", "variables", "query")}),
+                    "extensions": payload.get("extensions"), "status_code": res.status_code,
+                    "response": scrub(response)}
+        with self._lock:
+            self.exchanges.append(exchange)
+        return res
+
+    def save(self, path=None):
+        """ Write the recorded exchanges.
+            :param path (str)   - Fixture file; Defaults to the recorder's path.
+            :returns (str)      - The path written.
+        """
+        path = path or self.path
+        with self._lock:
+            exchanges = list(self.exchanges)
+        with gzip.open(path, "wt", encoding="utf-8") as fixture:
+            fixture.write(json.dumps({"format": FIXTURE_FORMAT, "recorded_at": time.time()}) + "\n")
+            for exchange in exchanges:
+                fixture.write(json.dumps(exchange, default=str) + "\n")
+        return path
+
+    def close(self):
+        self.session.close()
+
+
+def _collection_name(response):
+    """ Get the field under "data" of a paginated response, the one with "results"; None if there isn't just one. """
+    names = [name for name, value in ((response or {}).get("data") or {}).items()
+             if isinstance(value, dict) and isinstance(value.get("results"), list)]
+    return names[0] if len(names) == 1 else None
+
+
+def _merge_pages(exchanges):
+    """ Merge the recorded pages of one paginated request into a single exchange holding all of its results,
+        so any skip/limit can be sliced out of it. Other exchanges are returned as they are.
+    """
+    pages = [exchange for exchange in exchanges if exchange["status_code"] < 400
+             and "skip" in (exchange["request"].get("variables") or {})
+             and _collection_name(exchange["response"]) is not None]
+    if len(pages) != len(exchanges) or not pages:
+        return exchanges
+    # Pages fetched concurrently are recorded in completion order
+    pages.sort(key=lambda exchange: exchange["request"]["variables"]["skip"] or 0)
+    name = _collection_name(pages[0]["response"])
+    results, offset = [], pages[0]["request"]["variables"]["skip"] or 0
+    for page in pages:
+        skip = page["request"]["variables"]["skip"] or 0
+        page_results = page["response"]["data"][name]["results"]
+        results.extend(page_results[max(0, offset - skip):])
+        offset = max(offset, skip + len(page_results))
+    merged = dict(pages[0]["response"]["data"][name], results=results)
+    return [dict(pages[0], response=dict(pages[0]["response"], data=dict(pages[0]["response"]["data"],
+                                                                          **{name: merged})))]
+
+
+class ReplayResponse:
+    def __init__(self, status_code, content, headers=None):
+        """ The parts of requests.Response that GraphCommon reads. """
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.request = None
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def __bool__(self):
+        return self.status_code < 400
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+class ReplaySession:
+    def __init__(self, exchanges, latency=0.0, error_rate=0.0, error_status=503, paginate=True, max_page_size=None,
+                 seed=0):
+        """ Session serving recorded GraphQL responses, for offline runs of the exporters.
+            Identical requests get their recorded responses in order, the last one repeating.
+            :param exchanges (list/str)     - Exchanges, or the path of a fixture to load them from.
+            :param latency (float/func)     - Seconds added to each response, or a function of the operationName
+                                              returning them.
+            :param error_rate (float)       - Share of requests answered with error_status instead, at random.
+            :param error_status (int)       - HTTP status of the injected errors.
+            :param paginate (bool)          - Serve any skip/limit page out of a recorded response to the same
+                                              request, e.g. one recorded with a single large page.
+            :param max_page_size (int)      - Cap pages at this many results, like a server enforcing a max limit.
+            :param seed (int)               - Seed of the injected errors, for repeatable runs.
+        """
+        if isinstance(exchanges, str):
+            exchanges = load_fixture(exchanges)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.paginate = paginate
+        self.max_page_size = max_page_size
+        self.requests = 0
+        self.injected_errors = 0
+        self._random = random.Random(seed)
+        self._responses = {}
+        self._served = {}
+        self._lock = threading.Lock()
+        for exchange in exchanges:
+            payload = dict(exchange["request"], extensions=exchange.get("extensions"))
+            self._responses.setdefault(request_key(payload, paginate), []).append(exchange)
+        if paginate:
+            self._responses = {key: _merge_pages(recorded) for key, recorded in self._responses.items()}
+
+    def post(self, url, json=None, data=None, headers=None, **kwargs):
+        payload = _request_payload(json, data, headers)
+        key = request_key(payload, self.paginate)
+        with self._lock:
+            self.requests += 1
+            inject_error = self.error_rate and self._random.random() < self.error_rate
+            self.injected_errors += bool(inject_error)
+            recorded = self._responses.get(key)
+            if recorded:
+                index = self._served.get(key, 0)
+                self._served[key] = index + 1
+                exchange = recorded[min(index, len(recorded) - 1)]
+        latency = self.latency(payload.get("operationName")) if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+        if inject_error:
+            return ReplayResponse(self.error_status, b'{"errors": [{"message": "Injected error"}]}')
+        if not recorded:
+            body = {"errors": [{"message": f"No recorded response for {payload.get('operationName')}",
+                                "extensions": {"code": "NOT_RECORDED"}}]}
+            return ReplayResponse(404, dumps(body))
+        response = exchange["response"]
+        if self.paginate:
+            response = self._page(response, payload.get("variables") or {})
+        return ReplayResponse(exchange["status_code"], dumps(response))
+
+    def _page(self, response, variables):
+        """ Slice the "results" of a recorded paginated response to the requested skip/limit. """
+        if "skip" not in variables and "limit" not in variables:
+            return response
+        name = _collection_name(response)
+        if name is None:
+            return response
+        skip = variables.get("skip") or 0
+        limit = variables.get("limit")
+        if self.max_page_size is not None:
+            limit = self.max_page_size if limit is None else min(limit, self.max_page_size)
+        collection = response["data"][name]
+        results = collection["results"][skip:None if limit is None else skip + limit]
+        return dict(response, data=dict(response["data"], **{name: dict(collection, results=results)}))
+
+    def close(self):
+        pass
+
+
+def graph_url(environment, stage=False):
+    """ Get the GraphQL url get_graph_client uses for an environment.
+        :param environment (str)    - Environment sub domain.
+        :param stage (bool)         - Stage environment.
+        :returns (str)              - The url.
+    """
+    return f"https://{environment}.{'lightops' if stage else 'streamsec'}.io/graphql"
+
+
+@contextlib.contextmanager
+def recording(url, path):
+    """ Record the traffic of every client of an environment created within the block, to a fixture file.
+        :param url (str)    - The url of the environment, see graph_url.
+        :param path (str)   - Fixture file written when the block exits.
+        :returns (GraphRecorder) - The recorder.
+    """
+    session = get_shared_session(url)
+    recorder = GraphRecorder(session, path)
+    set_shared_session(url, recorder)
+    try:
+        yield recorder
+    finally:
+        set_shared_session(url, session)
+        recorder.save()
+
+
+@contextlib.contextmanager
+def replaying(url, exchanges, **kwargs):
+    """ Serve every client of an environment created within the block from recorded responses.
+        :param url (str)            - The url of the environment, see graph_url.
+        :param exchanges (list/str) - Exchanges, or the path of a fixture.
+        :param kwargs               - ReplaySession options: latency, error_rate, paginate...
+        :returns (ReplaySession)    - The replaying session.
+    """
+    session = get_shared_session(url)
+    replay = ReplaySession(exchanges, **kwargs)
+    set_shared_session(url, replay)
+    try:
+        yield replay
+    finally:
+        set_shared_session(url, session)
@@ -0,0 +1,209 @@
+#!/usr/bin/python
+""" Local stand-in for the Stream GraphQL API, answering the queries of GraphCommon from a synthetic workspace.
+
+    python benchmarks/graph_standin.py --port 8808 --resources 1000000 --accounts 5000 --detections 500000
+
+Point the utilities at it with STREAM_GRAPHQL_URL=http://127.0.0.1:8808/graphql; any credentials log in.
+"""
+import argparse
+import collections
+import gzip
+import http.server
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from graphql_lite import GraphQLError, execute
+from src.python.common.json_codec import dumps, loads
+from src.python.common.persisted_queries import PersistedQueryStore
+from synthetic_workspace import SyntheticWorkspace, build_resolvers
+
+# Responses smaller than this aren't worth compressing
+GZIP_MIN_BYTES = 1024
+# Operations answered without an Authorization header when require_auth is on
+LOGIN_OPERATIONS = ("Login",)
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        """ Rate limit of the stand-in.
+            :param rate (float)     - Requests per second.
+            :param burst (int)      - Requests allowed at once; Defaults to one second's worth.
+        """
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """ Take a token.
+            :returns (float)    - 0 if one was available, else seconds until there is one.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class StandInServer:
+    def __init__(self, workspace=None, host="127.0.0.1", port=0, latency=0.0, rate_limit=None, error_rate=0.0,
+                 error_status=503, seed=0, require_auth=True, token_ttl=3600):
+        """ Stand-in GraphQL server, run in a background thread.
+            :param workspace (SyntheticWorkspace)   - Data it serves; Defaults to a small SyntheticWorkspace.
+            :param host (str)                       - Interface to listen on.
+            :param port (int)                       - Port to listen on; Defaults to any free one, see url.
+            :param latency (float/func)             - Seconds added to each response, or a function of the
+                                                      operationName returning them.
+            :param rate_limit (float)               - Requests per second answered, the rest get 429 with
+                                                      Retry-After; Defaults to no limit.
+            :param error_rate (float)               - Share of requests answered with error_status, at random.
+            :param error_status (int)               - HTTP status of the injected errors.
+            :param seed (int)                       - Seed of the injected errors.
+            :param require_auth (bool)              - Answer UNAUTHENTICATED to requests without a token.
+            :param token_ttl (int)                  - Seconds the issued tokens are valid for.
+        """
+        self.workspace = workspace or SyntheticWorkspace()
+        self.resolvers = build_resolvers(self.workspace)
+        self.latency = latency
+        self.limiter = TokenBucket(rate_limit) if rate_limit else None
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.require_auth = require_auth
+        self.token_ttl = token_ttl
+        self.persisted_queries = PersistedQueryStore()
+        self.stats = collections.Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = http.server.ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/graphql"
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def handle(self, body, headers):
+        """ Answer one POST to /graphql.
+            :param body (bytes)     - Request body, gzipped if headers say so.
+            :param headers (dict)   - Request headers.
+            :returns (tuple)        - (HTTP status, response dict, extra response headers).
+        """
+        with self._lock:
+            inject_error = self.error_rate and self._random.random() < self.error_rate
+        wait = self.limiter.take() if self.limiter else 0
+        if wait:
+            self._count("throttled")
+            return 429, {"errors": [{"message": "Too many requests"}]}, {"Retry-After": f"{max(1, round(wait))}"}
+        if inject_error:
+            self._count("injected_errors")
+            return self.error_status, {"errors": [{"message": "Injected error"}]}, {}
+        try:
+            if headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            payload = loads(body)
+        except (OSError, ValueError):
+            return 400, {"errors": [{"message": "Invalid JSON body"}]}, {}
+        operation = payload.get("operationName")
+        self._count(operation)
+        latency = self.latency(operation) if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+        query, error_response = self.persisted_queries.resolve(payload)
+        if error_response is not None:
+            return 200, error_response, {}
+        if not query:
+            return 400, {"errors": [{"message": "Must provide query string."}]}, {}
+        if self.require_auth and not headers.get("Authorization") and operation not in LOGIN_OPERATIONS:
+            return 200, {"errors": [GraphQLError("You must be logged in", "UNAUTHENTICATED").to_dict()]}, {}
+        response = execute(query, self.resolvers, payload.get("variables"), operation,
+                           context={"token_ttl": self.token_ttl, "customer": headers.get("customer")})
+        return 200, response, {}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                status, response, extra_headers = server.handle(body, self.headers)
+                content = dumps(response)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                if len(content) >= GZIP_MIN_BYTES and "gzip" in (self.headers.get("Accept-Encoding") or ""):
+                    content = gzip.compress(content, compresslevel=1)
+                    self.send_header("Content-Encoding", "gzip")
+                for name, value in extra_headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """ Serve in a background thread.
+            :returns (StandInServer)    - The server.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main(args):
+    workspace = SyntheticWorkspace(resources=args.resources, accounts=args.accounts, detections=args.detections,
+                                   flow_logs=args.flow_logs, seed=args.seed)
+    server = StandInServer(workspace, host=args.host, port=args.port, latency=args.latency,
+                           rate_limit=args.rate_limit, error_rate=args.error_rate, seed=args.seed)
+    print(f"Serving {args.resources} resources in {args.accounts} accounts at {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+        print(dict(server.stats))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local stand-in for the Stream GraphQL API.')
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8808)
+    parser.add_argument("--resources", type=int, default=10000)
+    parser.add_argument("--accounts", type=int, default=20)
+    parser.add_argument("--detections", type=int, default=5000)
+    parser.add_argument("--flow-logs", type=int, default=10000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to each response")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Requests per second answered")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests failing with 503")
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
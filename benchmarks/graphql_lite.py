@@ -0,0 +1,291 @@
+import collections
+import re
+
+# Just enough of GraphQL for the stand-in server to answer the documents GraphCommon sends: operations with
+# variables, aliases, arguments, fragments and @include/@skip. No schema, types or validation.
+Field = collections.namedtuple("Field", "alias name arguments directives selections")
+FragmentSpread = collections.namedtuple("FragmentSpread", "name directives")
+InlineFragment = collections.namedtuple("InlineFragment", "type_condition directives selections")
+Operation = collections.namedtuple("Operation", "kind name selections")
+Variable = collections.namedtuple("Variable", "name")
+
+_TOKEN = re.compile(r'(?P<ignored>[\s,]+|#[^\n]*)|(?P<spread>\.\.\.)|(?P<punct>[!$&():=@\[\]{}|])'
+                    r'|(?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)|(?P<name>[_A-Za-z][_0-9A-Za-z]*)'
+                    r'|(?P<string>"(?:\\.|[^"\\])*")')
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class GraphQLError(Exception):
+    def __init__(self, message, code=None):
+        """ A failure reported in the "errors" of the response.
+            :param message (str)    - Error message.
+            :param code (str)       - extensions.code, e.g. "UNAUTHENTICATED".
+        """
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+    def to_dict(self, path=None):
+        error = {"message": self.message}
+        if path:
+            error["path"] = path
+        if self.code:
+            error["extensions"] = {"code": self.code}
+        return error
+
+
+def _tokenize(document):
+    tokens, position = [], 0
+    while position < len(document):
+        match = _TOKEN.match(document, position)
+        if match is None:
+            raise GraphQLError(f"Syntax Error: Unexpected character {document[position]!r} at {position}",
+                               "GRAPHQL_PARSE_FAILED")
+        position = match.end()
+        if match.lastgroup != "ignored":
+            tokens.append((match.lastgroup, match.group()))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, document):
+        self.tokens = _tokenize(document)
+        self.position = 0
+
+    def peek(self, value=None):
+        if self.position >= len(self.tokens):
+            return None
+        token = self.tokens[self.position]
+        return token if value is None or token[1] == value else None
+
+    def take(self, value=None, kind=None):
+        token = self.peek()
+        if token is None or (value is not None and token[1] != value) or (kind is not None and token[0] != kind):
+            raise GraphQLError(f"Syntax Error: Expected {value or kind}, found {token[1] if token else '<EOF>'}",
+                               "GRAPHQL_PARSE_FAILED")
+        self.position += 1
+        return token[1]
+
+    def document(self):
+        operations, fragments = [], {}
+        while self.peek():
+            if self.peek("{"):
+                operations.append(Operation("query", None, self.selection_set()))
+            elif self.peek("fragment"):
+                self.take()
+                name = self.take(kind="name")
+                self.take("on")
+                self.take(kind="name")
+                self.directives()
+                fragments[name] = self.selection_set()
+            else:
+                kind = self.take(kind="name")
+                if kind not in ("query", "mutation", "subscription"):
+                    raise GraphQLError(f"Syntax Error: Unexpected {kind}", "GRAPHQL_PARSE_FAILED")
+                name = self.take(kind="name") if self.peek() and self.peek()[0] == "name" else None
+                if self.peek("("):
+                    self.variable_definitions()
+                self.directives()
+                operations.append(Operation(kind, name, self.selection_set()))
+        return operations, fragments
+
+    def variable_definitions(self):
+        # Types aren't checked, defaults are the only part that matters
+        self.take("(")
+        while not self.peek(")"):
+            self.take("$")
+            self.take(kind="name")
+            self.take(":")
+            self.type_reference()
+            if self.peek("="):
+                self.take()
+                self.value()
+            self.directives()
+        self.take(")")
+
+    def type_reference(self):
+        if self.peek("["):
+            self.take()
+            self.type_reference()
+            self.take("]")
+        else:
+            self.take(kind="name")
+        if self.peek("!"):
+            self.take()
+
+    def selection_set(self):
+        self.take("{")
+        selections = []
+        while not self.peek("}"):
+            selections.append(self.selection())
+        self.take("}")
+        return selections
+
+    def selection(self):
+        if self.peek("..."):
+            self.take()
+            if self.peek("on") or self.peek("{") or self.peek("@"):
+                type_condition = None
+                if self.peek("on"):
+                    self.take()
+                    type_condition = self.take(kind="name")
+                return InlineFragment(type_condition, self.directives(), self.selection_set())
+            return FragmentSpread(self.take(kind="name"), self.directives())
+        alias = name = self.take(kind="name")
+        if self.peek(":"):
+            self.take()
+            name = self.take(kind="name")
+        arguments = self.arguments() if self.peek("(") else {}
+        directives = self.directives()
+        selections = self.selection_set() if self.peek("{") else []
+        return Field(alias, name, arguments, directives, selections)
+
+    def arguments(self):
+        self.take("(")
+        arguments = {}
+        while not self.peek(")"):
+            name = self.take(kind="name")
+            self.take(":")
+            arguments[name] = self.value()
+        self.take(")")
+        return arguments
+
+    def directives(self):
+        directives = {}
+        while self.peek("@"):
+            self.take()
+            name = self.take(kind="name")
+            directives[name] = self.arguments() if self.peek("(") else {}
+        return directives
+
+    def value(self):
+        kind, token = self.peek() or (None, None)
+        if token == "$":
+            self.take()
+            return Variable(self.take(kind="name"))
+        if token == "[":
+            self.take()
+            values = []
+            while not self.peek("]"):
+                values.append(self.value())
+            self.take("]")
+            return values
+        if token == "{":
+            self.take()
+            values = {}
+            while not self.peek("}"):
+                name = self.take(kind="name")
+                self.take(":")
+                values[name] = self.value()
+            self.take("}")
+            return values
+        self.take()
+        if kind == "number":
+            return float(token) if any(c in token for c in ".eE") else int(token)
+        if kind == "string":
+            return re.sub(r'\\(u[0-9a-fA-F]{4}|.)', lambda m: chr(int(m.group(1)[1:], 16))
+                          if m.group(1)[0] == "u" else _ESCAPES.get(m.group(1), m.group(1)), token[1:-1])
+        if kind == "name":
+            return {"true": True, "false": False, "null": None}.get(token, token)
+        raise GraphQLError(f"Syntax Error: Unexpected {token}", "GRAPHQL_PARSE_FAILED")
+
+
+def parse(document):
+    """ Parse a GraphQL document.
+        :param document (str)   - The document.
+        :returns (tuple)        - (operations, fragments by name); raises GraphQLError on syntax errors.
+    """
+    return _Parser(document).document()
+
+
+def _resolve_value(value, variables):
+    if isinstance(value, Variable):
+        return variables.get(value.name)
+    if isinstance(value, list):
+        return [_resolve_value(item, variables) for item in value]
+    if isinstance(value, dict):
+        return {key: _resolve_value(item, variables) for key, item in value.items()}
+    return value
+
+
+def _included(directives, variables):
+    if "include" in directives and not _resolve_value(directives["include"].get("if"), variables):
+        return False
+    if "skip" in directives and _resolve_value(directives["skip"].get("if"), variables):
+        return False
+    return True
+
+
+def _project(value, selections, fragments, variables):
+    """ Keep the selected fields of a resolved value. Values may be functions of the field's arguments,
+        called only when the field is selected.
+    """
+    if value is None or not selections:
+        return value
+    if isinstance(value, (list, tuple)) or hasattr(value, "__next__"):
+        return [_project(item, selections, fragments, variables) for item in value]
+    if not isinstance(value, dict):
+        return value
+    projected = {}
+    for selection in selections:
+        if not _included(selection.directives, variables):
+            continue
+        if isinstance(selection, FragmentSpread):
+            projected.update(_project(value, fragments.get(selection.name, []), fragments, variables))
+        elif isinstance(selection, InlineFragment):
+            projected.update(_project(value, selection.selections, fragments, variables))
+        else:
+            item = value.get(selection.name)
+            if callable(item):
+                item = item(_resolve_value(selection.arguments, variables))
+            projected[selection.alias] = _project(item, selection.selections, fragments, variables)
+    return projected
+
+
+def execute(document, resolvers, variables=None, operation_name=None, context=None):
+    """ Run a GraphQL document against root field resolvers.
+        :param document (str)       - The document.
+        :param resolvers (dict)     - Root field name -> function(arguments, context) returning the field's value
+                                      as plain data (dicts, lists, generators); raise GraphQLError to fail the field.
+        :param variables (dict)     - The variables.
+        :param operation_name (str) - Operation to run when the document has several.
+        :param context (object)     - Passed to the resolvers.
+        :returns (dict)             - The response, {"data": ...} and "errors" when some fields failed.
+    """
+    variables = variables or {}
+    try:
+        operations, fragments = parse(document)
+    except GraphQLError as e:
+        return {"errors": [e.to_dict()]}
+    matching = [o for o in operations if operation_name is None or o.name == operation_name] or operations
+    if len(matching) != 1:
+        return {"errors": [GraphQLError("Must provide operation name if query contains multiple operations.",
+                                        "BAD_USER_INPUT").to_dict()]}
+    data, errors = {}, []
+    for selection in _root_fields(matching[0].selections, fragments, variables):
+        resolver = resolvers.get(selection.name)
+        try:
+            if resolver is None:
+                raise GraphQLError(f'Cannot query field "{selection.name}" on type "Query".',
+                                   "GRAPHQL_VALIDATION_FAILED")
+            value = resolver(_resolve_value(selection.arguments, variables), context)
+            data[selection.alias] = _project(value, selection.selections, fragments, variables)
+        except GraphQLError as e:
+            data[selection.alias] = None
+            errors.append(e.to_dict([selection.alias]))
+    response = {"data": data}
+    if errors:
+        response["errors"] = errors
+    return response
+
+
+def _root_fields(selections, fragments, variables):
+    for selection in selections:
+        if not _included(selection.directives, variables):
+            continue
+        if isinstance(selection, FragmentSpread):
+            yield from _root_fields(fragments.get(selection.name, []), fragments, variables)
+        elif isinstance(selection, InlineFragment):
+            yield from _root_fields(selection.selections, fragments, variables)
+        else:
+            yield selection
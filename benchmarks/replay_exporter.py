@@ -0,0 +1,68 @@
+#!/usr/bin/python
+""" Record the GraphQL traffic of a utility run to a fixture, or re-run it offline from one.
+
+    python benchmarks/replay_exporter.py record --fixture detections.jsonl.gz -- \
+        src/python/utilities/export_detections.py --environment_sub_domain demo ...
+    python benchmarks/replay_exporter.py replay --fixture detections.jsonl.gz [--latency 0.05] [--error-rate 0.01] \
+        [--max-page-size 100] [--profile detections.prof] -- src/python/utilities/export_detections.py ...
+
+The utility's own arguments come after "--"; its environment is read from --environment_sub_domain and --stage.
+Replayed runs still log in, with the scrubbed credentials matching whatever is passed.
+"""
+import argparse
+import cProfile
+import os
+import runpy
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.python.common.graph_metrics import DEFAULT_METRICS
+from graph_replay import graph_url, recording, replaying
+
+
+def utility_url(utility_args):
+    environment = utility_args[utility_args.index("--environment_sub_domain") + 1]
+    return graph_url(environment.replace("!", ""), stage="--stage" in utility_args)
+
+
+def run_utility(script, utility_args, profile=None):
+    sys.argv = [script] + utility_args
+    start = time.perf_counter()
+    if profile:
+        cProfile.runctx("runpy.run_path(script, run_name='__main__')", globals(), {"script": script}, profile)
+    else:
+        runpy.run_path(script, run_name="__main__")
+    return time.perf_counter() - start
+
+
+def main(args, utility_args):
+    script, utility_args = utility_args[0], utility_args[1:]
+    url = utility_url(utility_args)
+    if args.mode == "record":
+        with recording(url, args.fixture) as recorder:
+            elapsed = run_utility(script, utility_args, args.profile)
+        print(f"Recorded {len(recorder.exchanges)} requests to {args.fixture} in {elapsed:.2f}s")
+    else:
+        with replaying(url, args.fixture, latency=args.latency, error_rate=args.error_rate,
+                       max_page_size=args.max_page_size, seed=args.seed) as replay:
+            elapsed = run_utility(script, utility_args, args.profile)
+        print(f"Replayed {replay.requests} requests ({replay.injected_errors} injected errors) in {elapsed:.2f}s")
+    print(DEFAULT_METRICS.summary_table())
+
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    split = argv.index("--") if "--" in argv else len(argv)
+    parser = argparse.ArgumentParser(description='Record or replay the GraphQL traffic of a utility run.')
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("--fixture", required=True, help="Gzipped JSON lines fixture file")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to each replayed response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of replayed requests failing")
+    parser.add_argument("--max-page-size", type=int, default=None, help="Cap replayed pages at this many results")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the injected errors")
+    parser.add_argument("--profile", default=None, help="Write cProfile stats of the run to this file")
+    parsed = parser.parse_args(argv[:split])
+    if split + 1 >= len(argv):
+        parser.error("Pass the utility script and its arguments after --")
+    main(parsed, argv[split + 1:])
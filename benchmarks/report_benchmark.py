@@ -0,0 +1,226 @@
+#!/usr/bin/python
+""" Wall time, peak RSS and API calls of the report and export utilities against the local stand-in API, at growing
+    workspace sizes, compared to a stored baseline.
+
+    python benchmarks/report_benchmark.py [--sizes 1000,10000,100000,1000000] [--cases export_inventory,...]
+        [--latency 0.02] [--update-baseline]
+
+Each utility runs in its own process (for a clean peak RSS) with a cold disk cache, in a scratch directory.
+The data rows of the file it writes and the ERROR records it logs are counted; a case without data rows failed.
+The exit code is 1 when a case failed or regressed past the tolerances against benchmarks/baseline.json.
+"""
+import argparse
+import csv
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from graph_standin import StandInServer
+from synthetic_workspace import SyntheticWorkspace
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+CREDENTIALS = ("bench", "bench@example.com", "bench", None, "Stand-in")
+# Utility module and the arguments of its main() after the credentials
+CASES = {
+    "generate_compliance_report": ("src.python.utilities.generate_compliance_report", {"compliance": "CIS"}),
+    "generate_vulnerabilities_report": ("src.python.utilities.generate_vulnerabilities_report", {}),
+    "export_inventory": ("src.python.utilities.export_inventory", {"resource_type": "instance"}),
+    "export_detections": ("src.python.utilities.export_detections",
+                          {"start_time": "2024-10-01", "end_time": "2024-12-31"}),
+    "generate_cost_report": ("src.python.utilities.generate_cost_report",
+                             {"start_timestamp": "2024-12-01", "end_timestamp": "2024-12-30", "period": "day"}),
+    "export_ec2_os_info": ("src.python.utilities.export_ec2_os_info", {}),
+}
+# Regressions smaller than these are noise, whatever the relative change
+MIN_TIME_DELTA = 0.5
+MIN_RSS_DELTA_MB = 10
+
+
+def workspace_for(size):
+    """ Synthetic workspace with `size` entities of every kind the utilities read.
+        :param size (int)               - Resources, detections and flow logs; cost rows are about the same.
+        :returns (SyntheticWorkspace)   - The workspace.
+    """
+    # 30 days of cost rows x 3 resource types per account
+    accounts = max(1, min(5000, size // 90))
+    return SyntheticWorkspace(resources=size, accounts=accounts, detections=size, flow_logs=size)
+
+
+class _ErrorCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+def count_rows(path):
+    """ Count the data rows of a report file.
+        :param path (str)   - A CSV file, or an XLSX file whose sheets each start with a header row.
+        :returns (int)      - Rows after the header(s).
+    """
+    if path.endswith(".xlsx"):
+        import openpyxl
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        try:
+            return sum(max(0, sheet.max_row - 1) for sheet in workbook.worksheets)
+        finally:
+            workbook.close()
+    with open(path, newline="", encoding="utf-8") as file:
+        return max(0, sum(1 for _ in csv.reader(file)) - 1)
+
+
+def _run_case(case, url, workdir, results, verbose):
+    """ Run one utility in this (child) process and report its wall time, peak RSS, data rows and ERROR records. """
+    if not verbose:
+        quiet = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(quiet, 1)
+        os.dup2(quiet, 2)
+    os.environ["STREAM_GRAPHQL_URL"] = url
+    os.environ["STREAM_CACHE_PATH"] = os.path.join(workdir, "resources.db")
+    os.chdir(workdir)
+    module, arguments = CASES[case]
+    main = importlib.import_module(module).main
+    errors = _ErrorCounter()
+    logging.getLogger().addHandler(errors)
+    start = time.perf_counter()
+    rows = 0
+    try:
+        path = main(*CREDENTIALS, **arguments)
+        wall_time = time.perf_counter() - start
+        rows = count_rows(path)
+        error = None if rows else "no data rows written"
+    except Exception as e:
+        wall_time = time.perf_counter() - start
+        error = str(e)
+    # ru_maxrss is in kilobytes on Linux
+    results.put({"wall_time": wall_time, "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                 "rows": rows, "error_logs": errors.count, "error": error})
+
+
+def run_case(case, server, verbose=False):
+    """ Run one utility against the stand-in, in a fresh process.
+        :param case (str)               - One of CASES.
+        :param server (StandInServer)   - The running stand-in.
+        :param verbose (bool)           - Show the utility's output.
+        :returns (dict)                 - wall_time, peak_rss_mb, rows, error_logs, api_calls, calls by operation and
+                                          error.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    before = dict(server.stats)
+    with tempfile.TemporaryDirectory() as workdir:
+        process = context.Process(target=_run_case, args=(case, server.url, workdir, results, verbose))
+        process.start()
+        result = results.get()
+        process.join()
+    calls = {operation or "anonymous": count - before.get(operation, 0) for operation, count in server.stats.items()
+             if operation not in ("throttled", "injected_errors") and count != before.get(operation, 0)}
+    result.update(api_calls=sum(calls.values()), calls=calls)
+    return result
+
+
+def compare_to_baseline(results, baseline, time_tolerance=0.25, rss_tolerance=0.25, calls_tolerance=0.0):
+    """ Find the cases that got slower, bigger or chattier than their baseline, or whose output changed size.
+        :param results (dict)           - "<case>@<size>" -> result of run_case.
+        :param baseline (dict)          - Same, from an earlier run.
+        :param time_tolerance (float)   - Allowed relative increase of the wall time.
+        :param rss_tolerance (float)    - Allowed relative increase of the peak RSS.
+        :param calls_tolerance (float)  - Allowed relative increase of the API calls; they're deterministic.
+        :returns (list)                 - Regression descriptions, empty if none.
+    """
+    regressions = []
+    for key, result in sorted(results.items()):
+        base = baseline.get(key)
+        if not base:
+            continue
+        if result.get("error") and not base.get("error"):
+            regressions.append(f"{key}: failed with {result['error']}")
+            continue
+        # The workspace is deterministic, so are the rows of the report
+        if "rows" in base and result.get("rows") != base["rows"]:
+            regressions.append(f"{key}: rows {base['rows']} -> {result.get('rows')}")
+        checks = (("wall_time", time_tolerance, MIN_TIME_DELTA, "s"),
+                  ("peak_rss_mb", rss_tolerance, MIN_RSS_DELTA_MB, "MB"),
+                  ("api_calls", calls_tolerance, 0, " calls"))
+        for metric, tolerance, min_delta, unit in checks:
+            value, base_value = result[metric], base[metric]
+            if value > base_value * (1 + tolerance) and value - base_value > min_delta:
+                regressions.append(f"{key}: {metric} {base_value:.1f}{unit} -> {value:.1f}{unit} "
+                                   f"(+{(value / base_value - 1) * 100 if base_value else float('inf'):.0f}%)")
+    return regressions
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as baseline:
+        return json.load(baseline)
+
+
+def save_baseline(path, baseline):
+    with open(path, "w") as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def main(args):
+    baseline = load_baseline(args.baseline)
+    results = {}
+    header = f"{'case':<34}{'size':>9}{'wall s':>10}{'peak MB':>10}{'calls':>9}{'rows':>10}{'errors':>8}" \
+             f"{'baseline s':>12}  error"
+    print(header)
+    print("-" * len(header))
+    for size in args.sizes:
+        with StandInServer(workspace_for(size), latency=args.latency) as server:
+            for case in args.cases:
+                key = f"{case}@{size}"
+                result = results[key] = run_case(case, server, args.verbose)
+                base = baseline.get(key, {}).get("wall_time")
+                print(f"{case:<34}{size:>9}{result['wall_time']:>10.2f}{result['peak_rss_mb']:>10.1f}"
+                      f"{result['api_calls']:>9}{result['rows']:>10}{result['error_logs']:>8}"
+                      f"{'' if base is None else f'{base:.2f}':>12}  {result['error'] or ''}")
+    regressions = compare_to_baseline(results, baseline, args.time_tolerance, args.rss_tolerance,
+                                      args.calls_tolerance)
+    if args.results:
+        save_baseline(args.results, results)
+    if args.update_baseline:
+        baseline.update(results)
+        save_baseline(args.baseline, baseline)
+        print(f"\nBaseline updated: {args.baseline}")
+    failures = [f"{key}: {result['error']}" for key, result in sorted(results.items()) if result["error"]]
+    if failures:
+        print("\nFailed:\n  " + "\n  ".join(failures))
+    if regressions:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+    return 1 if failures or regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the report and export utilities against the stand-in.')
+    parser.add_argument("--sizes", type=lambda s: [int(n) for n in s.split(",")], default=list(DEFAULT_SIZES),
+                        help="Comma separated workspace sizes")
+    parser.add_argument("--cases", type=lambda s: s.split(","), default=list(CASES),
+                        help=f"Comma separated utilities, of: {', '.join(CASES)}")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the stand-in adds to each response")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--verbose", action="store_true", help="Show the output of the utilities")
+    parser.add_argument("--results", default=None, help="Also write these results to this JSON file")
+    parser.add_argument("--time-tolerance", type=float, default=0.25, help="Allowed relative wall time increase")
+    parser.add_argument("--rss-tolerance", type=float, default=0.25, help="Allowed relative peak RSS increase")
+    parser.add_argument("--calls-tolerance", type=float, default=0.0, help="Allowed relative API calls increase")
+    parsed = parser.parse_args()
+    unknown = set(parsed.cases) - CASES.keys()
+    if unknown:
+        parser.error(f"Unknown cases: {', '.join(sorted(unknown))}")
+    sys.exit(main(parsed))
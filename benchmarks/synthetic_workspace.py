@@ -0,0 +1,608 @@
+import base64
+import datetime
+import itertools
+import json
+import time
+
+from graphql_lite import GraphQLError
+
+# Resource types of the synthetic inventory: (type, ruleCsv display type, id prefix).
+# Resource i is of type RESOURCE_TYPES[i % len(RESOURCE_TYPES)] and belongs to account (i // len(RESOURCE_TYPES))
+# % accounts, so searches by type and account are arithmetic progressions that are never materialised.
+RESOURCE_TYPES = (
+    ("instance", "EC2 Instance", "i-"),
+    ("image", "AMI", "ami-"),
+    ("network_interface", "Network Interface", "eni-"),
+    ("elastic_ip", "Elastic IP", "eipalloc-"),
+    ("load_balancer", "ELB", "arn:aws:elasticloadbalancing:{region}:{account}:loadbalancer/elb-"),
+    ("application_load_balancer", "ALB", "arn:aws:elasticloadbalancing:{region}:{account}:loadbalancer/app/alb-"),
+    ("network_load_balancer", "NLB", "arn:aws:elasticloadbalancing:{region}:{account}:loadbalancer/net/nlb-"),
+    ("route53", "Route53 Hosted Zone", "/hostedzone/Z-"),
+    ("eks", "EKS Cluster", "arn:aws:eks:{region}:{account}:cluster/cluster-"),
+    ("iam_user", "IAM User", "arn:aws:iam::{account}:user/user-"),
+    ("s3", "S3 Bucket", "arn:aws:s3:::bucket-"),
+    ("security_group", "Security Group", "sg-"),
+)
+TYPE_INDEX = {resource_type: position for position, (resource_type, _, _) in enumerate(RESOURCE_TYPES)}
+REGIONS = ("us-east-1", "us-west-2", "eu-west-1", "eu-central-1", "ap-southeast-2")
+ENVIRONMENTS = ("production", "staging", "development")
+ACTIVITY_TYPES = ("Anomalous API call", "Credential access", "Port scan", "Privilege escalation", "Data exfiltration")
+MITRE_CATEGORIES = ("Discovery", "Credential Access", "Persistence", "Exfiltration", "Lateral Movement")
+# Exposure risks of the resources affected by a CVE; CVE and rule severities are numbers, 4 (critical) to 1 (low)
+EXPOSURE_RISKS = ("critical", "high", "medium", "low")
+PACKAGES = ("openssl", "glibc", "log4j-core", "curl", "zlib", "libxml2", "nginx", "sudo")
+COMPLIANCE_STANDARDS = ("CIS", "SOC2", "PCI", "HIPAA", "NIST")
+COST_LABELS = ("Compute", "Storage", "Network")
+# Detections and flow logs go back this far from the workspace's "now"
+HISTORY = datetime.timedelta(days=90)
+# get_detections returns this many results when no limit is given, like the real API
+DEFAULT_DETECTIONS_LIMIT = 100
+_MASK = (1 << 64) - 1
+
+
+def _hash(index, salt=0, seed=0):
+    """ Deterministic 64 bit mix of an index, so every synthetic value is a pure function of its index. """
+    value = (index * 0x9E3779B97F4A7C15 + salt * 0xBF58476D1CE4E5B9 + seed) & _MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK
+    return value ^ (value >> 31)
+
+
+def _page_sequences(sequences, skip, limit):
+    """ Slice the concatenation of sequences (e.g. ranges) into a page, without walking the skipped items. """
+    skip, page = skip or 0, []
+    for sequence in sequences:
+        if limit is not None and len(page) >= limit:
+            break
+        if skip >= len(sequence):
+            skip -= len(sequence)
+            continue
+        stop = None if limit is None else skip + limit - len(page)
+        page.extend(sequence[skip:stop])
+        skip = 0
+    return page
+
+
+def _ip(prefix, index):
+    return f"{prefix}.{(index >> 16) & 255}.{(index >> 8) & 255}.{index & 255}"
+
+
+def _as_list(value):
+    if value is None:
+        return None
+    return value if isinstance(value, list) else [value]
+
+
+class SyntheticWorkspace:
+    def __init__(self, resources=10000, accounts=20, detections=5000, cves=None, flow_logs=10000, seed=0,
+                 now=datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc), workspace_name="Stand-in",
+                 violation_ratio=20):
+        """ Deterministic synthetic Stream workspace, generated on demand from indices so it scales to millions
+            of resources without holding them in memory.
+            :param resources (int)          - Resources in the inventory, up to millions.
+            :param accounts (int)           - Cloud accounts the resources are spread over.
+            :param detections (int)         - Detections, spread over HISTORY before now.
+            :param cves (int)               - CVEs; Defaults to one per 100 resources, 50 to 20000.
+            :param flow_logs (int)          - IPTraffic flow logs.
+            :param seed (int)               - Changes every generated value.
+            :param now (datetime)           - Time the history ends at, fixed so runs are repeatable.
+            :param workspace_name (str)     - Display name of the workspace.
+            :param violation_ratio (int)    - One in this many resources of a rule's type violates it.
+        """
+        self.resources = resources
+        self.accounts = max(1, accounts)
+        self.detections = detections
+        self.cves = cves if cves is not None else min(20000, max(50, resources // 100))
+        self.flow_logs = flow_logs
+        self.seed = seed
+        self.now_ms = int(now.timestamp() * 1000)
+        self.workspace_name = workspace_name
+        self.workspace_id = f"ws-{seed:04d}"
+        self.violation_ratio = max(1, violation_ratio)
+        self.rules = self._build_rules()
+        self.rules_by_id = {rule["id"]: rule for rule in self.rules}
+
+    def h(self, index, salt=0):
+        return _hash(index, salt, self.seed)
+
+    # Accounts
+    def account_id(self, account):
+        return f"{100000000000 + account}"
+
+    def account(self, account):
+        cloud_account_id = self.account_id(account)
+        return {"_id": f"{account:024x}", "account_type": "AWS", "cloud_account_id": cloud_account_id,
+                "cloud_regions": list(REGIONS), "display_name": f"account-{account}", "external_id": None,
+                "status": "READY", "stack_region": REGIONS[0], "account_aliases": [f"alias-{account}"],
+                "realtime_regions": [{"region_name": r, "template_version": "1", "__typename": "RealtimeRegion"}
+                                     for r in REGIONS],
+                "cost": {"status": "READY", "__typename": "AccountCost"}, "__typename": "Account"}
+
+    def account_index(self, cloud_account_id):
+        try:
+            account = int(cloud_account_id) - 100000000000
+        except (TypeError, ValueError):
+            return None
+        return account if 0 <= account < self.accounts else None
+
+    # Resources
+    def resource_type(self, index):
+        return RESOURCE_TYPES[index % len(RESOURCE_TYPES)][0]
+
+    def resource_account(self, index):
+        return (index // len(RESOURCE_TYPES)) % self.accounts
+
+    def resource_region(self, index):
+        return REGIONS[self.h(index, 1) % len(REGIONS)]
+
+    def resource_id(self, index):
+        _, _, prefix = RESOURCE_TYPES[index % len(RESOURCE_TYPES)]
+        account = self.account_id(self.resource_account(index))
+        prefix = prefix.format(region=self.resource_region(index), account=account)
+        return f"{prefix}{index:017x}" if prefix.endswith("-") and len(prefix) < 10 else f"{prefix}{index:08x}"
+
+    def resource_index(self, resource_id):
+        """ Get the index of a resource ID, None if there's no such resource. """
+        try:
+            index = int(str(resource_id).rsplit("-", 1)[1], 16)
+        except (IndexError, ValueError):
+            return None
+        return index if index < self.resources and self.resource_id(index) == resource_id else None
+
+    def is_public(self, index):
+        return self.h(index, 2) % 5 == 0
+
+    def resource(self, index):
+        resource_type = self.resource_type(index)
+        addresses = [_ip("10", index)] + ([_ip("54", index)] if self.is_public(index) else [])
+        tags = [{"Key": "env", "Value": ENVIRONMENTS[self.h(index, 3) % len(ENVIRONMENTS)], "__typename": "Tag"},
+                {"Key": "team", "Value": f"team-{self.h(index, 4) % 10}", "__typename": "Tag"}]
+        return {"id": self.resource_id(index), "type": resource_type,
+                "display_name": f"{resource_type}-{index}" if resource_type != "eks" else f"cluster-{index}/eks",
+                "region": self.resource_region(index), "account_id": self.account_id(self.resource_account(index)),
+                "parent": None, "parents": [], "end_timestamp": None, "state": "running",
+                "is_public": self.is_public(index), "addresses": addresses,
+                "network_interfaces": [{"id": f"eni-{index:017x}", "addresses": addresses,
+                                        "__typename": "NetworkInterface"}] if resource_type == "instance" else [],
+                "tags": tags, "cloud_tags": tags, "__typename": "Resource"}
+
+    def type_indices(self, resource_type=None, account=None):
+        """ Indices of the resources of a type (all types if None) in an account (all of them if None). """
+        types = len(RESOURCE_TYPES)
+        positions = range(types) if resource_type is None else [TYPE_INDEX[resource_type]]
+        if account is None:
+            ranges = [range(position, self.resources, types) for position in positions]
+        else:
+            ranges = [range(position + types * account, self.resources, types * self.accounts)
+                      for position in positions]
+        return ranges
+
+    def count(self, resource_type=None, account=None):
+        return sum(len(r) for r in self.type_indices(resource_type, account))
+
+    def nth_of_type(self, resource_type, n, account=None):
+        """ Index of the n-th resource of a type (in an account), None if there are fewer. """
+        indices = self.type_indices(resource_type, account)[0]
+        return indices[n % len(indices)] if len(indices) else None
+
+    def configuration(self, index):
+        resource_type = self.resource_type(index)
+        region = self.resource_region(index)
+        configuration = {"ResourceId": self.resource_id(index), "Region": region}
+        dns_name = f"{resource_type}-{index}.{region}.elb.amazonaws.com"
+        if resource_type == "instance":
+            image = self.nth_of_type("image", self.h(index, 5) % 50)
+            configuration.update({
+                "InstanceId": self.resource_id(index), "ImageId": None if image is None else self.resource_id(image),
+                "InstanceType": ("t3.micro", "m5.large", "c6i.xlarge")[self.h(index, 6) % 3],
+                "PrivateIpAddress": _ip("10", index), "PrivateDnsName": f"ip-{_ip('10', index).replace('.', '-')}",
+                "PublicIpAddress": _ip("54", index) if self.is_public(index) else None,
+                "PublicDnsName": f"ec2-{_ip('54', index).replace('.', '-')}.compute.amazonaws.com"
+                if self.is_public(index) else "", "State": {"Name": "running"}})
+        elif resource_type == "image":
+            platform = ("Linux/UNIX", "Windows", "Red Hat Enterprise Linux")[self.h(index, 7) % 3]
+            configuration.update({"ImageId": self.resource_id(index), "Name": f"image-{index}",
+                                  "PlatformDetails": platform, "Description": f"{platform} image {index}"})
+        elif resource_type == "load_balancer":
+            configuration.update({"DNSName": dns_name, "listener_elb": [
+                {"LoadBalancerPort": port, "Protocol": "HTTPS"} for port in (80, 443)]})
+        elif resource_type == "application_load_balancer":
+            configuration.update({"DNSName": dns_name, "listener_alb": [{"Port": 443, "Protocol": "HTTPS"}]})
+        elif resource_type == "network_load_balancer":
+            configuration.update({"DNSName": dns_name, "listener_nlb": [{"Port": 22, "Protocol": "TCP"}],
+                                  "nlb_availability_zone": [{"nlb_load_balancer_addresses": [
+                                      {"IpAddress": _ip("54", index)}]}]})
+        elif resource_type == "route53":
+            configuration["record"] = [
+                {"Name": f"app{n}.example{index}.com.", "RecordType": ("A", "CNAME", "TXT")[n % 3],
+                 "ResourceRecords": [{"Value": _ip("54", index + n)}]} for n in range(3)]
+        elif resource_type == "iam_user":
+            last_used = datetime.datetime.fromtimestamp(self.now_ms / 1000 - (self.h(index, 8) % 200) * 86400,
+                                                        tz=datetime.timezone.utc)
+            configuration["access_key_metadata"] = [{"AccessKeyId": f"AKIA{index:016d}", "Status": "Active",
+                                                     "LastUsedDate": last_used.isoformat()}]
+        return configuration
+
+    def configuration_timestamp(self, index):
+        return datetime.datetime.fromtimestamp((self.now_ms - (self.h(index, 9) % 86400000)) / 1000,
+                                               tz=datetime.timezone.utc).isoformat()
+
+    def ancestors(self, index):
+        account = self.account_id(self.resource_account(index))
+        region = self.resource_region(index)
+        return [{"id": account, "type": "account", "display_name": f"account-{self.resource_account(index)}",
+                 "parent": None, "__typename": "Resource"},
+                {"id": f"{account}|{region}", "type": "region", "display_name": region, "parent": account,
+                 "__typename": "Resource"}]
+
+    def search_indices(self, phrase=None, filters=None):
+        """ Get the indices matching a search: ranges (one per type and account, never materialised) or lists. """
+        filters = filters or {}
+        if filters.get("associated_resource_id"):
+            # Load balancers are associated with the hosted zone of their account
+            index = self.resource_index(filters["associated_resource_id"])
+            if index is None:
+                return []
+            zone = self.nth_of_type("route53", 0, self.resource_account(index))
+            return [[] if zone is None else [zone]]
+        if phrase:
+            return [self._phrase_matches(phrase)]
+        types = _as_list(filters.get("resource_type")) or [None]
+        if any(t is not None and t not in TYPE_INDEX for t in types):
+            return []
+        accounts = _as_list(filters.get("account_id")) or [None]
+        ranges = [r for t in types for a in accounts
+                  for r in self.type_indices(t, None if a is None else self._checked_account(a))]
+        ranges.sort(key=lambda r: r.start)
+        tags = filters.get("tags")
+        if tags:
+            return [[index for r in ranges for index in r if self._tags_match(index, tags)]]
+        return ranges
+
+    def _checked_account(self, cloud_account_id):
+        account = self.account_index(cloud_account_id)
+        # Unknown accounts match nothing
+        return account if account is not None else self.accounts * len(RESOURCE_TYPES) * 10 + self.resources
+
+    def _phrase_matches(self, phrase):
+        phrase = phrase.strip()
+        index = self.resource_index(phrase)
+        if index is not None:
+            return [index]
+        parts = phrase.split(".")
+        if len(parts) == 4 and parts[0] in ("10", "54") and all(p.isdigit() for p in parts):
+            index = (int(parts[1]) << 16) | (int(parts[2]) << 8) | int(parts[3])
+            if index < self.resources and (parts[0] == "10" or self.is_public(index)):
+                return [index]
+        name, _, number = phrase.rpartition("-")
+        if number.isdigit() and int(number) < self.resources and self.resource_type(int(number)) == name:
+            return [int(number)]
+        return []
+
+    def _tags_match(self, index, tags):
+        resource_tags = self.resource(index)["tags"]
+        for tag in tags:
+            def matches(value, expected, operand):
+                return expected in value if operand == "contains" else value == expected
+            if not any(matches(t["Key"], tag.get("key"), tag.get("key_operand")) and
+                       matches(t["Value"], tag.get("value"), tag.get("value_operand")) for t in resource_tags):
+                return False
+        return True
+
+    # Rules
+    def _build_rules(self):
+        rules = [
+            ("Resource is public Internet facing", "instance", "Security", 3, ("CIS", "SOC2")),
+            ("Internet facing Load Balancer (ELB)", "load_balancer", "Security", 2, ("CIS",)),
+            ("Internet facing Load Balancer (ALB)", "application_load_balancer", "Security", 2, ("CIS",)),
+            ("Internet facing Load Balancer (NLB)", "network_load_balancer", "Security", 2, ("CIS",)),
+            ("Ensure access keys unused for 90 days are deleted", "iam_user", "Security", 3,
+             ("CIS", "PCI", "SOC2")),
+        ]
+        types = [t for t, _, _ in RESOURCE_TYPES]
+        for n in range(40):
+            standards = tuple(s for k, s in enumerate(COMPLIANCE_STANDARDS) if (n >> k) & 1) or ("NIST",)
+            rules.append((f"Synthetic compliance rule {n}", types[n % len(types)], "Security", 4 - n % 4,
+                          standards))
+        for n, label in enumerate(COST_LABELS * 3):
+            rules.append((f"Synthetic cost rule {n}", types[n % len(types)], "Cost", 1, ()))
+        built = []
+        for n, (name, resource_type, category, severity, compliance) in enumerate(rules):
+            labels = [f"Cost Label: {COST_LABELS[n % len(COST_LABELS)]}"] if category == "Cost" else \
+                [f"Label {n % 4}"]
+            condition = {"resource_id": None, "resource_type": resource_type, "attributes": None, "tags": None,
+                         "locations": [], "__typename": "ResourceCondition"}
+            built.append({"id": f"rule-{n:04d}", "name": name, "category": category, "severity": severity,
+                          "compliance": list(compliance), "labels": labels, "status": "active", "state": "enabled",
+                          "rule_type": "resource", "description": f"{name}.", "remediation": f"Fix {name}.",
+                          "creation_date": "2024-01-01T00:00:00.000Z", "created_by": "Stream",
+                          "fail_simulation": False, "exclusions_count": 0, "subject": None, "action": None,
+                          "resource_predicate": condition, "path_source_predicate": None,
+                          "path_intermediate_predicate": None, "path_destination_predicate": None, "ports": [],
+                          "resource_type": resource_type, "__typename": "Rule"})
+        return built
+
+    def violating_indices(self, rule):
+        salt = int(rule["id"].split("-")[1]) + 100
+        return (index for r in self.type_indices(rule["resource_type"]) for index in r
+                if self.h(index, salt) % self.violation_ratio == 0)
+
+    def csv_violation(self, index):
+        account = self.resource_account(index)
+        return {"resource_id": self.resource_id(index), "resource_name": f"{self.resource_type(index)}-{index}",
+                "resource_type": RESOURCE_TYPES[index % len(RESOURCE_TYPES)][1],
+                "account_display_name": f"account-{account}", "account_id": f'"{self.account_id(account)}"',
+                "region": self.resource_region(index), "vpc_id": f"vpc-{account:017x}",
+                "tags": json.dumps({t["Key"]: t["Value"] for t in self.resource(index)["tags"]}),
+                "monthly_cost": round((self.h(index, 10) % 100000) / 100, 2), "__typename": "RuleCsvViolation"}
+
+    # Detections
+    def detection_timestamp(self, index):
+        return self.now_ms - int((index + 1) * HISTORY.total_seconds() * 1000 / max(1, self.detections))
+
+    def detection(self, index):
+        resource = (index * 7) % max(1, self.resources)
+        return {"_id": f"{index:024x}", "timestamp": self.detection_timestamp(index),
+                "activity_type": ACTIVITY_TYPES[self.h(index, 11) % len(ACTIVITY_TYPES)], "source": "cloudtrail",
+                "account_id": self.account_id(self.resource_account(resource)),
+                "anomaly_severity": 1 + self.h(index, 12) % 4, "cluster": None, "namespace": None,
+                "resource_id": self.resource_id(resource), "resource_type": self.resource_type(resource),
+                "resource_cluster": None, "resource_namespace": None, "resource_deployment": None,
+                "mitre_categories": [MITRE_CATEGORIES[self.h(index, 13) % len(MITRE_CATEGORIES)]],
+                "acknowledged": self.h(index, 14) % 10 == 0, "acknowledgement_details": None,
+                "signal_types": ["event", "anomaly"],
+                "session_list": [{"ip_address": _ip("54", index), "access_key": f"AKIA{index:016d}",
+                                  "user_agent": "aws-cli/2.15.0", "country_code_iso": "US", "mfa": False,
+                                  "__typename": "Session"}], "__typename": "Detection"}
+
+    # CVEs
+    def cve(self, index):
+        return {"cve_id": f"CVE-{2015 + index % 10}-{10000 + index}", "attack_vector": "NETWORK",
+                "cve_sources": ["nvd"], "severity": 4 - min(3, index * 4 // max(1, self.cves)),
+                "cvss_score": round(10 - 9.9 * index / max(1, self.cves), 1),
+                "packages": [PACKAGES[self.h(index, 15) % len(PACKAGES)]],
+                "exploit_available": self.h(index, 16) % 4 == 0, "internet_exposed": self.h(index, 17) % 3 == 0,
+                "fix_available": self.h(index, 18) % 2 == 0, "affected_resources_count": self.cve_resource_count(index),
+                "fixed_in_version": "1.0.1", "epss_score": round((self.h(index, 19) % 1000) / 1000, 3),
+                "cisa_kev": None, "published_date": "2024-01-01", "discovery_timestamp": self.now_ms,
+                "__typename": "CVE"}
+
+    def cve_index(self, cve_id):
+        try:
+            index = int(cve_id.rsplit("-", 1)[1]) - 10000
+        except (AttributeError, IndexError, ValueError):
+            return None
+        return index if 0 <= index < self.cves and self.cve(index)["cve_id"] == cve_id else None
+
+    def cve_resource_count(self, index):
+        return min(self.resources, 1 + self.h(index, 20) % 20)
+
+    def cve_resource(self, cve, n):
+        resource = (cve * 7919 + n * 104729) % max(1, self.resources)
+        return {"account_id": self.account_id(self.resource_account(resource)),
+                "resource_id": self.resource_id(resource), "resource_type": self.resource_type(resource),
+                "container_images": [], "exposure_risk": EXPOSURE_RISKS[self.h(resource, 21) % 4],
+                "exposure_risk_description": None, "internet_exposed": self.is_public(resource),
+                "__typename": "VulnerableResource"}
+
+    # Flow logs
+    def flow_log(self, index):
+        source, destination = self.h(index, 22) % max(1, self.resources), self.h(index, 23) % max(1, self.resources)
+        internet = self.h(index, 24) % 4 == 0
+        start = self.now_ms - int((index + 1) * HISTORY.total_seconds() * 1000 / max(1, self.flow_logs))
+        return {"src_port": 1024 + self.h(index, 25) % 60000, "src_resource_id": None if internet else
+                self.resource_id(source), "src_resource_type": None if internet else self.resource_type(source),
+                "src_resource_display_name": None, "src_ip": _ip("203" if internet else "10", source),
+                "dst_port": (22, 80, 443, 5432)[self.h(index, 26) % 4],
+                "dst_resource_id": self.resource_id(destination),
+                "dst_resource_type": self.resource_type(destination), "dst_resource_display_name": None,
+                "dst_ip": _ip("10", destination), "start": start, "end": start + 60000,
+                "bytes": self.h(index, 27) % 10 ** 6, "action": "REJECT" if self.h(index, 28) % 5 == 0 else "ACCEPT",
+                "s3_action": None, "protocol": ("tcp", "udp")[self.h(index, 29) % 2], "application_name": None,
+                "application_desc": None, "src_geo_iso": "US" if internet else None, "dst_geo_iso": None,
+                "is_internet": internet, "__typename": "Connection"}
+
+    # Cost
+    def cost_rows(self, from_timestamp, to_timestamp, period=None):
+        start = datetime.datetime.fromisoformat(str(from_timestamp).replace("Z", "+00:00")[:10])
+        end = datetime.datetime.fromisoformat(str(to_timestamp).replace("Z", "+00:00")[:10])
+        days = max(0, min(366, (end - start).days + 1))
+        for day, account, position in itertools.product(range(days), range(self.accounts), range(3)):
+            date = start + datetime.timedelta(days=day)
+            resource_type = RESOURCE_TYPES[position][0]
+            yield {"day": date.day, "month": date.month, "year": date.year,
+                   "account": self.account_id(account), "region": REGIONS[(account + position) % len(REGIONS)],
+                   "resource_type": resource_type, "product_family": COST_LABELS[position],
+                   "pricing_term": "OnDemand",
+                   "total_cost": round((self.h(day * self.accounts + account, 30 + position) % 100000) / 100, 2)}
+
+
+def issue_token(ttl=3600, subject="stand-in"):
+    """ Build an unsigned JWT like the ones the API issues, readable by get_token_expiry.
+        :param ttl (int)        - Seconds until it expires.
+        :param subject (str)    - Its "sub" claim.
+        :returns (str)          - The token.
+    """
+    def encode(value):
+        return base64.urlsafe_b64encode(json.dumps(value).encode()).rstrip(b"=").decode()
+    return f"{encode({'alg': 'none', 'typ': 'JWT'})}.{encode({'sub': subject, 'exp': int(time.time()) + ttl})}.x"
+
+
+def build_resolvers(workspace):
+    """ Root field resolvers answering the GraphCommon queries from a synthetic workspace.
+        :param workspace (SyntheticWorkspace)   - The workspace.
+        :returns (dict)                         - Field name -> function(arguments, context).
+    """
+    w = workspace
+
+    def paged(indices, build, arguments):
+        # Build only the page's items out of the matching indices
+        page = _page_sequences([indices], arguments.get("skip"), arguments.get("limit"))
+        return {"total_count": len(indices), "totalCount": len(indices), "results": [build(i) for i in page]}
+
+    def login(arguments, context):
+        return {"access_token": issue_token(context.get("token_ttl", 3600) if context else 3600)}
+
+    def search(arguments, context):
+        indices = w.search_indices(arguments.get("phrase"), arguments.get("filters"))
+        page = _page_sequences(indices, arguments.get("skip"), arguments.get("limit"))
+        total = sum(len(sequence) for sequence in indices)
+        return {"total_count": total, "totalCount": total, "results": [w.resource(index) for index in page]}
+
+    def resource(arguments, context):
+        index = w.resource_index(arguments.get("resource_id"))
+        return None if index is None else w.resource(index)
+
+    def resource_ancestors(arguments, context):
+        index = w.resource_index(arguments.get("resource_id"))
+        if index is None:
+            raise GraphQLError(f"Resource {arguments.get('resource_id')} not found", "NOT_FOUND")
+        return w.ancestors(index)
+
+    def configuration(arguments, context):
+        index = w.resource_index(arguments.get("resource_id"))
+        if index is None:
+            raise GraphQLError(f"Resource {arguments.get('resource_id')} not found", "NOT_FOUND")
+        configuration_value = w.configuration(index)
+        return {"raw": configuration_value, "translated": configuration_value, "impact_paths": None,
+                "__typename": "Configuration"}
+
+    def configuration_versions(arguments, context):
+        index = w.resource_index(arguments.get("resource_id"))
+        versions = [] if index is None else [{"timestamp": w.configuration_timestamp(index), "provider": "aws",
+                                              "__typename": "ConfigurationVersion"}]
+        return _page_sequences([versions], arguments.get("skip"), arguments.get("limit"))
+
+    def inventory_summary(arguments, context):
+        accounts = _as_list(arguments.get("account_id")) or [None]
+        return [{"resource_type": t, "count": sum(w.count(t, None if a is None else w._checked_account(a))
+                                                  for a in accounts), "__typename": "InventorySummary"}
+                for t, _, _ in RESOURCE_TYPES]
+
+    def rules(arguments, context):
+        results = w.rules
+        filters = arguments.get("filters") or {}
+        if filters.get("category"):
+            results = [r for r in results if r["category"] in _as_list(filters["category"])]
+        return {"total_count": len(results), "results": results, "__typename": "Rules"}
+
+    def rule(arguments, context):
+        found = w.rules_by_id.get(arguments.get("id"))
+        if found is None:
+            raise GraphQLError(f"Rule {arguments.get('id')} not found", "NOT_FOUND")
+        return found
+
+    def rule_csv(arguments, context):
+        found = rule({"id": arguments.get("rule_id")}, context)
+        violations = [w.csv_violation(index) for index in w.violating_indices(found)]
+        return {"rule_name": found["name"], "description": found["description"], "category": found["category"],
+                "severity": found["severity"], "labels": found["labels"], "compliance": found["compliance"],
+                "date": datetime.datetime.fromtimestamp(w.now_ms / 1000, tz=datetime.timezone.utc).isoformat(),
+                "violation_count": len(violations), "violations": violations, "__typename": "RuleCsv"}
+
+    def rule_violations(arguments, context):
+        found = rule({"id": arguments.get("rule_id")}, context)
+        return dict(paged(list(w.violating_indices(found)), lambda i: {
+            "resource_id": w.resource_id(i), "resource_type": w.resource_type(i),
+            "account_id": w.account_id(w.resource_account(i)), "region": w.resource_region(i)}, arguments),
+            __typename="RuleViolations")
+
+    def compliance(arguments, context):
+        return {"results": [{"compliance": c, "__typename": "Compliance"} for c in COMPLIANCE_STANDARDS]}
+
+    def cves(arguments, context):
+        filters = arguments.get("filters") or {}
+        indices = range(w.cves)
+        if filters.get("cve_id"):
+            index = w.cve_index(filters["cve_id"])
+            indices = [] if index is None else [index]
+        flags = [flag for flag in ("internet_exposed", "exploit_available", "fix_available") if filters.get(flag)]
+        severities = [int(severity) for severity in _as_list(filters.get("severity")) or []]
+        if flags or severities:
+            indices = [i for i, cve in ((i, w.cve(i)) for i in indices)
+                       if all(cve[flag] for flag in flags) and (not severities or cve["severity"] in severities)]
+        if arguments.get("sort_order") == 1:
+            # CVEs are generated by descending cvss_score
+            indices = indices[::-1]
+        return paged(indices, w.cve, arguments)
+
+    def cve_resources(arguments, context):
+        filters = arguments.get("filters") or {}
+        indices = [(cve, n) for cve in (w.cve_index(c) for c in _as_list(filters.get("cve_ids")) or [])
+                   if cve is not None for n in range(w.cve_resource_count(cve))]
+        return paged(indices, lambda pair: w.cve_resource(*pair), arguments)
+
+    def get_detections(arguments, context):
+        filters = arguments.get("filters") or {}
+        if filters.get("_id") is not None:
+            indices = []
+            for detection_id in _as_list(filters["_id"]):
+                try:
+                    index = int(detection_id, 16)
+                except (TypeError, ValueError):
+                    continue
+                if index < w.detections:
+                    indices.append(index)
+        else:
+            indices = range(w.detections)
+        limit = arguments.get("limit")
+        arguments = dict(arguments, limit=DEFAULT_DETECTIONS_LIMIT if limit is None else limit)
+        return paged(indices, w.detection, arguments)
+
+    def ip_traffic(arguments, context):
+        filters = arguments.get("filters") or {}
+        indices = range(w.flow_logs)
+        if filters:
+            start = filters.get("start") or {}
+            gte, lte = _epoch_ms(start.get("gte")), _epoch_ms(start.get("lte"))
+
+            def matches(flow_log):
+                return ((not filters.get("action") or flow_log["action"] in _as_list(filters["action"])) and
+                        (not filters.get("dst_resource_id") or
+                         flow_log["dst_resource_id"] in _as_list(filters["dst_resource_id"])) and
+                        (not filters.get("protocol") or flow_log["protocol"] in _as_list(filters["protocol"])) and
+                        (not (filters.get("src_ip_filter") or {}).get("is_internet") or flow_log["is_internet"]) and
+                        (gte is None or flow_log["start"] >= gte) and (lte is None or flow_log["start"] <= lte))
+            indices = [index for index in indices if matches(w.flow_log(index))]
+        return paged(indices, w.flow_log, arguments)
+
+    def cost_reports(arguments, context):
+        filters = arguments.get("filters") or {}
+        if not filters.get("from_timestamp") or not filters.get("to_timestamp"):
+            raise GraphQLError("from_timestamp and to_timestamp are required", "BAD_USER_INPUT")
+        rows = list(w.cost_rows(filters["from_timestamp"], filters["to_timestamp"], arguments.get("period")))
+        return {"total_count": len(rows), "results": rows}
+
+    return {
+        "login": login,
+        "authenticateTwoFactor": lambda arguments, context: dict(login(arguments, context), refresh_token=None),
+        "workspaces": lambda arguments, context: [{"customer_id": w.workspace_id, "customer_name": w.workspace_name,
+                                                   "role": "admin", "__typename": "Workspace"}],
+        "accounts": lambda arguments, context: [w.account(a) for a in range(w.accounts)],
+        "search": search,
+        "resource": resource,
+        "resourceAncestors": resource_ancestors,
+        "configuration": configuration,
+        "configuration_versions": configuration_versions,
+        "inventorySummary": inventory_summary,
+        "rules": rules,
+        "rule": rule,
+        "ruleCsv": rule_csv,
+        "ruleViolations": rule_violations,
+        "compliance": compliance,
+        "cves": cves,
+        "cve_resources": cve_resources,
+        "get_detections": get_detections,
+        "IPTraffic": ip_traffic,
+        "cost_reports": cost_reports,
+        "cost_data_status": lambda arguments, context: {"status": "data_exists", "__typename": "CostDataStatus"},
+    }
+
+
+def _epoch_ms(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        return int(datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp() * 1000)
+    except ValueError:
+        return None
@@ -0,0 +1,92 @@
+#!/usr/bin/python
+""" Bytes on the wire and decode time of GraphQL responses, before and after compression and the bytes codec.
+    Runs offline on synthetic get_detections enrichment and rule metadata responses shaped like the real ones.
+
+    python benchmarks/transport_benchmark.py [--detections 500] [--repeat 20]
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.python.common.json_codec import JSON_BACKEND, loads
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def detection_enrichment_response(count):
+    rnd = random.Random(7)
+    return {"data": {"get_detections": {"total_count": count, "results": [{
+        "_id": f"{i:024x}",
+        "timestamp": 1700000000000 + i * 1000,
+        "activity_type": rnd.choice(["Anomalous API call", "Credential access", "Port scan"]),
+        "source": "cloudtrail",
+        "account_id": f"{rnd.randrange(10 ** 11, 10 ** 12)}",
+        "anomaly_severity": rnd.randrange(1, 5),
+        "cluster": None, "namespace": None,
+        "resource_id": f"arn:aws:iam::123456789012:user/user-{rnd.randrange(200)}",
+        "resource_type": "iam_user",
+        "mitre_categories": ["Discovery", "Credential Access"],
+        "acknowledged": False,
+        "signal_types": ["event", "anomaly"],
+        "session_list": [{"ip_address": f"10.0.{rnd.randrange(256)}.{rnd.randrange(256)}",
+                          "access_key": f"AKIA{rnd.randrange(10 ** 15):016d}",
+                          "user_agent": "aws-cli/2.15.0 Python/3.11.6 Linux/6.5.0 botocore/2.4.5",
+                          "country_code_iso": "US", "mfa": False} for _ in range(3)],
+        "__typename": "Detection"} for i in range(count)]}}}
+
+
+def rule_metadata_response():
+    attribute = {"operand": "and", "attributes_list": [
+        {"name": f"Attribute{i}", "operator": "equals", "value": "true", "__typename": "Attribute"}
+        for i in range(30)], "__typename": "Attributes"}
+    condition = {"resource_id": None, "resource_type": "instance", "attributes": attribute,
+                 "tags": {"operand": "or", "tags_list": [], "__typename": "Tags"}, "__typename": "ResourceCondition"}
+    return {"data": {"rule": {"id": "rule-1", "name": "Resource is public Internet facing", "status": "active",
+                              "description": "Long description " * 40, "remediation": "Remediation steps " * 60,
+                              "labels": ["Cost Label: Compute"] * 5, "compliance": ["CIS", "SOC2", "PCI"],
+                              "path_source_predicate": condition, "path_intermediate_predicate": condition,
+                              "path_destination_predicate": condition, "resource_predicate": condition,
+                              "__typename": "Rule"}}}
+
+
+def timed(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main(detections, repeat):
+    print(f"JSON backend: {JSON_BACKEND}, brotli: {'yes' if brotli else 'not installed'}\n")
+    header = f"{'response':<24}{'raw':>12}{'gzip':>12}{'br':>12}{'text+json':>14}{'bytes+codec':>14}"
+    print(header)
+    print("-" * len(header))
+    for name, body in (("detection enrichment", detection_enrichment_response(detections)),
+                       ("rule metadata", rule_metadata_response())):
+        raw = json.dumps(body).encode()
+        gzipped = len(gzip.compress(raw, 6))
+        brotlied = len(brotli.compress(raw, quality=5)) if brotli else None
+        # Before: requests decodes res.text to str, then json.loads parses the str
+        before = timed(lambda: json.loads(raw.decode("utf-8")), repeat)
+        # After: the codec parses res.content directly
+        after = timed(lambda: loads(raw), repeat)
+        print(f"{name:<24}{len(raw):>12,}{gzipped:>12,}{brotlied if brotlied else '-':>12}"
+              f"{before:>12.2f}ms{after:>12.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare response sizes and JSON decode times.')
+    parser.add_argument("--detections", type=int, default=500, help="Detections in the enrichment response")
+    parser.add_argument("--repeat", type=int, default=20, help="Timing repetitions, the best one is reported")
+    args = parser.parse_args()
+    main(args.detections, args.repeat)
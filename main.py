@@ -1,14 +1,30 @@
+import asyncio
+import collections
+import contextlib
+import functools
+import mimetypes
 import os
+import shutil
+import tempfile
+import threading
 import uvicorn
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi import APIRouter, FastAPI, HTTPException
+from fastapi.responses import StreamingResponse, FileResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from typing import Dict, Any
 from src.python.common.logger import Logger
+from src.python.common.common import enable_client_cache, get_graph_client
+from src.python.common.csv_stream import DEFAULT_CHUNK_SIZE, csv_chunks, gzip_chunks
+from src.python.common.graph_common import SessionExpiredError
+from src.python.common.graph_metrics import DEFAULT_METRICS
+from src.python.common.report_jobs import FAILED, SUCCEEDED, JobQueue, submission_key
+from src.python.common.report_pool import ReportPool
+from src.python.common.result_cache import ResultCache, result_key
 from starlette.background import BackgroundTasks
 from starlette.requests import Request
-app = FastAPI()
+# The endpoints, served by the app of create_app()
+router = APIRouter()
 log = Logger().get_logger()
 
 from src.python.utilities import generate_cost_report as cost_report
@@ -24,259 +40,437 @@ from src.python.utilities import export_inventory_count_by_account
 from src.python.utilities import export_detections as export_enriched_detections
 
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
 
-@app.get("/")
+@router.get("/")
 async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
-@app.post("/generate_cost_report")
-def generate_cost_report(payload: Dict[Any, Any], background_tasks: BackgroundTasks):
-    log.info(f"### Generate Cost Report requested - {payload['environment_sub_domain'].replace('!', '')}")
-    arguments = [payload['environment_sub_domain'].replace('!', ''), payload['environment_user_name'],
-                 payload['environment_password'], payload.get('environment_f2a_token', None), payload['ws_name'],
-                 payload['start_timestamp'], payload['end_timestamp'], payload['period'],
-                 payload.get('ignore_discounts', None)]
-    if payload['environment_sub_domain'].startswith('!'):
-        arguments.append("true")
-    try:
-        file_name = cost_report.main(*arguments)
-        headers = {
-            'Content-Type': 'text/csv',
-            'Content-Disposition': f'attachment; filename="{file_name}"'
-        }
-        background_tasks.add_task(remove_file, file_name)
-        with open(file_name) as csv_file:
-            return StreamingResponse(iter([csv_file.read()]), headers=headers)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@router.get("/metrics")
+def metrics():
+    # GraphQL calls of every report run by this process, in the Prometheus text format
+    return PlainTextResponse(DEFAULT_METRICS.to_prometheus(), media_type="text/plain; version=0.0.4")
 
 
-@app.post("/generate_cost_report_main_pipeline")
-def generate_cost_report(payload: Dict[Any, Any], background_tasks: BackgroundTasks):
-    log.info(f"### Generate Cost Report Main Pipeline requested - {payload['environment_sub_domain'].replace('!', '')}")
+def _arguments(payload, *names, optional=()):
+    """ Positional arguments of a utility's main(): the credentials, then payload[names], then payload.get(optional).
+        A "!" prefixed environment_sub_domain is a stage environment.
+    """
     arguments = [payload['environment_sub_domain'].replace('!', ''), payload['environment_user_name'],
-                 payload['environment_password'], payload.get('environment_f2a_token', None), payload['ws_name'],
-                 payload['start_timestamp'], payload['end_timestamp'], payload['period']]
+                 payload['environment_password'], payload.get('environment_f2a_token', None), payload['ws_name']]
+    arguments += [payload[name] for name in names] + [payload.get(name, None) for name in optional]
     if payload['environment_sub_domain'].startswith('!'):
         arguments.append("true")
-    try:
-        file_name = cost_report_main_pipeline.main(*arguments)
-        headers = {
-            'Content-Type': 'text/csv',
-            'Content-Disposition': f'attachment; filename="{file_name}"'
-        }
-        background_tasks.add_task(remove_file, file_name)
-        with open(file_name) as csv_file:
-            return StreamingResponse(iter([csv_file.read()]), headers=headers)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return arguments, {}
 
 
-@app.post("/generate_cost_recommendations")
-def generate_cost_recommendations(payload: Dict[Any, Any], background_tasks: BackgroundTasks):
-    log.info(f"### Generate Cost Recommendations requested - {payload['environment_sub_domain'].replace('!', '')}")
-    arguments = [payload['environment_sub_domain'].replace('!', ''), payload['environment_user_name'],
-                 payload['environment_password'], payload.get('environment_f2a_token', None), payload['ws_name']]
+def _detections_arguments(payload):
+    token = payload.get('token') or None
+    username = payload.get('environment_user_name') or None
+    password = payload.get('environment_password') or None
+    if not token and not (username and password):
+        raise HTTPException(
+            status_code=400,
+            detail="Must provide either token or both environment_user_name and environment_password")
+    arguments = [payload['environment_sub_domain'].replace('!', ''), username, password,
+                 payload.get('environment_f2a_token') or None, payload['ws_name'],
+                 payload['start_time'], payload['end_time']]
+    kwargs = {'token': token}
     if payload['environment_sub_domain'].startswith('!'):
-        arguments.append("true")
-    try:
-        file_name = cost_recommendations.main(*arguments)
-        headers = {
-            'Content-Type': 'text/csv',
-            'Content-Disposition': f'attachment; filename="{file_name}"'
-        }
-        background_tasks.add_task(remove_file, file_name)
-        with open(file_name) as csv_file:
-            return StreamingResponse(iter([csv_file.read()]), headers=headers)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        kwargs['stage'] = True
+    return arguments, kwargs
 
 
-@app.post("/export_ec2_os_info")
-def generate_cost_recommendations(payload: Dict[Any, Any], background_tasks: BackgroundTasks):
-    log.info(f"### Export EC2 Instances OS Info requested - {payload['environment_sub_domain'].replace('!', '')}")
-    arguments = [payload['environment_sub_domain'].replace('!', ''), payload['environment_user_name'],
-                 payload['environment_password'], payload.get('environment_f2a_token', None), payload['ws_name']]
-    if payload['environment_sub_domain'].startswith('!'):
-        arguments.append("true")
-    try:
-        file_name = export_ec2_os.main(*arguments)
-        headers = {
-            'Content-Type': 'text/csv',
-            'Content-Disposition': f'attachment; filename="{file_name}"'
-        }
-        background_tasks.add_task(remove_file, file_name)
-        with open(file_name) as csv_file:
-            return StreamingResponse(iter([csv_file.read()]), headers=headers)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+# title - logged when requested, main - the utility, arguments - function(payload) returning main's (args, kwargs),
+# client_errors - main raises LookupError for missing data (404) and ValueError for bad input (400), not just 500s,
+# rows - the utility's export_rows, taking main's arguments and returning a CsvExport streamed to the response,
+# cpu_bound - main spends its time building the file rather than waiting on the API, run it in the process pool,
+# max_age - seconds its result is reused for by identical requests (see result_key), 0 to always run it
+Report = collections.namedtuple("Report", "title main arguments client_errors rows cpu_bound max_age",
+                                defaults=(False, None, False, 0))
+# Cost data is updated daily, findings and the inventory within minutes
+COST_MAX_AGE = 6 * 3600
+FINDINGS_MAX_AGE = 15 * 60
+INVENTORY_MAX_AGE = 10 * 60
+EVENTS_MAX_AGE = 5 * 60
+REPORTS = {
+    "generate_cost_report": Report(
+        "Generate Cost Report", cost_report.main,
+        lambda p: _arguments(p, 'start_timestamp', 'end_timestamp', 'period', optional=('ignore_discounts',)),
+        rows=cost_report.export_rows, max_age=COST_MAX_AGE),
+    "generate_cost_report_main_pipeline": Report(
+        "Generate Cost Report Main Pipeline", cost_report_main_pipeline.main,
+        lambda p: _arguments(p, 'start_timestamp', 'end_timestamp', 'period'),
+        rows=cost_report_main_pipeline.export_rows, max_age=COST_MAX_AGE),
+    "generate_cost_recommendations": Report(
+        "Generate Cost Recommendations", cost_recommendations.main, lambda p: _arguments(p),
+        rows=cost_recommendations.export_rows, max_age=FINDINGS_MAX_AGE),
+    "export_ec2_os_info": Report(
+        "Export EC2 Instances OS Info", export_ec2_os.main, lambda p: _arguments(p), rows=export_ec2_os.export_rows,
+        max_age=INVENTORY_MAX_AGE),
+    "generate_compliance_report": Report(
+        "Generate Compliance Report", compliance_report.main,
+        lambda p: _arguments(p, 'compliance_standard', optional=('accounts', 'label')), cpu_bound=True,
+        max_age=FINDINGS_MAX_AGE),
+    "generate_export_inventory": Report(
+        "Export inventory", export_inventory.main,
+        lambda p: _arguments(p, 'resource_type', optional=('accounts', 'tags')),
+        rows=export_inventory.export_rows, max_age=INVENTORY_MAX_AGE),
+    "export_inventory_count": Report(
+        "Export inventory count", export_inventory_count_by_account.main,
+        lambda p: _arguments(p, optional=('accounts',)),
+        rows=export_inventory_count_by_account.export_rows, max_age=INVENTORY_MAX_AGE),
+    "export_flow_logs": Report(
+        "Export Flow Logs", export_fl.main,
+        lambda p: _arguments(p, optional=('action', 'dst_resource_id', 'start_time', 'end_time', 'src_public',
+                                          'protocols')),
+        rows=export_fl.export_rows, max_age=EVENTS_MAX_AGE),
+    "export_eks_cost": Report(
+        "Export EKS Cost", export_k8s_cost.main, lambda p: _arguments(p, 'start_timestamp', 'end_timestamp'),
+        rows=export_k8s_cost.export_rows, max_age=COST_MAX_AGE),
+    "export_vulnerabilities": Report(
+        "Export Vulnerabilities", export_vuln.main,
+        lambda p: _arguments(p, optional=('publicly_exposed', 'exploit_available', 'fix_available', 'cve_id',
+                                          'severity')),
+        rows=export_vuln.export_rows, max_age=FINDINGS_MAX_AGE),
+    "export_detections": Report(
+        "Export detections", export_enriched_detections.main, _detections_arguments, True,
+        rows=export_enriched_detections.export_rows, max_age=EVENTS_MAX_AGE),
+}
+# Set up by lifespan() when the app starts, so importing this module starts nothing, e.g. in the report pool's
+# worker processes, which import it again. Every report runs in the pool, off the event loop and within its
+# endpoint's cap
+pool = None
+# Reports run in the background by the /jobs endpoints
+jobs = None
+# Results of the reports with a max_age, by endpoint and payload
+results = None
 
 
-@app.post("/generate_compliance_report")
-async def generate_compliance_report(payload: Dict[Any, Any], background_tasks: BackgroundTasks):
-    log.info(f"### Generate Compliance Report requested - {payload['environment_sub_domain'].replace('!', '')}")
-    arguments = [payload['environment_sub_domain'].replace('!', ''), payload['environment_user_name'],
-                 payload['environment_password'], payload.get('environment_f2a_token', None), payload['ws_name'],
-                 payload['compliance_standard'], payload.get('accounts', None), payload.get('label', None)]
-    if payload['environment_sub_domain'].startswith('!'):
-        arguments.append("true")
+def _error_status(report, error):
+    if isinstance(error, SessionExpiredError):
+        # The user has to log in again with a new one-time password
+        return 401
+    if report.client_errors and isinstance(error, LookupError):
+        return 404
+    if report.client_errors and isinstance(error, ValueError):
+        return 400
+    return 500
+
+
+def _file_response(file_name):
+    """ Respond with a report's file. """
+    headers = {'Content-Disposition': f'attachment; filename="{os.path.basename(file_name)}"'}
+    if file_name.endswith('.csv'):
+        headers['Content-Type'] = 'text/csv'
+        return StreamingResponse(_file_chunks(file_name), headers=headers)
+    return FileResponse(file_name, headers=headers)
+
+
+def _open_file_response(file, request=None, background_tasks=None, output=None):
+    """ Respond with a report's file opened beforehand, so it's sent even if it's removed meanwhile, and close it once
+        sent; CSV files are gzipped if the request accepts it. The output directory is removed once sent, if given.
+    """
+    file_name = os.path.basename(file.name)
+    chunks = iter(functools.partial(file.read, DEFAULT_CHUNK_SIZE), b'')
+    if output is not None:
+        background_tasks.add_task(remove_output, output)
+    if request is not None and file_name.endswith('.csv'):
+        return _csv_response(file_name, chunks, request, file.close)
+    headers = {'Content-Disposition': f'attachment; filename="{file_name}"',
+               'Content-Length': str(os.fstat(file.fileno()).st_size)}
+    media_type = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+    on_close = _once(file.close)
+    return _ClosingResponse(pool.iterate(chunks, on_close), on_close, headers=headers, media_type=media_type)
+
+
+def _logged_chunks(title, chunks):
+    # Once streaming started the status is sent, so a failure can only be logged and the response cut short
     try:
-        file_name = compliance_report.main(*arguments)
-        headers = {'Content-Disposition': f'attachment; filename="{file_name}"'}
-        background_tasks.add_task(remove_file, file_name)
-        return FileResponse(file_name, headers=headers)
+        yield from chunks
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        log.error(f"{title} failed while streaming: {e}")
+        raise
 
 
-@app.post("/generate_export_inventory")
-def generate_export_inventory(payload: Dict[Any, Any], background_tasks: BackgroundTasks):
-    log.info(f"### Export inventory requested - {payload['environment_sub_domain'].replace('!', '')}")
-    arguments = [payload['environment_sub_domain'].replace('!', ''), payload['environment_user_name'],
-                 payload['environment_password'], payload.get('environment_f2a_token', None), payload['ws_name'],
-                 payload['resource_type'], payload.get('accounts', None), payload.get('tags', None)]
-    if payload['environment_sub_domain'].startswith('!'):
-        arguments.append("true")
+def _cached_chunks(chunks, pending):
+    # Keep a copy of what's sent, cached only if the whole report was
     try:
-        file_name = export_inventory.main(*arguments)
-        headers = {
-            'Content-Type': 'text/csv',
-            'Content-Disposition': f'attachment; filename="{file_name}"'
-        }
-        background_tasks.add_task(remove_file, file_name)
-        with open(file_name) as csv_file:
-            return StreamingResponse(iter([csv_file.read()]), headers=headers)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        for chunk in chunks:
+            pending.write(chunk)
+            yield chunk
+    except BaseException:
+        pending.discard()
+        raise
+    pending.commit()
 
 
-@app.post("/export_inventory_count")
-def export_inventory_count(payload: Dict[Any, Any], background_tasks: BackgroundTasks):
-    log.info(f"### Export inventory count requested - {payload['environment_sub_domain'].replace('!', '')}")
-    arguments = [payload['environment_sub_domain'].replace('!', ''), payload['environment_user_name'],
-                 payload['environment_password'], payload.get('environment_f2a_token', None), payload['ws_name'],
-                 payload.get('accounts', None)]
-    if payload['environment_sub_domain'].startswith('!'):
-        arguments.append("true")
+def _file_chunks(path):
+    with open(path, 'rb') as file:
+        yield from iter(lambda: file.read(DEFAULT_CHUNK_SIZE), b'')
+
+
+def _once(func):
+    """ Wrap a function so that only its first call runs it. """
+    lock = threading.Lock()
+    pending = [func]
+
+    def call():
+        with lock:
+            funcs = pending[:]
+            pending.clear()
+        for pending_func in funcs:
+            pending_func()
+    return call
+
+
+class _ClosingResponse(StreamingResponse):
+    def __init__(self, content, on_close, **kwargs):
+        """ A streamed response calling on_close once it's over, even if its body was never read, e.g. when the
+            client left or sending failed before the first chunk.
+        """
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.on_close()
+
+
+def _csv_response(file_name, chunks, request, on_close=None):
+    headers = {'Content-Disposition': f'attachment; filename="{file_name}"', 'Content-Type': 'text/csv'}
+    if 'gzip' in request.headers.get('accept-encoding', ''):
+        headers['Content-Encoding'] = 'gzip'
+        chunks = gzip_chunks(chunks)
+    if on_close is None:
+        return StreamingResponse(pool.iterate(chunks), headers=headers)
+    # Called by whichever ends first, the last chunk or the response
+    on_close = _once(on_close)
+    # Read in the report pool, e.g. the rows of an export as they're fetched
+    return _ClosingResponse(pool.iterate(chunks, on_close), on_close, headers=headers)
+
+
+async def _stream_report(name, report, args, kwargs, request, key):
+    limit = pool.limit(name)
+    await limit.acquire_async()
     try:
-        file_name = export_inventory_count_by_account.main(*arguments)
-        headers = {
-            'Content-Type': 'text/csv',
-            'Content-Disposition': f'attachment; filename="{file_name}"'
-        }
-        background_tasks.add_task(remove_file, file_name)
-        with open(file_name) as csv_file:
-            return StreamingResponse(iter([csv_file.read()]), headers=headers)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        export = await asyncio.wrap_future(pool.submit(report.rows, *args, **kwargs))
+    except BaseException:
+        limit.release()
+        raise
+    chunks = _logged_chunks(report.title, csv_chunks(export))
+    on_close = limit.release
+    if key is not None:
+        pending = results.open(key, export.file_name)
+        chunks = _cached_chunks(chunks, pending)
 
+        def on_close():
+            # A no-op once committed, removes what was written of a response cut short
+            pending.discard()
+            limit.release()
+    # Holding the endpoint's slot until the last row is sent
+    return _csv_response(export.file_name, chunks, request, on_close)
 
-@app.post("/export_flow_logs")
-def export_flow_logs(payload: Dict[Any, Any], background_tasks: BackgroundTasks):
-    log.info(f"### Export Flow Logs requested - {payload['environment_sub_domain'].replace('!', '')}")
-    arguments = [payload['environment_sub_domain'].replace('!', ''), payload['environment_user_name'],
-                 payload['environment_password'], payload.get('environment_f2a_token', None), payload['ws_name'],
-                 payload.get('action', None), payload.get('dst_resource_id', None), payload.get('start_time', None),
-                 payload.get('end_time', None), payload.get('src_public', None), payload.get('protocols', None)]
-    if payload['environment_sub_domain'].startswith('!'):
-        arguments.append("true")
+
+def _login(payload):
+    """ Log in as the requester and read the workspace, raising if they can't. """
+    environment = payload['environment_sub_domain']
+    graph_client = get_graph_client(
+        environment.replace('!', ''), payload.get('environment_user_name') or None,
+        payload.get('environment_password') or None, payload.get('environment_f2a_token') or None, payload['ws_name'],
+        environment.startswith('!'), token=payload.get('token') or None)
+    graph_client.get_accounts()
+
+
+async def _cached_result(name, report, payload, request):
+    key = result_key(name, payload)
+    # Opened right away, so it can't be evicted or replaced before it's sent
+    reader = results.read(key, report.max_age)
+    if reader is None:
+        return key, None
     try:
-        file_name = export_fl.main(*arguments)
-        headers = {
-            'Content-Type': 'text/csv',
-            'Content-Disposition': f'attachment; filename="{file_name}"'
-        }
-        background_tasks.add_task(remove_file, file_name)
-        with open(file_name) as csv_file:
-            return StreamingResponse(iter([csv_file.read()]), headers=headers)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        # The key has no credentials, so make sure this requester may read the workspace before handing it out
+        await asyncio.wrap_future(pool.submit(_login, payload))
+    except BaseException:
+        reader.close()
+        raise
+    log.info(f"Serving the result of an identical request, up to {report.max_age} seconds old")
+    return key, _open_file_response(reader, request)
 
 
-@app.post("/export_eks_cost")
-def export_eks_cost(payload: Dict[Any, Any], background_tasks: BackgroundTasks):
-    log.info(f"### Export EKS Cost requested - {payload['environment_sub_domain'].replace('!', '')}")
-    arguments = [payload['environment_sub_domain'].replace('!', ''), payload['environment_user_name'],
-                 payload['environment_password'], payload.get('environment_f2a_token', None), payload['ws_name'],
-                 payload['start_timestamp'], payload['end_timestamp']]
-    if payload['environment_sub_domain'].startswith('!'):
-        arguments.append("true")
+async def _file_report(name, report, args, kwargs, key, background_tasks):
+    # Each request writes in its own directory, so identical reports running at once never share a file
+    output = tempfile.mkdtemp(prefix="stream_report_")
+    file = None
     try:
-        file_name = export_k8s_cost.main(*arguments)
-        headers = {
-            'Content-Type': 'text/csv',
-            'Content-Disposition': f'attachment; filename="{file_name}"'
-        }
-        background_tasks.add_task(remove_file, file_name)
-        with open(file_name) as csv_file:
-            return StreamingResponse(iter([csv_file.read()]), headers=headers)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        file_name = await pool.run(name, report.main, *args, cpu_bound=report.cpu_bound, output=output, **kwargs)
+        # Opened before it's moved into the cache, where another request may evict it before it's sent
+        file = open(file_name, 'rb')
+        if key is not None:
+            # Kept for the next identical request, unless larger than the whole cache
+            results.put(key, file_name)
+    except BaseException:
+        if file is not None:
+            file.close()
+        remove_output(output)
+        raise
+    return _open_file_response(file, background_tasks=background_tasks, output=output)
 
 
-@app.post("/export_vulnerabilities")
-def export_vulnerabilities(payload: Dict[Any, Any], background_tasks: BackgroundTasks):
-    log.info(f"### Export Vulnerabilities requested - {payload['environment_sub_domain'].replace('!', '')}")
-    arguments = [payload['environment_sub_domain'].replace('!', ''), payload['environment_user_name'],
-                 payload['environment_password'], payload.get('environment_f2a_token', None), payload['ws_name'],
-                 payload.get('publicly_exposed', None), payload.get('exploit_available', None),
-                 payload.get('fix_available', None), payload.get('cve_id', None), payload.get('severity', None)]
-    if payload['environment_sub_domain'].startswith('!'):
-        arguments.append("true")
+async def run_report(name, payload, background_tasks, request=None):
+    """ Run a report in the report pool and respond with its file; CSV reports are streamed as their rows are
+        fetched, gzipped if the client accepts it. Results are reused for max_age seconds, unless force_refresh.
+    """
+    report = REPORTS[name]
+    log.info(f"### {report.title} requested - {payload['environment_sub_domain'].replace('!', '')}")
+    args, kwargs = report.arguments(payload)
     try:
-        file_name = export_vuln.main(*arguments)
-        headers = {
-            'Content-Type': 'text/csv',
-            'Content-Disposition': f'attachment; filename="{file_name}"'
-        }
-        background_tasks.add_task(remove_file, file_name)
-        with open(file_name) as csv_file:
-            return StreamingResponse(iter([csv_file.read()]), headers=headers)
+        key = None
+        if report.max_age:
+            if payload.get('force_refresh'):
+                key = result_key(name, payload)
+            else:
+                key, response = await _cached_result(name, report, payload, request)
+                if response is not None:
+                    return response
+        if report.rows is not None and request is not None:
+            # Login and validation happen here, so their errors still get a status; the rows are fetched when sent
+            return await _stream_report(name, report, args, kwargs, request, key)
+        return await _file_report(name, report, args, kwargs, key, background_tasks)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=_error_status(report, e), detail=str(e))
 
 
-@app.post("/export_detections")
-def export_detections(payload: Dict[Any, Any], background_tasks: BackgroundTasks):
-    log.info(f"### Export detections requested - {payload['environment_sub_domain'].replace('!', '')}")
-    token = payload.get('token') or None
-    username = payload.get('environment_user_name') or None
-    password = payload.get('environment_password') or None
-    if not token and not (username and password):
-        raise HTTPException(
-            status_code=400,
-            detail="Must provide either token or both environment_user_name and environment_password")
-    arguments = [payload['environment_sub_domain'].replace('!', ''), username, password,
-                 payload.get('environment_f2a_token') or None, payload['ws_name'],
-                 payload['start_time'], payload['end_time']]
-    kwargs = {'token': token}
-    if payload['environment_sub_domain'].startswith('!'):
-        kwargs['stage'] = True
+@router.post("/generate_cost_report")
+async def generate_cost_report(payload: Dict[Any, Any], background_tasks: BackgroundTasks, request: Request):
+    return await run_report("generate_cost_report", payload, background_tasks, request)
+
+
+@router.post("/generate_cost_report_main_pipeline")
+async def generate_cost_report_main_pipeline(payload: Dict[Any, Any], background_tasks: BackgroundTasks,
+                                             request: Request):
+    return await run_report("generate_cost_report_main_pipeline", payload, background_tasks, request)
+
+
+@router.post("/generate_cost_recommendations")
+async def generate_cost_recommendations(payload: Dict[Any, Any], background_tasks: BackgroundTasks, request: Request):
+    return await run_report("generate_cost_recommendations", payload, background_tasks, request)
+
+
+@router.post("/export_ec2_os_info")
+async def export_ec2_os_info(payload: Dict[Any, Any], background_tasks: BackgroundTasks, request: Request):
+    return await run_report("export_ec2_os_info", payload, background_tasks, request)
+
+
+@router.post("/generate_compliance_report")
+async def generate_compliance_report(payload: Dict[Any, Any], background_tasks: BackgroundTasks):
+    return await run_report("generate_compliance_report", payload, background_tasks)
+
+
+@router.post("/generate_export_inventory")
+async def generate_export_inventory(payload: Dict[Any, Any], background_tasks: BackgroundTasks, request: Request):
+    return await run_report("generate_export_inventory", payload, background_tasks, request)
+
+
+@router.post("/export_inventory_count")
+async def export_inventory_count(payload: Dict[Any, Any], background_tasks: BackgroundTasks, request: Request):
+    return await run_report("export_inventory_count", payload, background_tasks, request)
+
+
+@router.post("/export_flow_logs")
+async def export_flow_logs(payload: Dict[Any, Any], background_tasks: BackgroundTasks, request: Request):
+    return await run_report("export_flow_logs", payload, background_tasks, request)
+
+
+@router.post("/export_eks_cost")
+async def export_eks_cost(payload: Dict[Any, Any], background_tasks: BackgroundTasks, request: Request):
+    return await run_report("export_eks_cost", payload, background_tasks, request)
+
+
+@router.post("/export_vulnerabilities")
+async def export_vulnerabilities(payload: Dict[Any, Any], background_tasks: BackgroundTasks, request: Request):
+    return await run_report("export_vulnerabilities", payload, background_tasks, request)
+
+
+@router.post("/export_detections")
+async def export_detections(payload: Dict[Any, Any], background_tasks: BackgroundTasks, request: Request):
+    return await run_report("export_detections", payload, background_tasks, request)
+
+
+# Jobs: the same reports, run in the background so large ones don't hit proxy timeouts
+@router.post("/jobs/{name}", status_code=202)
+def submit_job(name: str, payload: Dict[Any, Any]):
+    report = REPORTS.get(name)
+    if report is None:
+        raise HTTPException(status_code=404, detail=f"Unknown report {name}, available reports: {list(REPORTS)}")
+    log.info(f"### {report.title} job requested - {payload['environment_sub_domain'].replace('!', '')}")
+    args, kwargs = report.arguments(payload)
+    job = jobs.submit(name, submission_key(name, payload), pool.call, name, report.main, *args,
+                      cpu_bound=report.cpu_bound, **kwargs)
+    return job.to_dict()
+
+
+def _get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found, it may have expired")
+    return job
+
+
+@router.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    return _get_job(job_id).to_dict()
+
+
+@router.get("/jobs/{job_id}/progress")
+def job_progress(job_id: str):
+    job = _get_job(job_id)
+    return {"job_id": job.id, "status": job.status, "log_lines": job.log_lines, "progress": job.progress}
+
+
+@router.get("/jobs/{job_id}/artifact")
+def job_artifact(job_id: str):
+    job = _get_job(job_id)
+    if job.status == FAILED:
+        raise HTTPException(status_code=_error_status(REPORTS[job.endpoint], job.exception), detail=job.error)
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job.status}")
+    # Kept until the job expires, so it can be downloaded again
+    return _file_response(job.artifact)
+
+
+def remove_output(path: str) -> None:
+    log.info(f'Removing "{path}"')
+    shutil.rmtree(path, ignore_errors=True)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    """ Set up the report pool, the job queue and the caches when the app starts, and shut them down when it stops. """
+    global pool, jobs, results
+    # Follow-up reports of the same user and workspace reuse the login of the first one, in worker processes too
+    enable_client_cache()
+    pool = ReportPool(initializer=enable_client_cache)
+    jobs = JobQueue()
+    results = ResultCache()
     try:
-        file_name = export_enriched_detections.main(*arguments, **kwargs)
-        headers = {
-            'Content-Type': 'text/csv',
-            'Content-Disposition': f'attachment; filename="{file_name}"'
-        }
-        background_tasks.add_task(remove_file, file_name)
-        with open(file_name) as csv_file:
-            return StreamingResponse(iter([csv_file.read()]), headers=headers)
-    except LookupError as e:
-        raise HTTPException(status_code=404, detail=str(e))
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        yield
+    finally:
+        jobs.shutdown(wait=False)
+        pool.shutdown(wait=False)
 
 
-def remove_file(path: str) -> None:
-    log.info(f'Removing file "{path}"')
-    os.unlink(path)
+def create_app():
+    """ Build the web app, e.g. "uvicorn main:create_app --factory". """
+    app = FastAPI(lifespan=lifespan)
+    app.mount("/static", StaticFiles(directory="static"), name="static")
+    app.include_router(router)
+    return app
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, port=80, host="0.0.0.0")
+    uvicorn.run(create_app(), port=80, host="0.0.0.0")
@@ -0,0 +1,95 @@
+import collections
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+
+# Logged in sessions kept, the least recently used is dropped beyond it
+DEFAULT_MAX_SESSIONS = int(os.environ.get("STREAM_SESSION_CACHE_SIZE", 256))
+# Seconds an unused session is kept for
+DEFAULT_SESSION_IDLE_TTL = int(os.environ.get("STREAM_SESSION_CACHE_TTL", 900))
+# Seconds before its token expires at which a session is no longer handed out, so a run doesn't start on it
+DEFAULT_EXPIRY_MARGIN = 300
+
+# token - the "Bearer ..." access token, expires_at - its expiry (None if unknown), customer_id - the workspace ID
+CachedSession = collections.namedtuple("CachedSession", "token expires_at customer_id")
+
+
+class ClientCache:
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS, idle_ttl=DEFAULT_SESSION_IDLE_TTL,
+                 expiry_margin=DEFAULT_EXPIRY_MARGIN):
+        """ Sessions of earlier logins, so the next request of the same user and workspace skips the login and the
+            workspace lookup. Credentials are never stored: entries are keyed by an HMAC of them under a key that
+            exists only in this process's memory, and only the token and the workspace ID are kept.
+            :param max_sessions (int)   - Sessions kept.
+            :param idle_ttl (int)       - Seconds an unused session is kept for.
+            :param expiry_margin (int)  - Seconds before its token expires at which a session is dropped.
+        """
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.expiry_margin = expiry_margin
+        self.hits = 0
+        self.misses = 0
+        self._secret = secrets.token_bytes(32)
+        self._sessions = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, url, ws_name, username=None, password=None, token=None):
+        """ Key of a login. Logins with a one-time password are never kept, so a password alone never unlocks a
+            session that needed a second factor.
+            :param url (str)        - GraphQL URL of the environment.
+            :param ws_name (str)    - Workspace name (or ID, with an API token).
+            :returns (str)          - HMAC-SHA256 hex digest.
+        """
+        fields = [url, ws_name, username, password, token]
+        message = "\0".join("" if field is None else str(field) for field in fields)
+        return hmac.new(self._secret, message.encode(), hashlib.sha256).hexdigest()
+
+    def _usable(self, session, last_used, now):
+        if now - last_used > self.idle_ttl:
+            return False
+        return session.expires_at is None or now < session.expires_at - self.expiry_margin
+
+    def get(self, key):
+        """ Get a session.
+            :param key (str)            - Key of the login, see key().
+            :returns (CachedSession)    - The session, None if unknown, idle for too long or about to expire.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.pop(key, None)
+            if entry is None or not self._usable(*entry, now):
+                self.misses += 1
+                return None
+            self._sessions[key] = (entry[0], now)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, client):
+        """ Keep the session of a logged in client.
+            :param key (str)            - Key of the login, see key().
+            :param client (GraphCommon) - The client.
+        """
+        session = CachedSession(client.token, client.token_expires_at, client.customer_id)
+        now = time.time()
+        with self._lock:
+            self._sessions.pop(key, None)
+            if not self._usable(session, now, now):
+                return
+            self._sessions[key] = (session, now)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def evict(self, key):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
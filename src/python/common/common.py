@@ -1,42 +1,179 @@
+import atexit
+import collections
+import concurrent.futures
 import logging
 import os
+import threading
 import sys
 
 # Add the project root directory to the Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
 try:
-    from src.python.common.graph_common import GraphCommon
+    from src.python.common.graph_common import GraphCommon, GraphBatchError, get_shared_session, \
+        get_shared_limiter, get_shared_breaker
+    from src.python.common.resilience import GraphQueryError, CircuitOpenError
+    from src.python.common.graph_cache import ResponseCache
+    from src.python.common.graph_metrics import DEFAULT_METRICS, GraphMetrics
+    from src.python.common.disk_cache import ResourceStore
+    from src.python.common.csv_stream import CsvExport, is_stream, output_path, write_csv
+    from src.python.common.client_cache import ClientCache
     from src.python.common.logger import Logger
 except ModuleNotFoundError:
     sys.path.append("../../..")
-    from src.python.common.graph_common import GraphCommon
+    from src.python.common.graph_common import GraphCommon, GraphBatchError, get_shared_session, \
+        get_shared_limiter, get_shared_breaker
+    from src.python.common.resilience import GraphQueryError, CircuitOpenError
+    from src.python.common.graph_cache import ResponseCache
+    from src.python.common.graph_metrics import DEFAULT_METRICS, GraphMetrics
+    from src.python.common.disk_cache import ResourceStore
+    from src.python.common.csv_stream import CsvExport, is_stream, output_path, write_csv
+    from src.python.common.client_cache import ClientCache
     from src.python.common.logger import Logger
 
 log = logging.getLogger("stream_external_tools")
 if len(log.handlers) == 0:
     log = Logger().get_logger()
 
+# Items enriched at once by enrich_rows, so a large export is never held in memory
+DEFAULT_ENRICH_WINDOW = 256
 
-def get_graph_client(environment, ll_username, ll_password, ll_f2a, ws_name, stage, token=None):
-    log.info(f"Trying to login into Stream in environment {environment}")
+_metrics_summary_registered = False
+_metrics_summary_lock = threading.Lock()
+# Sessions reused by get_graph_client, off unless enabled, e.g. by the web app serving many requests per process
+_client_cache = None
+
+
+def _env_flag(name):
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def enable_client_cache(**kwargs):
+    """ Reuse the sessions of earlier logins in this process, see ClientCache.
+        :returns (ClientCache)  - The cache.
+    """
+    global _client_cache
+    _client_cache = ClientCache(**kwargs)
+    return _client_cache
+
+
+def disable_client_cache():
+    global _client_cache
+    _client_cache = None
+
+
+def log_graph_metrics(metrics=DEFAULT_METRICS):
+    """ Log the per operation summary table of the GraphQL calls made so far.
+        :param metrics (GraphMetrics)   - The metrics; Defaults to the process-wide ones.
+    """
+    table = metrics.summary_table()
+    if table:
+        log.info(f"GraphQL calls by operation:\n{table}")
+
+
+def register_metrics_summary():
+    """ Log the GraphQL metrics summary once the process exits, i.e. at the end of each CLI run. """
+    global _metrics_summary_registered
+    with _metrics_summary_lock:
+        if not _metrics_summary_registered:
+            atexit.register(log_graph_metrics)
+            _metrics_summary_registered = True
+
+
+def _graph_url(environment, stage):
     ll_url = f"https://{environment}.streamsec.io"
     if stage:
         ll_url = f"https://{environment}.lightops.io"
-    ll_graph_url = f"{ll_url}/graphql"
+    # STREAM_GRAPHQL_URL points the utilities at another server, e.g. the local stand-in (benchmarks/graph_standin.py)
+    return os.environ.get("STREAM_GRAPHQL_URL") or f"{ll_url}/graphql"
+
+
+def get_graph_client(environment, ll_username, ll_password, ll_f2a, ws_name, stage, token=None, cache=None,
+                     disk_cache=None):
+    log.info(f"Trying to login into Stream in environment {environment}")
+    ll_graph_url = _graph_url(environment, stage)
+    # Clients of the same environment share one keep-alive connection pool
+    session = get_shared_session(ll_graph_url)
+    # ... and one adaptive limit on requests in flight, so they back off together when the API is overloaded
+    limiter = get_shared_limiter(ll_graph_url)
+    # ... and one circuit breaker, so every client fails fast while the API is down
+    breaker = get_shared_breaker(ll_graph_url)
+    register_metrics_summary()
+    client_kwargs = dict(session=session, cache=cache, disk_cache=disk_cache, limiter=limiter, breaker=breaker,
+                         # Opt-ins for servers that support them, see GraphCommon
+                         persisted_queries=_env_flag("STREAM_PERSISTED_QUERIES"),
+                         compress_requests=_env_flag("STREAM_COMPRESS_REQUESTS"))
+    # Sessions that needed a second factor aren't kept: the next request has to pass it again
+    client_cache = None if ll_f2a else _client_cache
+    if client_cache is not None:
+        key = client_cache.key(ll_graph_url, ws_name, ll_username, ll_password, token)
+        cached = client_cache.get(key)
+        if cached is not None:
+            log.info("Reusing the session of an earlier login")
+            # The credentials matched, so the client can still log in again if the token is rejected
+            return GraphCommon(ll_graph_url, ll_username, ll_password, token=cached.token,
+                               customer_id=cached.customer_id, **client_kwargs)
     try:
         if token:
             # API tokens are workspace-scoped; the `workspaces` query isn't available,
             # so ws_name must be the workspace ID and we use it directly as customer_id.
             if not ws_name:
                 raise ValueError("Workspace ID is required when authenticating with an API token")
-            graph_client = GraphCommon(ll_graph_url, otp=ll_f2a, token=token, customer_id=ws_name)
+            graph_client = GraphCommon(ll_graph_url, otp=ll_f2a, token=token, customer_id=ws_name, **client_kwargs)
         else:
-            graph_client = GraphCommon(ll_graph_url, ll_username, ll_password, otp=ll_f2a)
+            graph_client = GraphCommon(ll_graph_url, ll_username, ll_password, otp=ll_f2a, **client_kwargs)
             if ws_name:
                 ws_id = graph_client.get_ws_id_by_name(ws_name)
                 graph_client.change_client_ws(ws_id)
         log.info("Logged in successfully!")
-        return graph_client
     except Exception as e:
         log.error(f"Couldn't login to the system, error: {e}")
         raise Exception(e)
+    if client_cache is not None:
+        client_cache.put(key, graph_client)
+    return graph_client
+
+
+def batch_lookup(lookup, ids, **kwargs):
+    """ Run one of GraphCommon's batch lookups, logging the IDs that failed instead of raising.
+        :param lookup (func)    - Batch method, e.g. graph_client.get_resources_metadata.
+        :param ids (list)       - IDs to look up.
+        :returns (dict)         - Result by ID of the IDs that succeeded and were found.
+    """
+    try:
+        results = lookup(ids, **kwargs)
+    except GraphBatchError as e:
+        for failed_id, message in e.errors.items():
+            log.warning(f"Lookup of {failed_id} failed | Error: {message}")
+        results = e.results
+    return {k: v for k, v in results.items() if v is not None}
+
+
+def enrich_rows(items, enrich, *args, window=DEFAULT_ENRICH_WINDOW):
+    """ Enrich items in a thread pool as they're read, e.g. the violations of GraphCommon.iter_csv_rule, keeping
+        their order and at most `window` of them in memory. An item whose enrichment fails is logged and kept as is.
+        :param items (iterable) - The items.
+        :param enrich (func)    - Called with args and an item, updating the item in place.
+        :param window (int)     - Items enriched at once.
+        :returns (generator)    - The enriched items.
+    """
+    pending = collections.deque()
+    executor = concurrent.futures.ThreadPoolExecutor()
+    try:
+        for item in items:
+            pending.append((item, executor.submit(enrich, *args, item)))
+            if len(pending) >= window:
+                yield _enriched(*pending.popleft())
+        while pending:
+            yield _enriched(*pending.popleft())
+    finally:
+        # Stop enriching the rest if the consumer stops early, e.g. a client disconnecting
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _enriched(item, future):
+    try:
+        future.result()
+    except Exception as e:
+        described = item.get("resource_id", item) if isinstance(item, dict) else item
+        log.warning(f"Couldn't enrich {described} | Error: {e}")
+    return item
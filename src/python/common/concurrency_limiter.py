@@ -0,0 +1,107 @@
+import contextlib
+import threading
+import time
+
+# Latency grows this many times over the baseline before it counts as the server being overloaded.
+DEFAULT_LATENCY_TOLERANCE = 2.0
+# Seconds a request must also exceed its baseline by, so jitter on very fast queries isn't taken for a spike.
+MIN_LATENCY_SPIKE = 0.1
+# Factor the limit is multiplied by on overload.
+DEFAULT_BACKOFF = 0.5
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial_limit, max_limit, min_limit=1, latency_tolerance=DEFAULT_LATENCY_TOLERANCE,
+                 backoff=DEFAULT_BACKOFF):
+        """ AIMD concurrency limit shared by the clients of one environment.
+            The limit grows by one every time a full window of requests completes at a steady latency, and is
+            multiplied by backoff when a request is throttled (429), fails on the server side (5xx, timeouts) or
+            takes latency_tolerance times longer than the baseline latency of its kind (e.g. its operation).
+            :param initial_limit (int)          - Requests allowed in flight at first.
+            :param max_limit (int)              - Upper bound of the limit.
+            :param min_limit (int)              - Lower bound of the limit.
+            :param latency_tolerance (float)    - Latency over the baseline considered a spike.
+            :param backoff (float)              - Multiplicative decrease on overload.
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.limit = max(min_limit, min(initial_limit, max_limit))
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.baseline_latency = {}
+        self.increases = 0
+        self.decreases = 0
+        self._successes = 0
+        self._last_decrease = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """ Wait for a free slot.
+            :returns (float)    - Start time, to pass to release().
+        """
+        with self._condition:
+            self.queue_depth += 1
+            try:
+                self._condition.wait_for(lambda: self.in_flight < self.limit)
+            finally:
+                self.queue_depth -= 1
+            self.in_flight += 1
+        return time.monotonic()
+
+    def release(self, started, overloaded=False, kind=None):
+        """ Free a slot and adapt the limit to how the request went.
+            :param started (float)      - Start time returned by acquire().
+            :param overloaded (bool)    - The server throttled or failed the request.
+            :param kind (str)           - Kind of request, latencies are only compared within the same kind.
+        """
+        latency = time.monotonic() - started
+        with self._condition:
+            self.in_flight -= 1
+            baseline = self.baseline_latency.get(kind)
+            spike = baseline is not None and latency > max(baseline * self.latency_tolerance,
+                                                           baseline + MIN_LATENCY_SPIKE)
+            if overloaded or spike:
+                # One decrease per round trip, requests already in flight saw the same conditions
+                if started > self._last_decrease:
+                    self.limit = max(self.min_limit, int(self.limit * self.backoff))
+                    self._last_decrease = time.monotonic()
+                    self._successes = 0
+                    self.decreases += 1
+            else:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_limit:
+                    self.limit += 1
+                    self._successes = 0
+                    self.increases += 1
+            if not overloaded:
+                # Slow moving average, so the baseline follows the server without chasing spikes
+                self.baseline_latency[kind] = latency if baseline is None else \
+                    0.9 * baseline + 0.1 * min(latency, baseline * self.latency_tolerance)
+            self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self, kind=None):
+        """ Hold a slot for the duration of a request.
+            Yields a dict; set its "overloaded" key to report a throttled or failed response.
+            Exceptions raised inside the block count as overload.
+            :param kind (str)   - Kind of request, latencies are only compared within the same kind.
+        """
+        started = self.acquire()
+        outcome = {"overloaded": False}
+        try:
+            yield outcome
+        except BaseException:
+            outcome["overloaded"] = True
+            raise
+        finally:
+            self.release(started, outcome["overloaded"], kind)
+
+    def stats(self):
+        """ Get the limiter state.
+            :returns (dict) - Current limit, requests in flight, queue depth and how often the limit changed.
+        """
+        with self._condition:
+            return {"limit": self.limit, "in_flight": self.in_flight, "queue_depth": self.queue_depth,
+                    "increases": self.increases, "decreases": self.decreases}
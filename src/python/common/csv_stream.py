@@ -0,0 +1,105 @@
+import collections
+import csv
+import io
+import os
+import zlib
+
+# Bytes of CSV buffered before a chunk is sent; a few rows each, far below the size of a report
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# file_name - name of the CSV file, header - column names, rows - iterable of dicts (keyed by the header, other keys
+# ignored) or lists, produced lazily so the export is written or sent as it's fetched
+CsvExport = collections.namedtuple("CsvExport", "file_name header rows")
+
+
+def _row_values(header, row):
+    if isinstance(row, dict):
+        return [row.get(column, "") for column in header]
+    return row
+
+
+def output_path(output, file_name):
+    """ Path a utility writes its file to.
+        :param output (str)     - Directory to write it in, or the file's path; Defaults to the working directory.
+        :param file_name (str)  - The file's own name.
+        :returns (str)          - The path.
+    """
+    if output is None:
+        return file_name
+    if os.path.isdir(output):
+        return os.path.join(output, file_name)
+    return output
+
+
+def is_stream(output):
+    # A file object, e.g. a SpooledTemporaryFile, rather than a path
+    return hasattr(output, "write")
+
+
+def _write_rows(writer, export):
+    writer.writerow(export.header)
+    writer.writerows(_row_values(export.header, row) for row in export.rows)
+
+
+def write_csv(export, output=None):
+    """ Write an export as CSV; a partially written file is removed if the rows fail.
+        :param export (CsvExport)   - The export.
+        :param output              - Where to write it: a directory (the file is named after the export), a file path,
+                                      a text or binary file object or a csv writer; Defaults to the working directory.
+        :returns                    - The path written, or the file object or writer given.
+    """
+    if hasattr(output, "writerow"):
+        _write_rows(output, export)
+        return output
+    if is_stream(output):
+        text = isinstance(output, io.TextIOBase) or "b" not in getattr(output, "mode", "b")
+        file = output if text else io.TextIOWrapper(output, encoding="utf-8", newline="", write_through=True)
+        _write_rows(csv.writer(file), export)
+        if not text:
+            # Hand the binary file back to the caller open
+            file.detach()
+        return output
+    path = output_path(output, export.file_name)
+    try:
+        with open(path, mode='w', newline='') as file:
+            _write_rows(csv.writer(file), export)
+    except Exception:
+        if os.path.exists(path):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        raise
+    return path
+
+
+def csv_chunks(export, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Encode an export as CSV, chunk by chunk as its rows are produced.
+        :param export (CsvExport)   - The export.
+        :param chunk_size (int)     - Approximate bytes per chunk.
+        :returns (generator)        - UTF-8 encoded chunks, the header in the first one.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(export.header)
+    for row in export.rows:
+        writer.writerow(_row_values(export.header, row))
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def gzip_chunks(chunks, level=6):
+    """ Gzip a stream of chunks, without holding more than one of them. Every chunk is flushed, so the client gets
+        the rows as soon as they're produced.
+        :param chunks (iterable)    - Bytes chunks.
+        :param level (int)          - Compression level.
+        :returns (generator)        - Chunks of a gzip stream.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
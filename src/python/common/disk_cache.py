@@ -0,0 +1,85 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Overridable so CI runs and containers can point it at a writable volume.
+DEFAULT_DISK_CACHE_PATH = os.environ.get(
+    "STREAM_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "stream_external_tools", "resources.db"))
+
+
+class ResourceStore:
+    def __init__(self, path=DEFAULT_DISK_CACHE_PATH):
+        """ SQLite store of resource documents (configurations, metadata) that survives across runs.
+            Every entry is tagged with the resource's configuration version timestamp, and is only served
+            while that version is still the latest one.
+            :param path (str)   - SQLite file; created with its directory if missing, ":memory:" for tests.
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            if path != ":memory:":
+                self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS resources (workspace TEXT NOT NULL, resource_id TEXT NOT NULL, "
+                "kind TEXT NOT NULL, version TEXT NOT NULL, value TEXT NOT NULL, stored_at REAL NOT NULL, "
+                "PRIMARY KEY (workspace, resource_id, kind))")
+
+    def get(self, workspace, resource_id, kind, version):
+        """ Get a stored document if it was stored for the given version.
+            :param workspace (str)      - Workspace (customer) ID.
+            :param resource_id (str)    - Resource's ID.
+            :param kind (str)           - Document kind, e.g. "configuration:translated".
+            :param version (str)        - Latest configuration version timestamp of the resource.
+            :returns (dict)             - The document, None if missing or stale.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT version, value FROM resources WHERE workspace = ? AND resource_id = ? AND kind = ?",
+                (workspace, resource_id, kind)).fetchone()
+            if row is not None and version is not None and row[0] == str(version):
+                self.hits += 1
+                return json.loads(row[1])
+            self.misses += 1
+            return None
+
+    def put(self, workspace, resource_id, kind, version, value):
+        """ Store a document, replacing any older version of it.
+            :param workspace (str)      - Workspace (customer) ID.
+            :param resource_id (str)    - Resource's ID.
+            :param kind (str)           - Document kind, e.g. "configuration:translated".
+            :param version (str)        - Configuration version timestamp the document belongs to.
+            :param value (dict)         - The document.
+        """
+        if version is None:
+            return
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?, ?, ?)",
+                             (workspace, resource_id, kind, str(version), json.dumps(value), time.time()))
+
+    def prune(self, older_than):
+        """ Delete documents stored more than older_than seconds ago.
+            :param older_than (float)   - Age in seconds.
+            :returns (int)              - Number of deleted documents.
+        """
+        with self._lock, self._db:
+            return self._db.execute("DELETE FROM resources WHERE stored_at < ?",
+                                    (time.time() - older_than,)).rowcount
+
+    def stats(self):
+        """ Get the store counters.
+            :returns (dict) - Hits, misses and stored documents.
+        """
+        with self._lock:
+            size = self._db.execute("SELECT COUNT(*) FROM resources").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "size": size}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
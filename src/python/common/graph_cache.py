@@ -0,0 +1,81 @@
+import collections
+import copy
+import hashlib
+import json
+import threading
+import time
+
+DEFAULT_CACHE_SIZE = 4096
+DEFAULT_CACHE_TTL = 300
+
+
+class ResponseCache:
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        """ Thread-safe read-through cache of GraphQL responses with a TTL and LRU eviction.
+            :param max_size (int)   - Responses kept before the least recently used one is evicted.
+            :param ttl (float)      - Seconds a response stays valid; None keeps it until evicted.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(customer_id, operation_name, variables, query):
+        """ Build the cache key of a query.
+            The same operation name is sent with different selections, so the query text is part of the key.
+            :param customer_id (str)    - Workspace the query runs in.
+            :param operation_name (str) - The operation's name.
+            :param variables (dict)     - The variables, canonicalised so key order doesn't matter.
+            :param query (str)          - The query.
+            :returns (tuple)            - The key.
+        """
+        query_hash = hashlib.sha256(query.encode()).hexdigest()
+        return customer_id, operation_name, query_hash, json.dumps(variables, sort_keys=True, default=str)
+
+    def get(self, key):
+        """ Get a cached response.
+            :param key (tuple)  - Key from make_key().
+            :returns (dict)     - A copy of the response, None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, response):
+        """ Cache a response, evicting the least recently used ones above max_size.
+            :param key (tuple)      - Key from make_key().
+            :param response (dict)  - The response.
+        """
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires, copy.deepcopy(response))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """ Get the cache counters.
+            :returns (dict) - Hits, misses, evictions and current size.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "size": len(self._entries)}
+
+    def __len__(self):
+        return len(self._entries)
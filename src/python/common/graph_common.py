@@ -1,11 +1,530 @@
+import base64
+import collections
+import concurrent.futures
+import copy
 import datetime
+import gzip
+import http.cookiejar
 import json
+import os
 import requests
+import threading
 import time
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from urllib.parse import urlsplit
+
+from src.python.common.concurrency_limiter import AdaptiveLimiter
+from src.python.common.graph_cache import ResponseCache
+from src.python.common.graph_metrics import DEFAULT_METRICS
+from src.python.common.json_codec import dumps, loads
+from src.python.common.json_stream import iter_json_items
+from src.python.common.persisted_queries import (
+    PERSISTED_QUERY_NOT_FOUND, persisted_query_error, persisted_query_extensions,
+)
+from src.python.common.resilience import (
+    CircuitBreaker, GraphQueryError, RetryPolicy, MAX_RETRY_AFTER, RETRYABLE_STATUS_CODES, parse_retry_after,
+)
+
+# Matches the default worker count of concurrent.futures.ThreadPoolExecutor, which is what the
+# exporters use, so every worker thread can hold its own keep-alive connection.
+DEFAULT_POOL_SIZE = min(32, (os.cpu_count() or 1) + 4)
+# (connect, read) timeouts in seconds; large exports like ruleCsv can take minutes to respond.
+DEFAULT_TIMEOUT = (10, 600)
+# Items requested per page by paginate(); balances fewer round-trips against response size.
+DEFAULT_PAGE_SIZE = 500
+# Pages paginate() fetches concurrently once the collection's total count is known.
+DEFAULT_PAGE_FAN_OUT = 4
+# IDs packed into a single GraphQL document by the batch lookups.
+DEFAULT_BATCH_SIZE = 50
+# Every response encoding urllib3 can decode here: gzip and deflate, plus br/zstd when their packages are installed.
+ACCEPT_ENCODING = make_headers(accept_encoding=True)["accept-encoding"]
+# Request bodies at least this large are gzipped when a client has compress_requests on.
+COMPRESS_MIN_SIZE = 1024
+# Bytes read at a time from streamed responses.
+STREAM_CHUNK_SIZE = 64 * 1024
+# Seconds before the token's expiry at which GraphCommon logs in again, ahead of the first UNAUTHENTICATED.
+TOKEN_REFRESH_MARGIN = 60
+
+_SHARED_SESSIONS = {}
+_SHARED_SESSIONS_LOCK = threading.Lock()
+_SHARED_LIMITERS = {}
+_SHARED_BREAKERS = {}
+
+
+def create_session(pool_size=DEFAULT_POOL_SIZE):
+    """ Create a pooled, keep-alive HTTP session.
+        :param pool_size (int)  - Max connections kept alive per host; Defaults to DEFAULT_POOL_SIZE.
+        :returns (Session)      - Requests session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # Authentication is header based, never let a cookie from one login ride along with another client
+    session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+    return session
+
+
+def get_shared_session(url, pool_size=DEFAULT_POOL_SIZE):
+    """ Get the session shared by every client of the same environment.
+        :param url (str)        - The url of the environment.
+        :param pool_size (int)  - Max connections kept alive, used only when the session is first created.
+        :returns (Session)      - Requests session.
+    """
+    environment = urlsplit(url).netloc
+    with _SHARED_SESSIONS_LOCK:
+        if environment not in _SHARED_SESSIONS:
+            _SHARED_SESSIONS[environment] = create_session(pool_size)
+        return _SHARED_SESSIONS[environment]
+
+
+def set_shared_session(url, session):
+    """ Replace the session shared by the clients of an environment created from now on, e.g. with a
+        benchmarks/graph_replay.py session.
+        :param url (str)            - The url of the environment.
+        :param session (Session)    - The session.
+    """
+    with _SHARED_SESSIONS_LOCK:
+        _SHARED_SESSIONS[urlsplit(url).netloc] = session
+
+
+def get_shared_limiter(url, max_limit=DEFAULT_POOL_SIZE):
+    """ Get the adaptive concurrency limiter shared by every client of the same environment.
+        :param url (str)        - The url of the environment.
+        :param max_limit (int)  - Upper bound of requests in flight, used only when the limiter is first created.
+        :returns (AdaptiveLimiter) - The limiter; starts at half of max_limit and adapts to the server.
+    """
+    environment = urlsplit(url).netloc
+    with _SHARED_SESSIONS_LOCK:
+        if environment not in _SHARED_LIMITERS:
+            _SHARED_LIMITERS[environment] = AdaptiveLimiter(max(1, max_limit // 2), max_limit)
+        return _SHARED_LIMITERS[environment]
+
+
+def get_shared_breaker(url):
+    """ Get the circuit breaker shared by every client of the same environment.
+        :param url (str)            - The url of the environment.
+        :returns (CircuitBreaker)   - The breaker.
+    """
+    environment = urlsplit(url).netloc
+    with _SHARED_SESSIONS_LOCK:
+        if environment not in _SHARED_BREAKERS:
+            _SHARED_BREAKERS[environment] = CircuitBreaker()
+        return _SHARED_BREAKERS[environment]
+
+
+def get_token_expiry(token):
+    """ Read the expiry of a JWT access token, without verifying it.
+        :param token (str)  - Token, with or without the "Bearer " prefix.
+        :returns (float)    - Expiry as a Unix timestamp, None if the token isn't a JWT or has no expiry.
+    """
+    try:
+        claims = token.split(' ')[-1].split('.')[1]
+        exp = json.loads(base64.urlsafe_b64decode(claims + '=' * (-len(claims) % 4))).get('exp')
+        return float(exp) if exp is not None else None
+    except (IndexError, ValueError, TypeError, AttributeError):
+        return None
+
+
+def _body_size(message):
+    """ Get the body size of a request or response, 0 if unknown (e.g. a streamed request body). """
+    body = getattr(message, "body", None) if isinstance(message, requests.PreparedRequest) else \
+        getattr(message, "content", None)
+    return len(body) if isinstance(body, (bytes, str)) else 0
+
+
+def _counted_chunks(chunks, metrics, operation_name):
+    """ Pass chunks of a streamed response through, counting their bytes in the metrics once it was read. """
+    size = 0
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        metrics.increment(operation_name, "response_bytes", size)
+
+
+class GraphBatchError(Exception):
+    def __init__(self, errors, results):
+        """ Raised by the batch lookups when some of the IDs failed.
+            :param errors (dict)    - Error message of every failed ID.
+            :param results (dict)   - Results of the IDs that succeeded.
+        """
+        self.errors = errors
+        self.results = results
+        sample = "; ".join(f"{k}: {v}" for k, v in list(errors.items())[:3])
+        super().__init__(f"{len(errors)} of {len(errors) + len(results)} lookups failed ({sample})")
+
+
+class SessionExpiredError(Exception):
+    """ Raised when the session of a two-factor login expired: it can't be renewed with the password alone, so the
+        user has to log in again with a new one-time password.
+    """
+
+
+# Query documents sent by GraphCommon's methods
+LOGIN_QUERY = "mutation Login($credentials: Credentials){login(credentials: $credentials){access_token }}"
+TWO_FACTOR_QUERY = "mutation authenticateTwoFactor($method: TwoFactorState, $user_code: " \
+                   "String){authenticateTwoFactor(method: $method, user_code: $user_code){access_token " \
+                   "refresh_token __typename}}"
+WORKSPACES_QUERY = "{workspaces { _id: customer_id display_name: customer_name role __typename}}"
+ACCOUNTS_QUERY = "query Accounts{accounts{_id account_type cloud_account_id cloud_regions display_name external_id " \
+                 "status template_url collection_template_url remediation_template_url realtime_regions{region_name " \
+                 "template_version __typename}vpc_flow_logs{flow_logs_token should_collect_flow_logs __typename} " \
+                 "lightlytics_collection_token stack_region account_aliases cost{status details operation " \
+                 "template_version role_arn bucket_arn cur_prefix last_timestamp __typename}__typename}}"
+RESOURCE_SEARCH_QUERY = "query ResourceSearch($includeTags: Boolean!, $phrase: String, $filters: SearchFilters, " \
+                        "$skip: Int, $limit: Int){search(phrase: $phrase, filters: $filters, skip: $skip, limit: " \
+                        "$limit){totalCount results{id type display_name addresses is_public state " \
+                        "network_interfaces{id addresses __typename} tags @include(if: $includeTags){Key Value " \
+                        "__typename}cloud_tags @include(if: $includeTags){Key Value " \
+                        "__typename}__typename}__typename}}"
+INVENTORY_SUMMARY_QUERY = "query InventorySummaryQuery($account_id: String){inventorySummary(account_id: " \
+                          "$account_id){resource_type count __typename}}"
+RESOURCE_CONFIGURATION_QUERY = "query ResourceConfiguration($id: ID, $timestamp: " \
+                               "Timestamp){configuration(resource_id: $id, timestamp: $timestamp){raw translated " \
+                               "impact_paths __typename}}"
+CONFIGURATION_VERSIONS_QUERY = "query ResourceConfigurationVersions($id: ID, $skip: Int, $limit: " \
+                               "Int){configuration_versions(resource_id: $id, skip: $skip, limit: $limit){timestamp " \
+                               "provider __typename}}"
+RESOURCE_METADATA_QUERY = "query ResourceQuery($resource_id: ID, $simulation_timestamp: " \
+                          "Timestamp){resource(resource_id: $resource_id simulation_timestamp: " \
+                          "$simulation_timestamp return_deleted: true){id type display_name end_timestamp region " \
+                          "parent account_id __typename}}"
+RESOURCE_ANCESTORS_QUERY = "query ResourceAncestors($resourceId: ID!){resourceAncestors(resource_id: " \
+                           "$resourceId){id type display_name parent __typename}}"
+ASSOCIATED_RESOURCES_QUERY = "query SearchAssociatedResources($filters: SearchFilters, $simulation_timestamp: " \
+                             "Timestamp, $skip: Int, $limit: Int){search(filters: $filters simulation_timestamp: " \
+                             "$simulation_timestamp skip: $skip limit: $limit){results{id type display_name " \
+                             "__typename}__typename}}"
+RULES_QUERY = "query RulesQuery($filters: RuleFilters, $eventId: String, $resourceId: String, $isRemediation: " \
+              "Boolean, $simulation: Boolean){rules(filters: $filters event_id: $eventId resource_id: $resourceId " \
+              "is_remediation: $isRemediation is_simulation: $simulation){total_count results{id name creation_date " \
+              "created_by category severity description labels compliance status state rule_type fail_simulation " \
+              "exclusions_count __typename}__typename}}"
+RULE_QUERY = "query RuleQuery($id: ID){rule(id: $id){...RuleFields __typename}}fragment RuleFields on Rule{id name " \
+             "status state category severity description remediation labels compliance rule_type subject action " \
+             "path_source_predicate_equals_match path_intermediate_predicate_equals_match " \
+             "path_destination_predicate_equals_match path_source_predicate{...ConditionFields " \
+             "__typename}path_intermediate_predicate{...ConditionFields " \
+             "__typename}path_destination_predicate{...ConditionFields " \
+             "__typename}resource_predicate{...ConditionFields __typename}fail_simulation ports{start end protocol " \
+             "__typename}creation_date created_by __typename}fragment ConditionFields on " \
+             "ResourceCondition{resource_id resource_type attributes{operand attributes_list{...AttributeFields " \
+             "attributes_list{...AttributeFields attributes_list{...AttributeFields " \
+             "attributes_list{...AttributeFields attributes_list{...AttributeFields " \
+             "attributes_list{...AttributeFields " \
+             "__typename}__typename}__typename}__typename}__typename}__typename}__typename}tags{operand " \
+             "attributes_list{...AttributeFields attributes_list{...AttributeFields " \
+             "attributes_list{...AttributeFields attributes_list{...AttributeFields " \
+             "attributes_list{...AttributeFields attributes_list{...AttributeFields " \
+             "__typename}__typename}__typename}__typename}__typename}__typename}__typename}locations{location_type " \
+             "location_value __typename}__typename}fragment AttributeFields on ConditionAttribute{name value " \
+             "match_type operand __typename}"
+RULE_VIOLATIONS_QUERY = "query RuleViolations($rule_id: ID!, $filter_inventory: RuleViolationFilterInventory, " \
+                        "$skip: Int, $limit: Int){ruleViolations(rule_id: $rule_id filter_inventory: " \
+                        "$filter_inventory skip: $skip limit: $limit){total_count results __typename}}"
+RULE_CSV_QUERY = "query RuleViolationsCsv($rule_id: ID!){ruleCsv(rule_id: $rule_id){rule_name description category " \
+                 "severity labels compliance date violation_count violations{resource_id resource_name " \
+                 "resource_type account_display_name account_id region vpc_id tags monthly_cost " \
+                 "__typename}__typename}}"
+COMPLIANCES_QUERY = "query Compliances{compliance{results{compliance __typename}__typename}}"
+CVES_QUERY = "query CVEsMainQuery($filters: CVEFilters, $skip: Int, $limit: Int, $sort_by: CVESortField, " \
+             "$sort_order: Int){cves(filters: $filters skip: $skip limit: $limit sort_by: $sort_by sort_order: " \
+             "$sort_order){total_count results{attack_vector cve_id cve_sources severity cvss_score packages " \
+             "exploit_available internet_exposed affected_resources_count fix_available fixed_in_version epss_score " \
+             "cisa_kev{action date_added due_date __typename}published_date discovery_timestamp " \
+             "__typename}__typename}}"
+CVE_RESOURCES_QUERY = "query CVEResources($filters: VulnerableResourcesFilters, $skip: Int, $limit: " \
+                      "Int){cve_resources(filters: $filters, skip: $skip, limit: $limit){total_count " \
+                      "results{account_id resource_id resource_type container_images exposure_risk " \
+                      "exposure_risk_description internet_exposed __typename}__typename}}"
+DETECTIONS_QUERY = "query Detections($filters: DetectionsFilters, $sort: DetectionsSort, $skip: Int, $limit: " \
+                   "Int){get_detections(filters: $filters, sort: $sort, skip: $skip, limit: $limit){total_count " \
+                   "results{_id timestamp activity_type source account_id anomaly_severity resource_id " \
+                   "resource_type mitre_categories acknowledged acknowledgement_details{timestamp user reason " \
+                   "__typename}signal_types __typename}__typename}}"
+DETECTION_ENRICHMENT_QUERY = """query Detection($filters: DetectionsFilters, $limit: Int) {
+  get_detections(filters: $filters, limit: $limit) {
+    total_count
+    results {
+      _id
+      timestamp
+      activity_type
+      source
+      account_id
+      anomaly_severity
+      cluster
+      namespace
+      resource_id
+      resource_type
+      resource_cluster
+      resource_namespace
+      resource_deployment
+      mitre_categories
+      acknowledged
+      signal_types
+      session_list {
+        ip_address
+        access_key
+        user_agent
+        country_code_iso
+        mfa
+        __typename
+      }
+      acknowledgement_details {
+        timestamp
+        user
+        reason
+        __typename
+      }
+      external_id
+      external_url
+      json_data
+      signals {
+        signal_type
+        ... on MaliciousIpSignal {
+          malicious_ip_records {
+            ...IpRecordFragment
+            __typename
+          }
+          __typename
+        }
+        ... on TorIpSignal {
+          tor_ip_records {
+            ...IpRecordFragment
+            __typename
+          }
+          __typename
+        }
+        ... on PentestToolSignal {
+          agents
+          __typename
+        }
+        ... on UnusualActivityTimeSignal {
+          activity_time
+          __typename
+        }
+        ... on UnusualActionTypeSignal {
+          resource_types_by_resources_actions {
+            resource_type
+            anomalous_actions {
+              ...AnomalousActionFragment
+              __typename
+            }
+            __typename
+          }
+          __typename
+        }
+        ... on AnomalousGeoLocationSignal {
+          locations
+          __typename
+        }
+        ... on ActivityInUnusualAwsRegionSignal {
+          unusual_activities_by_regions {
+            location
+            unusual_resource_types_actions {
+              resource_type
+              anomalous_actions {
+                ...AnomalousActionFragment
+                __typename
+              }
+              __typename
+            }
+            __typename
+          }
+          __typename
+        }
+        ... on AnomalousTrafficVolumeSignal {
+          volume_size
+          plot_coords {
+            ...CoordinatesFragment
+            __typename
+          }
+          top_destination_ips {
+            ...IpRecordFragment
+            __typename
+          }
+          __typename
+        }
+        ... on AnomalousOutboundConnectionSignal {
+          destination_ips {
+            ...IpRecordFragment
+            __typename
+          }
+          __typename
+        }
+        ... on PossiblePortScanSignal {
+          plot_coords {
+            ...CoordinatesFragment
+            __typename
+          }
+          __typename
+        }
+        ... on PossibleInternalIpScanSignal {
+          plot_coords {
+            ...CoordinatesFragment
+            __typename
+          }
+          __typename
+        }
+        ... on AnomalousCountOfRejectedFlowsSignal {
+          plot_coords {
+            ...CoordinatesFragment
+            __typename
+          }
+          __typename
+        }
+        ... on AnomalousDataStoreConnectivitySignal {
+          resource_ids
+          resource_types
+          __typename
+        }
+        ... on AnomalousCountOfGetObjectsSignal {
+          plot_coords {
+            ...CoordinatesFragment
+            __typename
+          }
+          __typename
+        }
+        ... on UnusualCostSpikeSignal {
+          service
+          plot_coords {
+            ...CoordinatesFragment
+            __typename
+          }
+          __typename
+        }
+        ... on UnusualActivityTimeSignal {
+          activity_time
+          __typename
+        }
+        ... on DetectionRuleActivitySignal {
+          rule_id
+          rule_name
+          description
+          type
+          window_start
+          window_end
+          plot_coords {
+            x_coords
+            y_coords
+            __typename
+          }
+          custom_config {
+            log_type
+            detection_field
+            __typename
+          }
+          identityml_config {
+            match_type
+            action
+            __typename
+          }
+          __typename
+        }
+        ... on GenericThirdPartyActivitySignal {
+          name
+          description
+          mitre_categories
+          __typename
+        }
+        __typename
+      }
+      __typename
+    }
+    __typename
+  }
+}
+fragment IpRecordFragment on IpRecord {
+  ip_address
+  severity
+  hosts
+  ports
+  initiated_session
+  vol_traffic
+  __typename
+}
+fragment AnomalousActionFragment on AnomalousAction {
+  action
+  mitre_category
+  resource_ids
+  sub_resource
+  regions
+  destinations
+  request_uri
+  __typename
+}
+fragment CoordinatesFragment on Coordinates {
+  x_coords
+  y_coords
+  __typename
+}
+"""
+
+# Default projections of the query builder, the fields the fixed queries above request
+SEARCH_FIELDS = ("id", "type", "display_name", "addresses", "is_public", "state",
+                 {"network_interfaces": ("id", "addresses", "__typename")}, "__typename")
+SEARCH_TAG_FIELDS = ({"tags": ("Key", "Value", "__typename")}, {"cloud_tags": ("Key", "Value", "__typename")})
+RESOURCE_FIELDS = ("id", "type", "display_name", "end_timestamp", "region", "parent", "account_id", "__typename")
+RULE_FIELDS = ("id", "name", "creation_date", "created_by", "category", "severity", "description", "labels",
+               "compliance", "status", "state", "rule_type", "fail_simulation", "exclusions_count", "__typename")
+
+
+def build_selection(fields):
+    """ Build a GraphQL selection set.
+        :param fields (iterable)    - Field names, or {name: fields} dicts for the fields of nested objects,
+                                      e.g. ("id", {"network_interfaces": ("id", "addresses")}).
+        :returns (str)              - Selection set, e.g. "{id network_interfaces{id addresses}}".
+    """
+    selection = []
+    for field in fields:
+        if isinstance(field, dict):
+            selection.extend(f"{name}{build_selection(sub_fields)}" for name, sub_fields in field.items())
+        else:
+            selection.append(field)
+    if not selection:
+        raise ValueError("At least one field must be selected")
+    return "{" + " ".join(selection) + "}"
+
+
+def build_search_query(fields=SEARCH_FIELDS):
+    """ Build a resource search query.
+        :param fields (iterable)    - Fields of each result, see build_selection.
+        :returns (str)              - Query accepting $phrase, $filters, $skip and $limit.
+    """
+    return "query ResourceSearch($phrase: String, $filters: SearchFilters, $skip: Int, $limit: Int){" \
+           "search(phrase: $phrase, filters: $filters, skip: $skip, limit: $limit){totalCount " \
+           f"results{build_selection(fields)}}}}}"
+
+
+def build_resource_query(fields=RESOURCE_FIELDS):
+    """ Build a single resource query.
+        :param fields (iterable)    - Fields of the resource, see build_selection.
+        :returns (str)              - Query accepting $resource_id and $simulation_timestamp.
+    """
+    return "query ResourceQuery($resource_id: ID, $simulation_timestamp: Timestamp){resource(resource_id: " \
+           f"$resource_id simulation_timestamp: $simulation_timestamp return_deleted: true){build_selection(fields)}}}"
+
+
+def build_rules_query(fields=RULE_FIELDS):
+    """ Build a rules query.
+        :param fields (iterable)    - Fields of each rule, see build_selection.
+        :returns (str)              - Query accepting the RulesQuery variables ($filters, $eventId...).
+    """
+    return "query RulesQuery($filters: RuleFilters, $eventId: String, $resourceId: String, $isRemediation: " \
+           "Boolean, $simulation: Boolean){rules(filters: $filters event_id: $eventId resource_id: $resourceId " \
+           "is_remediation: $isRemediation is_simulation: $simulation){total_count " \
+           f"results{build_selection(fields)}}}}}"
 
 
 class GraphCommon(object):
-    def __init__(self, url, email=None, pw=None, customer_id=None, otp=None, token=None):
+    def __init__(self, url, email=None, pw=None, customer_id=None, otp=None, token=None, session=None,
+                 pool_size=None, timeout=None, page_fan_out=DEFAULT_PAGE_FAN_OUT, batch_size=DEFAULT_BATCH_SIZE,
+                 cache=None, disk_cache=None, single_flight=True, limiter=None, retry_policy=None, breaker=None,
+                 compress_requests=False, persisted_queries=False, metrics=None):
         """ Initialize GraphCommon class to graph functions.
             :param url (str)            - The url of the environment.
             :param email (str)          - The email for login.
@@ -13,10 +532,54 @@ class GraphCommon(object):
             :param otp (str)            - 2FA token.
             :param customer_id (str)    - The customer ID for operations; Defaults to the Demo Customer ID.
             :param token (str)          - Pre-existing API token; if provided, skips email/pw login.
+            :param session (Session)    - HTTP session to reuse, e.g. from get_shared_session; Defaults to a
+                                          new pooled session owned by this client.
+            :param pool_size (int)      - Connection pool size of the owned session; Defaults to DEFAULT_POOL_SIZE.
+            :param timeout (tuple)      - (connect, read) timeouts in seconds; Defaults to DEFAULT_TIMEOUT.
+            :param page_fan_out (int)   - Pages fetched concurrently by paginate(); 1 fetches them one by one.
+            :param batch_size (int)     - IDs looked up per request by the batch methods.
+            :param cache (ResponseCache)- Opt-in cache of read query responses; Defaults to no caching.
+            :param disk_cache (ResourceStore) - Opt-in store of resource configurations and metadata kept across
+                                                runs; Defaults to no store.
+            :param single_flight (bool) - Share one request between identical read queries sent at the same time.
+            :param limiter (AdaptiveLimiter) - Bounds requests in flight, e.g. from get_shared_limiter; Defaults to
+                                               no limit besides the callers' own thread pools.
+            :param retry_policy (RetryPolicy) - Backoff of retried queries; Defaults to RetryPolicy().
+            :param breaker (CircuitBreaker) - Fails fast while the API is down, e.g. from get_shared_breaker;
+                                              Defaults to none.
+            :param compress_requests (bool) - Gzip request bodies of COMPRESS_MIN_SIZE bytes or more; the server must
+                                              accept "Content-Encoding: gzip".
+            :param persisted_queries (bool) - Send read queries by their SHA-256 hash (automatic persisted queries),
+                                              falling back to the full text when the server doesn't know it yet.
+            :param metrics (GraphMetrics)   - Where per operation metrics are recorded; Defaults to the process-wide
+                                              DEFAULT_METRICS.
         """
         self.url = url
         self.email = email
         self.pw = pw
+        self._owns_session = session is None
+        self.session = session or create_session(pool_size or DEFAULT_POOL_SIZE)
+        self.timeout = timeout or DEFAULT_TIMEOUT
+        self.page_fan_out = page_fan_out
+        self.batch_size = batch_size
+        self.cache = cache
+        self.disk_cache = disk_cache
+        self.single_flight = single_flight
+        self.limiter = limiter
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker
+        self.compress_requests = compress_requests
+        self.persisted_queries = persisted_queries
+        self.metrics = DEFAULT_METRICS if metrics is None else metrics
+        self.retries = collections.Counter()
+        self._retries_lock = threading.Lock()
+        self.coalesced_calls = 0
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        self.token_generation = 0
+        self._token_lock = threading.Lock()
+        # Its session needed a second factor, so it's never renewed with the password alone
+        self.two_factor = bool(otp) and not token
         if token:
             if not isinstance(token, str):
                 raise ValueError(f"token must be a string, got {type(token).__name__}")
@@ -25,7 +588,7 @@ class GraphCommon(object):
             self.token = self.get_token(email, pw)
             if otp:
                 self.token = self.get_token_otp(otp, self.token)
-        time.sleep(2)
+        self.token_expires_at = get_token_expiry(self.token)
         self.customer_id = customer_id or self.get_customer_id()
 
     def get_token(self, email, pw):
@@ -36,10 +599,10 @@ class GraphCommon(object):
         """
         payload_operation = "Login"
         payload_vars = {"credentials": {"email": email, "password": pw}}
-        query = "mutation Login($credentials: Credentials){login(credentials: $credentials){access_token }}"
+        query = LOGIN_QUERY
         payload = self.create_graph_payload(payload_operation, payload_vars, query)
         try:
-            res = requests.post(self.url, json=payload)
+            res = self._post(payload, idempotent=True)
         except Exception as e:
             raise Exception(f"URL doesn't exist --> {self.url}, error: {e}")
         if 'errors' not in res.text:
@@ -50,6 +613,18 @@ class GraphCommon(object):
             err = res.text
             raise Exception(json.loads(str(err))['errors'][0]['message'])
 
+    def refresh_token(self, generation):
+        """ Log in again, unless another thread already did since the given token generation.
+            :param generation (int) - token_generation the caller's token belongs to.
+            :returns (str)          - The current token.
+        """
+        with self._token_lock:
+            if generation == self.token_generation:
+                self.token = self.get_token(self.email, self.pw)
+                self.token_expires_at = get_token_expiry(self.token)
+                self.token_generation += 1
+            return self.token
+
     def get_token_otp(self, otp, token):
         """ Get token using 2FA.
             :param otp (str)    - The OTP code provided by the user.
@@ -57,11 +632,10 @@ class GraphCommon(object):
             :returns (str)      - New Bearer Token.
         """
         payload_operation = "authenticateTwoFactor"
-        query = "mutation authenticateTwoFactor($method: TwoFactorState, $user_code: String){" \
-                "authenticateTwoFactor(method: $method, user_code: $user_code){access_token refresh_token __typename}}"
+        query = TWO_FACTOR_QUERY
         payload_vars = {"method": "SECURED_TOTP", "user_code": otp}
         payload = self.create_graph_payload(payload_operation, payload_vars, query)
-        res = requests.post(self.url, json=payload, headers={"Authorization": token})
+        res = self._post(payload, headers={"Authorization": token})
         if 'errors' not in res.text:
             eval_res = json.loads(res.text)
             return 'Bearer ' + eval_res['data']['authenticateTwoFactor']['access_token']
@@ -89,10 +663,10 @@ class GraphCommon(object):
         pw = pw or self.pw
         token = self.token or self.get_token(email, pw)
         payload_vars = {"credentials": {"email": email, "password": pw}}
-        query = "{workspaces { _id: customer_id display_name: customer_name role __typename}}"
+        query = WORKSPACES_QUERY
         payload = self.create_graph_payload(None, payload_vars, query)
         try:
-            res = requests.post(self.url, json=payload, headers={"Authorization": token})
+            res = self._post(payload, headers={"Authorization": token})
         except Exception as e:
             raise Exception(f"URL doesn't exist --> {self.url}, error: {e}")
         if 'errors' not in res.text:
@@ -122,11 +696,7 @@ class GraphCommon(object):
             :returns (list) - Integrations in the environment.
         """
         operation = 'Accounts'
-        query = "query Accounts{accounts{_id account_type cloud_account_id cloud_regions display_name " \
-                "external_id status template_url collection_template_url remediation_template_url realtime_regions{region_name " \
-                "template_version __typename}vpc_flow_logs{flow_logs_token should_collect_flow_logs __typename} " \
-                "lightlytics_collection_token stack_region account_aliases cost{status details operation " \
-                "template_version role_arn bucket_arn cur_prefix last_timestamp __typename}__typename}}"
+        query = ACCOUNTS_QUERY
         result = self.graph_query(operation, {}, query)
         # Treat a null/invalid/errored response as "no accounts" (warn once), but return a
         # genuinely empty list as-is so an environment with zero integrations isn't flagged.
@@ -296,42 +866,71 @@ class GraphCommon(object):
                  "resource_type count}}")
         return self.graph_query(operation, {"account_id": [account_id]}, query)['data']['inventorySummary']
 
-    def get_resources_by_type(self, resource_type, get_only_ids=False):
+    # Query builder methods; callers pass the fields they use and the server skips resolving the others
+    def search(self, fields=SEARCH_FIELDS, phrase="", filters=None, page_size=DEFAULT_PAGE_SIZE, max_items=None):
+        """ Iterate resource search results, page by page.
+            :param fields (iterable)    - Fields of each result, see build_selection; Defaults to SEARCH_FIELDS.
+            :param phrase (str)         - Free text to search by.
+            :param filters (dict)       - SearchFilters, e.g. {"resource_type": ["instance"]}.
+            :param page_size (int)      - Items requested per page.
+            :param max_items (int)      - Stop after this many items; Defaults to all of them.
+            :returns (generator)        - Resources.
+        """
+        variables = {"phrase": phrase}
+        if filters is not None:
+            variables["filters"] = filters
+        return self.paginate("ResourceSearch", variables, build_search_query(fields), "search",
+                             page_size=page_size, max_items=max_items)
+
+    def get_resource(self, resource_id, fields=RESOURCE_FIELDS):
+        """ Get one resource.
+            :param resource_id (str)    - Specific resource's ID.
+            :param fields (iterable)    - Fields of the resource, see build_selection; Defaults to RESOURCE_FIELDS.
+            :returns (dict)             - Resource, None if it doesn't exist.
+        """
+        query = build_resource_query(fields)
+        return self.graph_query("ResourceQuery", {"resource_id": resource_id}, query)['data']['resource']
+
+    def get_rules(self, fields=RULE_FIELDS, filters=None):
+        """ Get "standards" rules.
+            :param fields (iterable)    - Fields of each rule, see build_selection; Defaults to RULE_FIELDS.
+            :param filters (dict)       - RuleFilters; Defaults to all rules.
+            :returns (list)             - Rules.
+        """
+        variables = {} if filters is None else {"filters": filters}
+        return self.graph_query("RulesQuery", variables, build_rules_query(fields))['data']['rules']['results']
+
+    def get_resources_by_type(self, resource_type, get_only_ids=False, fields=SEARCH_FIELDS):
         """ Get resources details by type.
             :param resource_type (str)      - Resource type.
             :param get_only_ids (boolean)   - Return only IDs.
+            :param fields (iterable)        - Fields of each resource, see build_selection.
             :returns (dict/list)            - resources details.
         """
-        operation = "ResourceSearch"
-        query = "query ResourceSearch($includeTags: Boolean!, $phrase: String, $filters: SearchFilters, $skip: Int, " \
-                "$limit: Int){search(phrase: $phrase, filters: $filters, skip: $skip, limit: $limit){totalCount " \
-                "results{id type display_name addresses is_public state network_interfaces{id addresses __typename} " \
-                "tags @include(if: $includeTags){Key Value __typename}cloud_tags @include(if: $includeTags){Key " \
-                "Value __typename}__typename}__typename}}"
-        variables = {"includeTags": False, "phrase": "",
-                     "filters": {"resource_type": [resource_type], "attributes": []}, "skip": 0}
-        resources = self.graph_query(operation, variables, query)['data']['search']['results']
+        resources = self.iter_resources_by_type(resource_type, ("id",) if get_only_ids else fields)
         if get_only_ids:
             return [r['id'] for r in resources]
-        return resources
+        return list(resources)
 
-    def general_resource_search(self, search_query, get_only_ids=False):
+    def iter_resources_by_type(self, resource_type, fields=SEARCH_FIELDS):
+        """ Iterate resources by type, page by page.
+            :param resource_type (str)  - Resource type.
+            :param fields (iterable)    - Fields of each resource, see build_selection.
+            :returns (generator)        - Resources details.
+        """
+        return self.search(fields, filters={"resource_type": [resource_type], "attributes": []})
+
+    def general_resource_search(self, search_query, get_only_ids=False, fields=SEARCH_FIELDS):
         """ Get resources details by type.
             :param search_query (str)       - query to search by.
             :param get_only_ids (boolean)   - Return only IDs.
+            :param fields (iterable)        - Fields of each resource, see build_selection.
             :returns (dict/list)            - resources details.
         """
-        operation = "ResourceSearch"
-        query = "query ResourceSearch($includeTags: Boolean!, $phrase: String, $filters: SearchFilters, $skip: Int, " \
-                "$limit: Int){search(phrase: $phrase, filters: $filters, skip: $skip, limit: $limit){totalCount " \
-                "results{id type display_name addresses is_public state network_interfaces{id addresses __typename} " \
-                "tags @include(if: $includeTags){Key Value __typename}cloud_tags @include(if: $includeTags){Key " \
-                "Value __typename}__typename}__typename}}"
-        variables = {"includeTags": False, "phrase": search_query, "skip": 0}
-        resources = self.graph_query(operation, variables, query)['data']['search']['results']
+        resources = self.search(("id",) if get_only_ids else fields, phrase=search_query)
         if get_only_ids:
             return [r['id'] for r in resources]
-        return resources
+        return list(resources)
 
     def get_resources_type_count_by_account(self, resource_type, account):
         """ Get resources count by account.
@@ -340,8 +939,7 @@ class GraphCommon(object):
             :returns (int)              - Resources count.
         """
         operation = "InventorySummaryQuery"
-        query = "query InventorySummaryQuery($account_id: String){inventorySummary(account_id: $account_id){" \
-                "resource_type count __typename}}"
+        query = INVENTORY_SUMMARY_QUERY
         results = self.graph_query(operation, {"account_id": account}, query)['data']['inventorySummary']
         try:
             return [r["count"] for r in results if r["resource_type"] == resource_type][0]
@@ -356,22 +954,23 @@ class GraphCommon(object):
             :returns (dict)                         - Configuration details.
         """
         operation = 'ResourceConfiguration'
-        query = "query ResourceConfiguration($id: ID, $timestamp: Timestamp){" \
-                "configuration(resource_id: $id, timestamp: $timestamp){raw translated impact_paths __typename}}"
+        query = RESOURCE_CONFIGURATION_QUERY
         variables = {"id": resource_id}
+        versions = None
 
         if get_from_latest_timestamp:
             latest_timestamp = self.get_resource_configuration_latest_version_by_id(resource_id)
-            query = "query ResourceConfiguration($id: ID, $timestamp: Timestamp){" \
-                    "configuration(resource_id: $id, timestamp: $timestamp){raw translated impact_paths __typename}}"
             variables["timestamp"] = latest_timestamp
+            # It's also the version the disk cache is keyed by, don't look it up twice
+            versions = {resource_id: latest_timestamp}
 
-        res = self.graph_query(operation, variables, query)
-        if 'errors' in res:
-            raise Exception(f'Something went wrong, result: {res}')
-        if raw:
-            return res['data']['configuration']['raw']
-        return res['data']['configuration']['translated']
+        def lookup(_):
+            res = self.graph_query(operation, variables, query)
+            if 'errors' in res:
+                raise Exception(f'Something went wrong, result: {res}')
+            return {resource_id: res['data']['configuration']['raw' if raw else 'translated']}
+        kind = f"configuration:{'raw' if raw else 'translated'}{':latest' if get_from_latest_timestamp else ''}"
+        return self._disk_cached(kind, [resource_id], lookup, versions)[resource_id]
 
     def get_resource_configuration_latest_version_by_id(self, resource_id):
         """ Get configuration details by resource's ID.
@@ -379,8 +978,7 @@ class GraphCommon(object):
             :returns (dict)                         - Configuration latest version timestamp.
         """
         operation = 'ResourceConfigurationVersions'
-        query = "query ResourceConfigurationVersions($id: ID, $skip: Int, $limit: Int)" \
-                "{configuration_versions(resource_id: $id, skip: $skip, limit: $limit){timestamp provider __typename}}"
+        query = CONFIGURATION_VERSIONS_QUERY
         res = self.graph_query(operation, {"id": resource_id, "skip": 0, "limit": 1}, query)
         if 'errors' in res:
             raise Exception(f'Something went wrong, result: {res}')
@@ -394,22 +992,16 @@ class GraphCommon(object):
             :param resource_id (str)    - Specific resource's ID.
             :returns (list)             - Resource parents.
         """
-        operation = 'ResourceQuery'
-        query = "query ResourceQuery($resource_id: ID, $simulation_timestamp: Timestamp){" \
-                "resource(resource_id: $resource_id simulation_timestamp: $simulation_timestamp return_deleted: true)" \
-                "{parents}}"
-        return self.graph_query(operation, {"resource_id": resource_id}, query)['data']['resource']['parents']
+        return self.get_resource(resource_id, ("parents",))['parents']
 
     def get_resource_metadata(self, resource_id):
         """ Get resource metadata.
             :param resource_id (str)    - Specific resource's ID.
             :returns (str)              - Account ID.
         """
-        operation = 'ResourceQuery'
-        query = "query ResourceQuery($resource_id: ID, $simulation_timestamp: Timestamp){resource(resource_id: " \
-                "$resource_id simulation_timestamp: $simulation_timestamp return_deleted: true){id type display_name " \
-                "end_timestamp region parent account_id __typename}}"
-        return self.graph_query(operation, {"resource_id": resource_id}, query)['data']['resource']
+        def lookup(_):
+            return {resource_id: self.get_resource(resource_id)}
+        return self._disk_cached("metadata", [resource_id], lookup)[resource_id]
 
     def get_resource_ancestors(self, resource_id):
         """ Get resource ancestors.
@@ -417,8 +1009,7 @@ class GraphCommon(object):
             :returns (dict)             - Ancestors information.
         """
         operation = 'ResourceAncestors'
-        query = "query ResourceAncestors($resourceId: ID!){resourceAncestors(resource_id: $resourceId){id type " \
-                "display_name parent __typename}}"
+        query = RESOURCE_ANCESTORS_QUERY
         return self.graph_query(operation, {"resourceId": resource_id}, query)['data']['resourceAncestors']
 
     def get_resource_account_id(self, resource_id):
@@ -426,114 +1017,153 @@ class GraphCommon(object):
             :param resource_id (str)    - Specific resource's ID.
             :returns (str)              - Account ID.
         """
-        operation = 'ResourceQuery'
-        query = "query ResourceQuery($resource_id: ID, $simulation_timestamp: Timestamp){" \
-                "resource(resource_id: $resource_id simulation_timestamp: $simulation_timestamp return_deleted: true)" \
-                "{account_id}}"
-        return self.graph_query(operation, {"resource_id": resource_id}, query)['data']['resource']['account_id']
+        return self.get_resource(resource_id, ("account_id",))['account_id']
+
+    def get_resources_metadata(self, resource_ids, batch_size=None):
+        """ Get the metadata of many resources, batch_size of them per request.
+            :param resource_ids (list)  - Resources' IDs.
+            :param batch_size (int)     - IDs per request; Defaults to the client's batch_size.
+            :returns (dict)             - Metadata by resource ID; raises GraphBatchError if some IDs failed.
+        """
+        return self._disk_cached("metadata", resource_ids, lambda ids: self._aliased_batch(
+            "ResourcesMetadataBatch", "resource", "resource_id: {var} return_deleted: true",
+            build_selection(RESOURCE_FIELDS)[1:-1], ids, batch_size))
+
+    def get_resources_ancestors(self, resource_ids, batch_size=None):
+        """ Get the ancestors of many resources, batch_size of them per request.
+            :param resource_ids (list)  - Resources' IDs.
+            :param batch_size (int)     - IDs per request; Defaults to the client's batch_size.
+            :returns (dict)             - Ancestors by resource ID; raises GraphBatchError if some IDs failed.
+        """
+        return self._aliased_batch(
+            "ResourcesAncestorsBatch", "resourceAncestors", "resource_id: {var}",
+            "id type display_name parent __typename", resource_ids, batch_size, id_type="ID!")
+
+    def get_resources_configuration_by_id(self, resource_ids, raw=False, batch_size=None):
+        """ Get the configuration of many resources, batch_size of them per request.
+            :param resource_ids (list)  - Resources' IDs.
+            :param raw (bool)           - Get Raw data instead of translated.
+            :param batch_size (int)     - IDs per request; Defaults to the client's batch_size.
+            :returns (dict)             - Configuration by resource ID; raises GraphBatchError if some IDs failed.
+        """
+        key = "raw" if raw else "translated"
+        return self._disk_cached(f"configuration:{key}", resource_ids, lambda ids: self._aliased_batch(
+            "ResourcesConfigurationBatch", "configuration", "resource_id: {var}", f"{key} __typename",
+            ids, batch_size, extract=lambda configuration: configuration[key]))
+
+    def get_resources_configuration_latest_version_by_id(self, resource_ids, batch_size=None):
+        """ Get the latest configuration version timestamp of many resources, batch_size of them per request.
+            :param resource_ids (list)  - Resources' IDs.
+            :param batch_size (int)     - IDs per request; Defaults to the client's batch_size.
+            :returns (dict)             - Timestamp by resource ID, None for resources without versions;
+                                          raises GraphBatchError if some IDs failed.
+        """
+        return self._aliased_batch(
+            "ResourcesConfigurationVersionsBatch", "configuration_versions", "resource_id: {var}, skip: 0, limit: 1",
+            "timestamp", resource_ids, batch_size,
+            extract=lambda versions: versions[0]['timestamp'] if versions else None)
+
+    def get_resources_account_id(self, resource_ids, batch_size=None):
+        """ Get the account ID of many resources, batch_size of them per request.
+            :param resource_ids (list)  - Resources' IDs.
+            :param batch_size (int)     - IDs per request; Defaults to the client's batch_size.
+            :returns (dict)             - Account ID by resource ID; raises GraphBatchError if some IDs failed.
+        """
+        return self._aliased_batch(
+            "ResourcesAccountBatch", "resource", "resource_id: {var} return_deleted: true", "account_id",
+            resource_ids, batch_size, extract=lambda resource: resource["account_id"])
 
     def get_resource_associated_resources(self, resource_id):
         """ Get resource associated resources.
         """
         operation = 'SearchAssociatedResources'
-        query = "query SearchAssociatedResources($filters: SearchFilters, $simulation_timestamp: Timestamp, " \
-                "$skip: Int, $limit: Int){search(filters: $filters simulation_timestamp: $simulation_timestamp " \
-                "skip: $skip limit: $limit){results{id type display_name __typename}__typename}}"
+        query = ASSOCIATED_RESOURCES_QUERY
         variables = {"filters": {"associated_resource_id": resource_id}}
-        return self.graph_query(operation, variables, query)['data']['search']['results']
+        return list(self.paginate(operation, variables, query, "search"))
 
-    def resources_search(self, account, resource_type, tags=None):
+    def resources_search(self, account, resource_type, tags=None, fields=SEARCH_FIELDS + SEARCH_TAG_FIELDS):
         """ Search resources by account and types.
             :param account (str)        - Account to search in.
             :param resource_type (str)  - Resource type.
             :param tags (list)          - List of tags to filter by.
+            :param fields (iterable)    - Fields of each resource, see build_selection.
             :returns (list)             - List of resources.
         """
-        operation = 'ResourceSearch'
-        query = "query ResourceSearch($includeTags: Boolean!, $phrase: String, $filters: SearchFilters, $skip: " \
-                "Int, $limit: Int){search(phrase: $phrase, filters: $filters, skip: $skip, limit: $limit)" \
-                "{totalCount results{id type display_name addresses is_public state network_interfaces{id " \
-                "addresses __typename}tags @include(if: $includeTags){Key Value __typename}cloud_tags @include" \
-                "(if: $includeTags){Key Value __typename}__typename}__typename}}"
-        variables = {
-            "includeTags": True,
-            "phrase": "",
-            "filters": {
-                "resource_type": [resource_type],
-                "account_id": account,
-                "attributes": []
-            },
-            "skip": 0, "limit": 0
+        return list(self.iter_resources_search(account, resource_type, tags, fields))
+
+    def iter_resources_search(self, account, resource_type, tags=None, fields=SEARCH_FIELDS + SEARCH_TAG_FIELDS):
+        """ Iterate resources by account and types, page by page.
+            :param account (str)        - Account to search in.
+            :param resource_type (str)  - Resource type.
+            :param tags (list)          - List of tags to filter by.
+            :param fields (iterable)    - Fields of each resource, see build_selection.
+            :returns (generator)        - Resources.
+        """
+        filters = {
+            "resource_type": [resource_type],
+            "account_id": account,
+            "attributes": []
         }
         if tags:
-            variables["filters"]["tags"] = tags
-        return self.graph_query(operation, variables, query)['data']['search']['results']
+            filters["tags"] = tags
+        return self.search(fields, filters=filters)
 
     # Arch Standards methods
-    def get_all_rules(self):
+    def get_all_rules(self, fields=RULE_FIELDS):
         """ Get all "standards" rules.
-            :returns (list) - Rules.
+            :param fields (iterable)    - Fields of each rule, see build_selection.
+            :returns (list)             - Rules.
         """
-        operation = 'RulesQuery'
-        query = "query RulesQuery($filters: RuleFilters, $eventId: String, $resourceId: String, " \
-                "$isRemediation: Boolean, $simulation: Boolean){rules(filters: $filters event_id: $eventId " \
-                "resource_id: $resourceId is_remediation: $isRemediation is_simulation: $simulation){" \
-                "total_count results{id name creation_date created_by category severity description labels " \
-                "compliance status state rule_type fail_simulation exclusions_count __typename}__typename}}"
-        return self.graph_query(operation, {}, query)['data']['rules']['results']
+        return self.get_rules(fields)
 
-    def get_rules_by_compliance(self, compliance):
+    def get_rules_by_compliance(self, compliance, fields=RULE_FIELDS):
         """ Get all "standards" rules by compliance.
-            :returns (list) - Compliance rules.
+            :param fields (iterable)    - Fields of each rule, see build_selection; "compliance" is always fetched.
+            :returns (list)             - Compliance rules.
         """
-        return [r for r in self.get_all_rules() if compliance in r['compliance']]
+        fields = tuple(fields) if "compliance" in fields else tuple(fields) + ("compliance",)
+        return [r for r in self.get_rules(fields) if compliance in r['compliance']]
 
     def get_rule_metadata(self, rule_id):
         """ Get rule metadata.
             :returns (dict) - Rule metadata.
         """
         operation = 'RuleQuery'
-        query = "query RuleQuery($id: ID){rule(id: $id){...RuleFields __typename}}fragment RuleFields on Rule" \
-                "{id name status state category severity description remediation labels compliance rule_type subject " \
-                "action path_source_predicate_equals_match path_intermediate_predicate_equals_match " \
-                "path_destination_predicate_equals_match path_source_predicate{...ConditionFields __typename}" \
-                "path_intermediate_predicate{...ConditionFields __typename}path_destination_predicate{" \
-                "...ConditionFields __typename}resource_predicate{...ConditionFields __typename}fail_simulation ports" \
-                "{start end protocol __typename}creation_date created_by __typename}" \
-                "fragment ConditionFields on ResourceCondition{resource_id resource_type attributes{operand " \
-                "attributes_list{...AttributeFields attributes_list{...AttributeFields attributes_list{" \
-                "...AttributeFields attributes_list{...AttributeFields attributes_list{...AttributeFields " \
-                "attributes_list{...AttributeFields __typename}__typename}__typename}__typename}__typename}" \
-                "__typename}__typename}tags{operand attributes_list{...AttributeFields attributes_list{" \
-                "...AttributeFields attributes_list{...AttributeFields attributes_list{...AttributeFields " \
-                "attributes_list{...AttributeFields attributes_list{...AttributeFields __typename}__typename}" \
-                "__typename}__typename}__typename}__typename}__typename}locations{location_type location_value " \
-                "__typename}__typename}fragment AttributeFields on ConditionAttribute{name value match_type operand " \
-                "__typename}"
+        query = RULE_QUERY
         return self.graph_query(operation, {"id": rule_id}, query)["data"]["rule"]
 
     def get_rule_violations(self, rule_id):
         """ Get all rule violations.
             :returns (list) - Rule violations.
         """
+        return list(self.iter_rule_violations(rule_id))
+
+    def iter_rule_violations(self, rule_id):
+        """ Iterate rule violations, page by page.
+            :returns (generator) - Rule violations.
+        """
         operation = 'RuleViolations'
-        query = "query RuleViolations($rule_id: ID!, $filter_inventory: RuleViolationFilterInventory, $skip: " \
-                "Int, $limit: Int){ruleViolations(rule_id: $rule_id filter_inventory: $filter_inventory skip: " \
-                "$skip limit: $limit){total_count results __typename}}"
-        variables = {"rule_id": rule_id, "filter_inventory": {}, "skip": 0, "limit": 0}
-        violations = self.graph_query(operation, variables, query)['data']['ruleViolations']['results']
-        return violations
+        query = RULE_VIOLATIONS_QUERY
+        variables = {"rule_id": rule_id, "filter_inventory": {}}
+        return self.paginate(operation, variables, query, "ruleViolations")
 
     def export_csv_rule(self, rule_id):
         """ Get CSV formatted data regarding rule violations.
             :returns (csv) - Rule violations.
         """
         operation = "RuleViolationsCsv"
-        query = "query RuleViolationsCsv($rule_id: ID!){ruleCsv(rule_id: $rule_id){rule_name description category " \
-                "severity labels compliance date violation_count violations{resource_id resource_name resource_type " \
-                "account_display_name account_id region vpc_id tags monthly_cost __typename}__typename}}"
+        query = RULE_CSV_QUERY
         return self.graph_query(operation, {"rule_id": rule_id}, query)['data']['ruleCsv']
 
+    def iter_csv_rule(self, rule_id, document=None):
+        """ Stream the violations of export_csv_rule, one at a time, without loading the whole export.
+            :param rule_id (str)    - Rule's ID.
+            :param document (dict)  - Filled with the export's other fields (under ["data"]["ruleCsv"]) once iterated.
+            :returns (generator)    - Rule violations.
+        """
+        return self.stream_query(
+            "RuleViolationsCsv", {"rule_id": rule_id}, RULE_CSV_QUERY, ("ruleCsv", "violations"), document)
+
     def get_violation_cost_predicted_savings(self, rule_id, resource_id):
         """ Get Predicted Savings for a specific rule violation.
             :returns (int) - Predicted Savings for the violation.
@@ -551,7 +1181,7 @@ class GraphCommon(object):
             :returns (list) - Available compliance standards.
         """
         operation = 'Compliances'
-        query = "query Compliances{compliance{results{compliance __typename}__typename}}"
+        query = COMPLIANCES_QUERY
         return [c['compliance'] for c in self.graph_query(operation, {}, query)['data']['compliance']['results']]
 
     # Cost methods
@@ -623,19 +1253,14 @@ class GraphCommon(object):
         }
         return self.graph_query(operation, variables, query)['data']['cost']['results']
 
-    def get_cost_rules(self):
+    def get_cost_rules(self, fields=RULE_FIELDS):
         """
         Get Cost-related rules.
+        :param fields (iterable) - Fields of each rule, see build_selection; "category" and "status" are always fetched.
         :returns (list) - Cost Rules.
         """
-        operation = "RulesQuery"
-        query = "query RulesQuery($filters: RuleFilters, $eventId: String, $resourceId: String, $isRemediation: " \
-                "Boolean, $simulation: Boolean){rules(filters: $filters event_id: $eventId resource_id: $resourceId " \
-                "is_remediation: $isRemediation is_simulation: $simulation){total_count results{id name " \
-                "creation_date created_by category severity description labels compliance status state rule_type " \
-                "fail_simulation exclusions_count __typename}__typename}}"
-        all_rules = self.graph_query(operation, {}, query)["data"]["rules"]["results"]
-        return [r for r in all_rules if r["category"] == "Cost" and r["status"] == "active"]
+        fields = tuple(fields) + tuple(f for f in ("category", "status") if f not in fields)
+        return [r for r in self.get_rules(fields) if r["category"] == "Cost" and r["status"] == "active"]
 
     def get_recommendations_history_by_date(self, req_date):
         """
@@ -757,6 +1382,14 @@ class GraphCommon(object):
         """ Get CVEs.
             :returns (list) - CVEs information.
         """
+        return list(self.iter_cves(public_exposed, exploit_available, fix_available, cve_id, source, packages,
+                                   resource_id, resource_type, severity))
+
+    def iter_cves(self, public_exposed=False, exploit_available=False, fix_available=False, cve_id=None, source=None,
+                  packages=None, resource_id=None, resource_type=None, severity=None):
+        """ Iterate CVEs, page by page.
+            :returns (generator) - CVEs information.
+        """
         operation = 'CVEsMainQuery'
         variables = {
             'filters': {
@@ -767,12 +1400,7 @@ class GraphCommon(object):
             'sort_by': 'cvss_score',
             'sort_order': -1
         }
-        query = ("query CVEsMainQuery($filters: CVEFilters, $skip: Int, $limit: Int, $sort_by: CVESortField, "
-                 "$sort_order: Int){cves(filters: $filters skip: $skip limit: $limit sort_by: $sort_by "
-                 "sort_order: $sort_order){total_count results{attack_vector cve_id cve_sources severity cvss_score "
-                 "packages exploit_available internet_exposed affected_resources_count fix_available fixed_in_version "
-                 "epss_score cisa_kev{action date_added due_date __typename}published_date discovery_timestamp "
-                 "__typename}__typename}}")
+        query = CVES_QUERY
         if cve_id:
             variables['filters']['cve_id'] = cve_id
         if source:
@@ -785,20 +1413,32 @@ class GraphCommon(object):
             variables['filters']['resource_type'] = resource_type
         if severity:
             variables['filters']['severity'] = severity
-        return self.graph_query(operation, variables, query)['data']['cves']['results']
+        return self.paginate(operation, variables, query, "cves")
 
     def get_affected_resources(self, cve_id):
         operation = 'CVEResources'
         variables = {"filters": {"cve_ids": [cve_id]}}
-        query = ("query CVEResources($filters: VulnerableResourcesFilters, $skip: Int, $limit: Int){cve_resources("
-                 "filters: $filters, skip: $skip, limit: $limit){total_count results{account_id resource_id "
-                 "resource_type container_images exposure_risk exposure_risk_description internet_exposed __typename"
-                 "}__typename}}")
-        return self.graph_query(operation, variables, query)['data']['cve_resources']['results']
+        query = CVE_RESOURCES_QUERY
+        return list(self.paginate(operation, variables, query, "cve_resources"))
 
     # Flow logs methods
-    def get_flow_logs(self, skip=0, limit=999, action=None, dst_resource_id=None, start_time=None, end_time=None,
+    def get_flow_logs(self, skip=0, limit=None, action=None, dst_resource_id=None, start_time=None, end_time=None,
                       src_public=False, protocols=None):
+        """ Get flow logs.
+            :param skip (int)   - Flow logs to skip.
+            :param limit (int)  - Max flow logs to return; Defaults to all of them.
+            :returns (list)     - Flow logs.
+        """
+        return list(self.iter_flow_logs(skip, limit, action, dst_resource_id, start_time, end_time, src_public,
+                                        protocols))
+
+    def iter_flow_logs(self, skip=0, limit=None, action=None, dst_resource_id=None, start_time=None, end_time=None,
+                       src_public=False, protocols=None):
+        """ Iterate flow logs, page by page.
+            :param skip (int)   - Flow logs to skip.
+            :param limit (int)  - Max flow logs to return; Defaults to all of them.
+            :returns (generator) - Flow logs.
+        """
         operation = 'IPTraffic'
         query = ("query IPTraffic($filters: ConnectionsFilters, $limit: Int, $skip: Int){IPTraffic(filters: $filters, "
                  "limit: $limit, skip: $skip){results{src_port src_resource_id src_resource_type "
@@ -808,7 +1448,6 @@ class GraphCommon(object):
 
         variables = {
             "skip": skip,
-            "limit": limit,
             "filters": {}
         }
         if start_time or end_time:
@@ -828,250 +1467,41 @@ class GraphCommon(object):
             variables['filters']['src_ip_filter']['is_internet'] = True
         if protocols:
             variables['filters']['protocol'] = protocols.split(",")
-        return self.graph_query(operation, variables, query)['data']['IPTraffic']['results']
+        return self.paginate(operation, variables, query, "IPTraffic", max_items=limit)
 
-    def get_detections(self, page_size=500):
-        # 500 per page balances fewer round-trips against request payload size;
-        # the server's default implicit limit was dropping results beyond ~100.
+    def get_detections(self, page_size=DEFAULT_PAGE_SIZE):
+        return list(self.iter_detections(page_size))
+
+    def iter_detections(self, page_size=DEFAULT_PAGE_SIZE):
+        # The server's default implicit limit was dropping results beyond ~100, so always page explicitly.
         operation = 'Detections'
-        query = ("query Detections($filters: DetectionsFilters, $sort: DetectionsSort, $skip: Int, $limit: Int){"
-                 "get_detections(filters: $filters, sort: $sort, skip: $skip, limit: $limit){total_count results{_id "
-                 "timestamp activity_type source account_id anomaly_severity resource_id resource_type "
-                 "mitre_categories acknowledged acknowledgement_details{timestamp user reason __typename}signal_types "
-                 "__typename}__typename}}")
-        all_results = []
-        skip = 0
-        while True:
-            variables = {"filters": {}, "skip": skip, "limit": page_size}
-            batch = self.graph_query(operation, variables, query)['data']['get_detections']['results']
-            all_results.extend(batch)
-            if len(batch) < page_size:
-                break
-            skip += page_size
-        return all_results
+        query = DETECTIONS_QUERY
+        return self.paginate(operation, {"filters": {}}, query, "get_detections", page_size=page_size)
 
     def get_detection_enrichment(self, detection_id):
         operation = 'Detection'
         variables = {"filters": {"_id": [detection_id]}}
-        query = """query Detection($filters: DetectionsFilters) {
-                      get_detections(filters: $filters) {
-                        total_count
-                        results {
-                          _id
-                          timestamp
-                          activity_type
-                          source
-                          account_id
-                          anomaly_severity
-                          cluster
-                          namespace
-                          resource_id
-                          resource_type
-                          resource_cluster
-                          resource_namespace
-                          resource_deployment
-                          mitre_categories
-                          acknowledged
-                          signal_types
-                          session_list {
-                            ip_address
-                            access_key
-                            user_agent
-                            country_code_iso
-                            mfa
-                            __typename
-                          }
-                          acknowledgement_details {
-                            timestamp
-                            user
-                            reason
-                            __typename
-                          }
-                          external_id
-                          external_url
-                          json_data
-                          signals {
-                            signal_type
-                            ... on MaliciousIpSignal {
-                              malicious_ip_records {
-                                ...IpRecordFragment
-                                __typename
-                              }
-                              __typename
-                            }
-                            ... on TorIpSignal {
-                              tor_ip_records {
-                                ...IpRecordFragment
-                                __typename
-                              }
-                              __typename
-                            }
-                            ... on PentestToolSignal {
-                              agents
-                              __typename
-                            }
-                            ... on UnusualActivityTimeSignal {
-                              activity_time
-                              __typename
-                            }
-                            ... on UnusualActionTypeSignal {
-                              resource_types_by_resources_actions {
-                                resource_type
-                                anomalous_actions {
-                                  ...AnomalousActionFragment
-                                  __typename
-                                }
-                                __typename
-                              }
-                              __typename
-                            }
-                            ... on AnomalousGeoLocationSignal {
-                              locations
-                              __typename
-                            }
-                            ... on ActivityInUnusualAwsRegionSignal {
-                              unusual_activities_by_regions {
-                                location
-                                unusual_resource_types_actions {
-                                  resource_type
-                                  anomalous_actions {
-                                    ...AnomalousActionFragment
-                                    __typename
-                                  }
-                                  __typename
-                                }
-                                __typename
-                              }
-                              __typename
-                            }
-                            ... on AnomalousTrafficVolumeSignal {
-                              volume_size
-                              plot_coords {
-                                ...CoordinatesFragment
-                                __typename
-                              }
-                              top_destination_ips {
-                                ...IpRecordFragment
-                                __typename
-                              }
-                              __typename
-                            }
-                            ... on AnomalousOutboundConnectionSignal {
-                              destination_ips {
-                                ...IpRecordFragment
-                                __typename
-                              }
-                              __typename
-                            }
-                            ... on PossiblePortScanSignal {
-                              plot_coords {
-                                ...CoordinatesFragment
-                                __typename
-                              }
-                              __typename
-                            }
-                            ... on PossibleInternalIpScanSignal {
-                              plot_coords {
-                                ...CoordinatesFragment
-                                __typename
-                              }
-                              __typename
-                            }
-                            ... on AnomalousCountOfRejectedFlowsSignal {
-                              plot_coords {
-                                ...CoordinatesFragment
-                                __typename
-                              }
-                              __typename
-                            }
-                            ... on AnomalousDataStoreConnectivitySignal {
-                              resource_ids
-                              resource_types
-                              __typename
-                            }
-                            ... on AnomalousCountOfGetObjectsSignal {
-                              plot_coords {
-                                ...CoordinatesFragment
-                                __typename
-                              }
-                              __typename
-                            }
-                            ... on UnusualCostSpikeSignal {
-                              service
-                              plot_coords {
-                                ...CoordinatesFragment
-                                __typename
-                              }
-                              __typename
-                            }
-                            ... on UnusualActivityTimeSignal {
-                              activity_time
-                              __typename
-                            }
-                            ... on DetectionRuleActivitySignal {
-                              rule_id
-                              rule_name
-                              description
-                              type
-                              window_start
-                              window_end
-                              plot_coords {
-                                x_coords
-                                y_coords
-                                __typename
-                              }
-                              custom_config {
-                                log_type
-                                detection_field
-                                __typename
-                              }
-                              identityml_config {
-                                match_type
-                                action
-                                __typename
-                              }
-                              __typename
-                            }
-                            ... on GenericThirdPartyActivitySignal {
-                              name
-                              description
-                              mitre_categories
-                              __typename
-                            }
-                            __typename
-                          }
-                          __typename
-                        }
-                        __typename
-                      }
-                    }
-                    fragment IpRecordFragment on IpRecord {
-                      ip_address
-                      severity
-                      hosts
-                      ports
-                      initiated_session
-                      vol_traffic
-                      __typename
-                    }
-                    fragment AnomalousActionFragment on AnomalousAction {
-                      action
-                      mitre_category
-                      resource_ids
-                      sub_resource
-                      regions
-                      destinations
-                      request_uri
-                      __typename
-                    }
-                    fragment CoordinatesFragment on Coordinates {
-                      x_coords
-                      y_coords
-                      __typename
-                    }
-"""
+        query = DETECTION_ENRICHMENT_QUERY
         return self.graph_query(operation, variables, query)['data']['get_detections']['results']
 
+    def get_detections_enrichment(self, detection_ids, batch_size=None):
+        """ Get the enrichment of many detections, batch_size of them per request.
+            The detections filter takes a list of IDs, so each batch is a single filtered query.
+            :param detection_ids (list) - Detections' IDs.
+            :param batch_size (int)     - IDs per request; Defaults to the client's batch_size.
+            :returns (dict)             - Enrichment by detection ID; raises GraphBatchError if some IDs failed.
+        """
+        def lookup(chunk):
+            variables = {"filters": {"_id": chunk}, "limit": len(chunk)}
+            res = self.graph_query('Detection', variables, DETECTION_ENRICHMENT_QUERY)
+            detections = ((res or {}).get('data') or {}).get('get_detections')
+            if not detections:
+                message = ((res or {}).get('errors') or [{}])[0].get('message', 'No response')
+                return {}, {detection_id: message for detection_id in chunk}
+            results = {d['_id']: d for d in detections['results'] if d['_id'] in chunk}
+            return results, {d: "Detection not found" for d in chunk if d not in results}
+        return self._run_batches(lookup, detection_ids, batch_size)
+
     # General methods
     @staticmethod
     def create_graph_payload(operation_name, variables, query):
@@ -1092,6 +1522,247 @@ class GraphCommon(object):
                 "query": query}
         return payload
 
+    def _post(self, payload, headers=None, idempotent=None, stream=False):
+        """ Send a payload, retrying transient failures of idempotent requests with backoff and jitter.
+            :param payload (dict)       - The payload.
+            :param headers (dict)       - Request headers.
+            :param idempotent (bool)    - Safe to send more than once; Defaults to True for anything but mutations.
+            :param stream (bool)        - Return once the headers arrive, leaving the body to be read from the response.
+            :returns (Response)         - Successful HTTP response; raises GraphQueryError otherwise.
+        """
+        if idempotent is None:
+            idempotent = not payload["query"].lstrip().startswith("mutation")
+        operation_name = payload.get("operationName") or "anonymous"
+        started = time.monotonic()
+        try:
+            res = self._post_attempts(payload, headers, idempotent, stream)
+        except GraphQueryError:
+            self.metrics.record_call(operation_name, time.monotonic() - started, failed=True)
+            raise
+        # Streamed bodies aren't read yet, stream_query counts them as they arrive
+        self.metrics.record_call(operation_name, time.monotonic() - started, _body_size(res.request),
+                                 0 if stream else _body_size(res))
+        return res
+
+    def _post_attempts(self, payload, headers, idempotent, stream):
+        """ Send a payload until it succeeds, fails for good or runs out of retries, see _post. """
+        attempt = 0
+        while True:
+            if self.breaker is not None:
+                self.breaker.before_call()
+            retry_after = None
+            try:
+                res = self._send(payload, headers, stream)
+            except requests.RequestException as e:
+                server_failure = retryable = True
+                error = GraphQueryError(f"Request to {self.url} failed: {e}")
+            else:
+                if res:
+                    if self.breaker is not None:
+                        self.breaker.record_success()
+                    return res
+                # Only 5xx count against the breaker; throttling and client errors don't say the API is healthy either
+                server_failure = res.status_code >= 500
+                retryable = res.status_code in RETRYABLE_STATUS_CODES
+                retry_after = parse_retry_after(res.headers.get("Retry-After"))
+                error = GraphQueryError(
+                    f"Request to {self.url} failed with HTTP {res.status_code}: {res.text[:500]}", res.status_code)
+            if self.breaker is not None:
+                self.breaker.record_failure() if server_failure else self.breaker.record_neutral()
+            if not (retryable and idempotent) or attempt >= self.retry_policy.max_retries \
+                    or (retry_after or 0) > MAX_RETRY_AFTER:
+                raise error
+            time.sleep(self.retry_policy.delay(attempt, retry_after))
+            attempt += 1
+            with self._retries_lock:
+                self.retries[payload.get("operationName")] += 1
+            self.metrics.increment(payload.get("operationName") or "anonymous", "retries")
+
+    def _send(self, payload, headers=None, stream=False):
+        """ Send a payload over the pooled session, once.
+            :param payload (dict)   - The payload.
+            :param headers (dict)   - Request headers.
+            :param stream (bool)    - Return once the headers arrive.
+            :returns (Response)     - Raw HTTP response.
+        """
+        kwargs = {"json": payload}
+        if self.compress_requests:
+            body = dumps(payload)
+            if len(body) >= COMPRESS_MIN_SIZE:
+                body = gzip.compress(body)
+                headers = {**(headers or {}), "Content-Encoding": "gzip"}
+            kwargs = {"data": body, "headers": {**(headers or {}), "Content-Type": "application/json"}}
+        kwargs.setdefault("headers", headers)
+        if self.limiter is None:
+            return self.session.post(self.url, timeout=self.timeout, stream=stream, **kwargs)
+        with self.limiter.slot(payload.get("operationName")) as outcome:
+            res = self.session.post(self.url, timeout=self.timeout, stream=stream, **kwargs)
+            outcome["overloaded"] = res.status_code == 429 or res.status_code >= 500
+            return res
+
+    def paginate(self, operation_name, variables, query, collection, page_size=DEFAULT_PAGE_SIZE, max_items=None,
+                 fan_out=None):
+        """ Yield the results of a skip/limit collection, in order, one page at a time.
+            Once the first page reports totalCount/total_count, the remaining pages are fetched concurrently.
+            Stops on a short page, or once the total count of items was read.
+            :param operation_name (str) - The operation's name.
+            :param variables (dict)     - The variables, "skip" is used as the starting offset.
+            :param query (str)          - The query, must accept $skip and $limit.
+            :param collection (str)     - Field under "data" holding "results", e.g. "search".
+            :param page_size (int)      - Items requested per page; Defaults to DEFAULT_PAGE_SIZE.
+            :param max_items (int)      - Stop after this many items; Defaults to all of them.
+            :param fan_out (int)        - Pages fetched concurrently; Defaults to the client's page_fan_out.
+            :returns (generator)        - Collection results.
+        """
+        fan_out = fan_out or self.page_fan_out
+        skip = variables.get("skip") or 0
+        stop = None if max_items is None else skip + max_items
+        while stop is None or skip < stop:
+            limit = page_size if stop is None else min(page_size, stop - skip)
+            results, total_count = self._get_page(operation_name, variables, query, collection, skip, limit)
+            yield from results
+            skip += len(results)
+            if len(results) < limit or (total_count is not None and skip >= total_count):
+                return
+            if total_count is not None and fan_out > 1:
+                end = total_count if stop is None else min(total_count, stop)
+                yield from self._prefetch_pages(
+                    operation_name, variables, query, collection, skip, end, page_size, fan_out)
+                return
+
+    def _prefetch_pages(self, operation_name, variables, query, collection, start, end, page_size, fan_out):
+        """ Fetch the pages between two offsets concurrently, keeping at most fan_out of them in flight.
+            :returns (generator)    - Collection results, in offset order.
+        """
+        offsets = iter(range(start, end, page_size))
+        pending = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=fan_out) as executor:
+            def submit_next():
+                offset = next(offsets, None)
+                if offset is not None:
+                    pending.append(executor.submit(
+                        self._get_page, operation_name, variables, query, collection, offset,
+                        min(page_size, end - offset)))
+
+            try:
+                for _ in range(fan_out):
+                    submit_next()
+                while pending:
+                    results, _ = pending.popleft().result()
+                    submit_next()
+                    yield from results
+            finally:
+                # The consumer may stop early, don't fetch pages nobody will read
+                for future in pending:
+                    future.cancel()
+
+    def _get_page(self, operation_name, variables, query, collection, skip, limit):
+        """ Get a single page of a skip/limit collection.
+            :returns (tuple)    - The page results and the collection's total count, if reported.
+        """
+        res = self.graph_query(operation_name, {**variables, "skip": skip, "limit": limit}, query)
+        if not res or not (res.get('data') or {}).get(collection):
+            raise Exception(f'Something went wrong while paginating "{collection}", result: {res}')
+        page = res['data'][collection]
+        return page.get('results') or [], page.get('totalCount', page.get('total_count'))
+
+    def _aliased_batch(self, operation_name, field, arguments, selection, ids, batch_size=None, id_type="ID",
+                       extract=None):
+        """ Look up many IDs by packing one aliased copy of a field per ID into each GraphQL document.
+            :param operation_name (str) - The operation's name.
+            :param field (str)          - Root field to query, e.g. "resource".
+            :param arguments (str)      - Field arguments, "{var}" is replaced by each ID's variable.
+            :param selection (str)      - Selection set of the field.
+            :param ids (list)           - IDs to look up.
+            :param batch_size (int)     - IDs per request; Defaults to the client's batch_size.
+            :param id_type (str)        - GraphQL type of the ID variables.
+            :param extract (func)       - Applied to each field result; Defaults to returning it as is.
+            :returns (dict)             - Result by ID; raises GraphBatchError if some IDs failed.
+        """
+        def lookup(chunk):
+            aliases = {f"r{i}": resource_id for i, resource_id in enumerate(chunk)}
+            variables_def = ", ".join(f"$id{i}: {id_type}" for i in range(len(chunk)))
+            fields = " ".join(f"r{i}: {field}({arguments.format(var=f'$id{i}')}){{{selection}}}"
+                              for i in range(len(chunk)))
+            query = f"query {operation_name}({variables_def}){{{fields}}}"
+            res = self.graph_query(operation_name, {f"id{i}": v for i, v in enumerate(chunk)}, query) or {}
+            data = res.get('data') or {}
+            errors = {}
+            for error in res.get('errors') or []:
+                path = error.get('path') or []
+                if path and path[0] in aliases:
+                    errors[aliases[path[0]]] = error.get('message')
+                else:
+                    # Not tied to an alias (e.g. a validation error), it applies to every ID without data
+                    errors.update({v: error.get('message') for k, v in aliases.items() if data.get(k) is None})
+            results = {}
+            for alias, resource_id in aliases.items():
+                if resource_id in errors:
+                    continue
+                if alias not in data:
+                    errors[resource_id] = "No response"
+                elif extract and data[alias] is not None:
+                    results[resource_id] = extract(data[alias])
+                else:
+                    results[resource_id] = data[alias]
+            return results, errors
+        return self._run_batches(lookup, ids, batch_size)
+
+    def _disk_cached(self, kind, resource_ids, lookup, versions=None):
+        """ Serve resource documents from the disk cache while the resources' configuration version is unchanged.
+            :param kind (str)           - Document kind, part of the disk cache key.
+            :param resource_ids (list)  - Resources' IDs.
+            :param lookup (func)        - Takes a list of IDs, returns the documents by ID (may raise GraphBatchError).
+            :param versions (dict)      - Latest configuration version by resource ID, if the caller already has them;
+                                          Defaults to looking them up.
+            :returns (dict)             - Document by resource ID.
+        """
+        if self.disk_cache is None:
+            return lookup(resource_ids)
+        if versions is None:
+            try:
+                versions = self.get_resources_configuration_latest_version_by_id(resource_ids)
+            except GraphBatchError as e:
+                versions = e.results
+        results = {}
+        for resource_id in resource_ids:
+            cached = self.disk_cache.get(self.customer_id, resource_id, kind, versions.get(resource_id))
+            if cached is not None:
+                results[resource_id] = cached
+        missing = [r for r in resource_ids if r not in results]
+        try:
+            fetched = lookup(missing) if missing else {}
+        except GraphBatchError as e:
+            self._disk_store(kind, e.results, versions)
+            raise GraphBatchError(e.errors, {**results, **e.results})
+        self._disk_store(kind, fetched, versions)
+        return {**results, **fetched}
+
+    def _disk_store(self, kind, documents, versions):
+        for resource_id, document in documents.items():
+            if document is not None:
+                self.disk_cache.put(self.customer_id, resource_id, kind, versions.get(resource_id), document)
+
+    def _run_batches(self, lookup, ids, batch_size=None):
+        """ Split IDs into batches, run the lookup of each batch (concurrently) and merge their results.
+            :param lookup (func)    - Takes a list of IDs, returns a (results, errors) tuple of dicts by ID.
+            :param ids (list)       - IDs to look up, duplicates are looked up once.
+            :param batch_size (int) - IDs per batch; Defaults to the client's batch_size.
+            :returns (dict)         - Result by ID; raises GraphBatchError if some IDs failed.
+        """
+        ids = list(dict.fromkeys(ids))
+        batch_size = batch_size or self.batch_size
+        chunks = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+        results, errors = {}, {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(self.page_fan_out, len(chunks)))) \
+                as executor:
+            for chunk_results, chunk_errors in executor.map(lookup, chunks):
+                results.update(chunk_results)
+                errors.update(chunk_errors)
+        if errors:
+            raise GraphBatchError(errors, results)
+        return results
+
     def graph_query(self, operation_name, variables, query):
         """ Get graph query.
             :param operation_name (str) - The operation's name.
@@ -1100,22 +1771,163 @@ class GraphCommon(object):
             :returns (dict)             - Response from query.
         """
         customer_id = self.customer_id or self.get_customer_id()
-        payload = self.create_graph_payload(operation_name, variables, query)
-        res = requests.post(self.url, json=payload, headers={"Authorization": self.token, "customer": customer_id})
-        if bool(res):
-            if 'UNAUTHENTICATED' in str(json.loads(res.text)):
-                # Token-auth sessions have no credentials to re-authenticate with;
-                # surface the original failure instead of calling get_token(None, None).
-                if not self.email or not self.pw:
-                    return json.loads(res.text)
-                self.token = self.get_token(self.email, self.pw)
-                res = requests.post(
-                    self.url, json=payload,
-                    headers={"Authorization": self.token, "customer": customer_id})
-            return json.loads(res.text)
+        if query.lstrip().startswith("mutation"):
+            if self.cache is not None:
+                # Mutations are never cached, and whatever they changed may be cached
+                self.cache.clear()
+            return self._send_query(customer_id, operation_name, variables, query)
+        key = ResponseCache.make_key(customer_id, operation_name, variables, query)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.metrics.increment(operation_name, "cache_hits")
+                return cached
+        if not self.single_flight:
+            response = self._send_query(customer_id, operation_name, variables, query)
         else:
-            print(f"res: {res}")
-            return None
+            response = self._single_flight(
+                key, lambda: self._send_query(customer_id, operation_name, variables, query))
+        if response and response.get('errors'):
+            self.metrics.increment(operation_name, "graphql_errors")
+        elif self.cache is not None and response:
+            self.cache.put(key, response)
+        return response
+
+    def _single_flight(self, key, send):
+        """ Send a query, or wait for an identical one already in flight and share its response.
+            :param key (tuple)  - Key of the query, from ResponseCache.make_key().
+            :param send (func)  - Sends the query and returns its response.
+            :returns (dict)     - The response; callers that waited get their own copy.
+        """
+        with self._in_flight_lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = [concurrent.futures.Future(), 0]
+            else:
+                call[1] += 1
+                self.coalesced_calls += 1
+        if not leader:
+            # The operation name is the key's second item
+            self.metrics.increment(key[1], "coalesced")
+        future = call[0]
+        if not leader:
+            return copy.deepcopy(future.result())
+        try:
+            response = send()
+        except BaseException as e:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._in_flight_lock:
+            del self._in_flight[key]
+            waiters = call[1]
+        # The caller is free to mutate its response, so waiters copy from a snapshot of it
+        future.set_result(copy.deepcopy(response) if waiters else None)
+        return response
+
+    def _send_query(self, customer_id, operation_name, variables, query):
+        payload = self.create_graph_payload(operation_name, variables, query)
+        generation, token = self._valid_token()
+        response = self._post_query(payload, headers={"Authorization": token, "customer": customer_id})
+        # Surface the original failure instead of calling get_token(None, None).
+        if self._unauthenticated(response.get('errors')):
+            # Only the first thread to see the expired token logs in, the others reuse its new token
+            token = self.refresh_token(generation)
+            response = self._post_query(payload, headers={"Authorization": token, "customer": customer_id})
+        return response
+
+    def _post_query(self, payload, headers):
+        """ Post a query and decode its response, sending only the query's hash when persisted_queries is on.
+            :param payload (dict)   - The request payload.
+            :param headers (dict)   - Request headers.
+            :returns (dict)         - The decoded response.
+        """
+        query = payload.get("query")
+        if not self.persisted_queries or not query or query.lstrip().startswith("mutation"):
+            # Decoded straight from the bytes, skipping the intermediate str of res.text
+            return loads(self._post(payload, headers=headers).content)
+        extensions = persisted_query_extensions(query)
+        hashed = {key: value for key, value in payload.items() if key != "query"}
+        response = loads(self._post({**hashed, "extensions": extensions}, headers=headers, idempotent=True).content)
+        error = persisted_query_error(response)
+        if error is None:
+            return response
+        if error != PERSISTED_QUERY_NOT_FOUND:
+            # PersistedQueryNotSupported: the server has APQ off, stop paying the extra round-trip
+            self.persisted_queries = False
+        # Sending the text along with the hash registers it, so the next calls can send the hash alone
+        return loads(self._post({**payload, "extensions": extensions}, headers=headers, idempotent=True).content)
+
+    def stream_query(self, operation_name, variables, query, path, document=None):
+        """ Send a query and yield the items of one array of its response as they arrive.
+            Unlike graph_query, the response is never held in memory as a whole, only about one item at a time.
+            Responses aren't cached or shared between identical queries.
+            :param operation_name (str) - The operation's name.
+            :param variables (dict)     - The variables.
+            :param query (str)          - The query.
+            :param path (tuple)         - Keys under "data" leading to the array, e.g. ("ruleCsv", "violations").
+            :param document (dict)      - Filled with the rest of the response ("errors", fields beside the array).
+            :returns (generator)        - The array's items.
+        """
+        customer_id = self.customer_id or self.get_customer_id()
+        payload = self.create_graph_payload(operation_name, variables, query)
+        document = {} if document is None else document
+        generation, token = self._valid_token()
+        for attempt in range(2):
+            yielded = False
+            res = self._post(payload, headers={"Authorization": token, "customer": customer_id}, stream=True)
+            try:
+                chunks = _counted_chunks(res.iter_content(STREAM_CHUNK_SIZE), self.metrics, operation_name)
+                for item in iter_json_items(chunks, ("data",) + tuple(path), document):
+                    yielded = True
+                    yield item
+            finally:
+                res.close()
+            if not document.get('errors'):
+                return
+            if yielded:
+                # Items were already handed out, so the query can't be retried; the errors still fail it
+                raise GraphQueryError(f"{operation_name} failed after part of its results: {document['errors']}")
+            if attempt == 0 and self._unauthenticated(document['errors']):
+                token = self.refresh_token(generation)
+                document.clear()
+                continue
+            raise Exception(f'Something went wrong, result: {document}')
+
+    def _can_login(self):
+        # Token-auth sessions have no credentials to re-authenticate with, two-factor ones no one-time password
+        return bool(self.email and self.pw) and not self.two_factor
+
+    def _unauthenticated(self, errors):
+        """ Whether a query was rejected for its token and should be sent again after logging in again.
+            :param errors (list)    - Errors of the response.
+            :returns (bool)         - True if it should; raises SessionExpiredError for two-factor logins.
+        """
+        if 'UNAUTHENTICATED' not in str(errors or ''):
+            return False
+        if self.two_factor:
+            raise SessionExpiredError(f"The session expired, log in again with a new one-time password: {errors}")
+        return self._can_login()
+
+    def _valid_token(self):
+        """ Get the current token, logging in again first if it's about to expire.
+            :returns (tuple)    - Token generation and token.
+        """
+        generation, token = self.token_generation, self.token
+        if self.two_factor and self.token_expires_at and time.time() > self.token_expires_at:
+            raise SessionExpiredError("The session expired, log in again with a new one-time password")
+        if self._can_login() and self.token_expires_at and \
+                time.time() > self.token_expires_at - TOKEN_REFRESH_MARGIN:
+            token = self.refresh_token(generation)
+            generation = self.token_generation
+        return generation, token
 
     def change_client_ws(self, ws):
         self.customer_id = ws
+
+    def close(self):
+        """ Release the pooled connections, unless the session is shared with other clients. """
+        if self._owns_session:
+            self.session.close()
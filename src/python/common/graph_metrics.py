@@ -0,0 +1,142 @@
+import bisect
+import threading
+
+# Upper bounds in seconds of the latency histogram buckets; ruleCsv exports can take minutes.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+COUNTERS = ("calls", "failures", "graphql_errors", "retries", "cache_hits", "coalesced", "request_bytes",
+            "response_bytes")
+PROMETHEUS_PREFIX = "stream_graphql"
+
+
+class GraphMetrics:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """ Per operationName counters and latency histograms of GraphQL calls. Thread safe.
+            :param buckets (tuple)  - Ascending upper bounds in seconds of the latency buckets.
+        """
+        self.buckets = tuple(buckets)
+        self._operations = {}
+        self._lock = threading.Lock()
+
+    def _operation(self, operation):
+        # Called with the lock held
+        stats = self._operations.get(operation)
+        if stats is None:
+            stats = self._operations[operation] = dict.fromkeys(COUNTERS, 0)
+            stats.update(latency_sum=0.0, latency_max=0.0, latency_buckets=[0] * (len(self.buckets) + 1))
+        return stats
+
+    def record_call(self, operation, latency, request_bytes=0, response_bytes=0, failed=False):
+        """ Record one call sent to the API, retries included.
+            :param operation (str)      - The operationName.
+            :param latency (float)      - Seconds until the response (or the final failure).
+            :param request_bytes (int)  - Bytes of the request body.
+            :param response_bytes (int) - Bytes of the response body.
+            :param failed (bool)        - The call failed with an HTTP or transport error.
+        """
+        with self._lock:
+            stats = self._operation(operation)
+            stats["calls"] += 1
+            stats["failures"] += bool(failed)
+            stats["request_bytes"] += request_bytes
+            stats["response_bytes"] += response_bytes
+            stats["latency_sum"] += latency
+            stats["latency_max"] = max(stats["latency_max"], latency)
+            stats["latency_buckets"][bisect.bisect_left(self.buckets, latency)] += 1
+
+    def increment(self, operation, counter, value=1):
+        """ Add to one of the counters.
+            :param operation (str)  - The operationName.
+            :param counter (str)    - One of COUNTERS, e.g. "retries" or "cache_hits".
+            :param value (int)      - Amount to add.
+        """
+        if counter not in COUNTERS:
+            raise ValueError(f"Unknown counter {counter}, expected one of {COUNTERS}")
+        with self._lock:
+            self._operation(operation)[counter] += value
+
+    def reset(self):
+        """ Forget everything recorded so far. """
+        with self._lock:
+            self._operations.clear()
+
+    def snapshot(self):
+        """ Get a copy of the metrics.
+            :returns (dict) - By operationName: the COUNTERS, and "latency" with count, sum, max and
+                              "buckets", the cumulative count of calls at or under each bound ("+Inf" last).
+        """
+        with self._lock:
+            operations = {name: dict(stats, latency_buckets=list(stats["latency_buckets"]))
+                          for name, stats in self._operations.items()}
+        snapshot = {}
+        for name, stats in operations.items():
+            cumulative, buckets = 0, {}
+            for bound, count in zip(self.buckets + ("+Inf",), stats["latency_buckets"]):
+                cumulative += count
+                buckets[bound] = cumulative
+            snapshot[name] = {counter: stats[counter] for counter in COUNTERS}
+            snapshot[name]["latency"] = {"count": cumulative, "sum": stats["latency_sum"],
+                                         "max": stats["latency_max"], "buckets": buckets}
+        return snapshot
+
+    @staticmethod
+    def percentile(latency, quantile):
+        """ Estimate a latency percentile from a snapshot's histogram.
+            :param latency (dict)       - The "latency" of one operation in a snapshot.
+            :param quantile (float)     - E.g. 0.95.
+            :returns (float)            - Upper bound of the bucket holding the percentile, capped at the maximum.
+        """
+        if not latency["count"]:
+            return 0.0
+        rank = quantile * latency["count"]
+        for bound, cumulative in latency["buckets"].items():
+            if cumulative >= rank:
+                return latency["max"] if bound == "+Inf" else min(bound, latency["max"])
+        return latency["max"]
+
+    def summary_table(self):
+        """ Format the metrics as a text table, slowest operations (by total time) first.
+            :returns (str)  - The table, empty if nothing was recorded.
+        """
+        snapshot = self.snapshot()
+        if not snapshot:
+            return ""
+        header = f"{'operation':<40}{'calls':>8}{'errors':>8}{'retries':>8}{'cached':>8}" \
+                 f"{'avg s':>9}{'p95 s':>9}{'max s':>9}{'sent KB':>10}{'recv KB':>11}"
+        lines = [header, "-" * len(header)]
+        for name, stats in sorted(snapshot.items(), key=lambda item: -item[1]["latency"]["sum"]):
+            latency = stats["latency"]
+            average = latency["sum"] / latency["count"] if latency["count"] else 0.0
+            lines.append(f"{name[:39]:<40}{stats['calls']:>8}{stats['failures'] + stats['graphql_errors']:>8}"
+                         f"{stats['retries']:>8}{stats['cache_hits'] + stats['coalesced']:>8}{average:>9.3f}"
+                         f"{self.percentile(latency, 0.95):>9.3f}{latency['max']:>9.3f}"
+                         f"{stats['request_bytes'] / 1024:>10.1f}{stats['response_bytes'] / 1024:>11.1f}")
+        return "\n".join(lines)
+
+    def to_prometheus(self):
+        """ Format the metrics in the Prometheus text exposition format.
+            :returns (str)  - The metrics.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for counter in COUNTERS:
+            metric = f"{PROMETHEUS_PREFIX}_{counter}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(f'{metric}{{operation="{_escape(name)}"}} {stats[counter]}'
+                         for name, stats in snapshot.items())
+        metric = f"{PROMETHEUS_PREFIX}_latency_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        for name, stats in snapshot.items():
+            label = f'operation="{_escape(name)}"'
+            for bound, cumulative in stats["latency"]["buckets"].items():
+                lines.append(f'{metric}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{label}}} {stats['latency']['sum']}")
+            lines.append(f"{metric}_count{{{label}}} {stats['latency']['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# Process-wide metrics, what GraphCommon records to unless given its own
+DEFAULT_METRICS = GraphMetrics()
@@ -0,0 +1,29 @@
+import json
+
+# orjson is optional; it decodes straight from the response bytes several times faster than the json module.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = "json" if orjson is None else "orjson"
+
+
+def loads(data):
+    """ Decode JSON.
+        :param data (bytes) - UTF-8 JSON, str is accepted too.
+        :returns (object)   - The decoded value.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value):
+    """ Encode JSON.
+        :param value (object)   - The value.
+        :returns (bytes)        - UTF-8 JSON.
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode()
@@ -0,0 +1,125 @@
+import codecs
+import json
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = ' \t\r\n'
+_DISCARD_THRESHOLD = 64 * 1024
+
+
+class _Reader:
+    def __init__(self, chunks):
+        """ Incremental reader of a JSON document split into chunks.
+            :param chunks (iterable)    - Bytes (UTF-8) or str chunks.
+        """
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+
+    def more(self):
+        """ Append the next chunk to the buffer.
+            :returns (bool) - False at the end of the stream.
+        """
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+            if text:
+                self.buf += text
+                return True
+        return False
+
+    def discard(self):
+        """ Drop the consumed part of the buffer, so it holds about one chunk and one value at a time. """
+        # Trimming copies the rest of the buffer, so it's done once per chunk rather than once per value
+        if self.pos >= _DISCARD_THRESHOLD:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+
+    def peek(self):
+        """ Skip whitespace and get the next character, without consuming it.
+            :returns (str)  - The character, None at the end of the stream.
+        """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.more():
+                return None
+
+    def expect(self, chars):
+        """ Consume the next character, which must be one of chars.
+            :param chars (str)  - Accepted characters.
+            :returns (str)      - The character.
+        """
+        char = self.peek()
+        if char is None or char not in chars:
+            raise ValueError(f"Invalid JSON stream: expected one of {chars!r}, got {char!r} at {self.pos}")
+        self.pos += 1
+        return char
+
+    def take(self):
+        """ Decode and consume the next value, reading more of the stream while it's incomplete.
+            :returns (object)   - The decoded value.
+        """
+        if self.peek() is None:
+            raise ValueError("Invalid JSON stream: unexpected end")
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if self.more():
+                    continue
+                raise ValueError(f"Invalid JSON stream: {e}")
+            # A number cut by the end of the buffer decodes fine, so it's only trusted once followed by something
+            if end == len(self.buf) and self.buf[self.pos] not in '{["' and self.more():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_items(chunks, path, document=None):
+    """ Yield the items of the JSON array at path, each one as soon as it's fully received.
+        Only one item is held in memory at a time, instead of the whole text and object tree.
+        :param chunks (iterable)    - The document, as bytes (UTF-8) or str chunks.
+        :param path (tuple)         - Object keys leading to the array, e.g. ("data", "ruleCsv", "violations").
+        :param document (dict)      - Filled with every value beside the path (e.g. "errors", or the fields next to
+                                      the array), so the rest of the document is available once iterated.
+        :returns (generator)        - The items.
+    """
+    reader = _Reader(chunks)
+    if reader.peek() is None:
+        return
+    yield from _walk_object(reader, tuple(path), {} if document is None else document)
+
+
+def _walk_object(reader, path, document):
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.pos += 1
+        return
+    while True:
+        key = reader.take()
+        reader.expect(':')
+        char = reader.peek()
+        if key == path[0] and len(path) == 1 and char == '[':
+            yield from _walk_array(reader)
+        elif key == path[0] and len(path) > 1 and char == '{':
+            yield from _walk_object(reader, path[1:], document.setdefault(key, {}))
+        else:
+            document[key] = reader.take()
+        reader.discard()
+        if reader.expect(',}') == '}':
+            return
+
+
+def _walk_array(reader):
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+        return
+    while True:
+        item = reader.take()
+        reader.discard()
+        yield item
+        if reader.expect(',]') == ']':
+            return
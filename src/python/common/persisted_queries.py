@@ -0,0 +1,74 @@
+import functools
+import hashlib
+import threading
+
+# Automatic persisted queries (APQ), as implemented by Apollo Server: the client sends the SHA-256 of the query
+# instead of its text, and only sends the text (which registers it) when the server answers PersistedQueryNotFound.
+PERSISTED_QUERY_NOT_FOUND = "PersistedQueryNotFound"
+PERSISTED_QUERY_NOT_SUPPORTED = "PersistedQueryNotSupported"
+
+
+@functools.lru_cache(maxsize=1024)
+def persisted_query_hash(query):
+    """ Get the APQ hash of a query.
+        :param query (str)  - The query.
+        :returns (str)      - Hex SHA-256 of the query text.
+    """
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def persisted_query_extensions(query):
+    """ Get the "extensions" of a request sending the query by hash.
+        :param query (str)  - The query.
+        :returns (dict)     - Extensions.
+    """
+    return {"persistedQuery": {"version": 1, "sha256Hash": persisted_query_hash(query)}}
+
+
+def persisted_query_error(response):
+    """ Find an APQ error in a response.
+        :param response (dict)  - Decoded GraphQL response.
+        :returns (str)          - PERSISTED_QUERY_NOT_FOUND, PERSISTED_QUERY_NOT_SUPPORTED or None.
+    """
+    for error in (response or {}).get("errors") or []:
+        code = (error.get("extensions") or {}).get("code")
+        for name in (PERSISTED_QUERY_NOT_FOUND, PERSISTED_QUERY_NOT_SUPPORTED):
+            if error.get("message") == name or code in (name, _as_code(name)):
+                return name
+    return None
+
+
+def _as_code(name):
+    # PersistedQueryNotFound -> PERSISTED_QUERY_NOT_FOUND
+    return "".join(f"_{c}" if c.isupper() else c.upper() for c in name).lstrip("_")
+
+
+class PersistedQueryStore:
+    def __init__(self):
+        """ Server side of APQ, for GraphQL stand-ins: remembers queries by hash. """
+        self.queries = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, payload):
+        """ Get the query text of a request, registering it when sent along with its hash.
+            :param payload (dict)   - The request payload.
+            :returns (tuple)        - (query, None), or (None, error response) when it can't be resolved.
+        """
+        query = payload.get("query")
+        persisted = (payload.get("extensions") or {}).get("persistedQuery")
+        if not persisted:
+            return query, None
+        query_hash = persisted.get("sha256Hash")
+        if query is not None:
+            if persisted_query_hash(query) != query_hash:
+                return None, {"errors": [{"message": "provided sha does not match query",
+                                          "extensions": {"code": "INTERNAL_SERVER_ERROR"}}]}
+            with self._lock:
+                self.queries[query_hash] = query
+            return query, None
+        with self._lock:
+            query = self.queries.get(query_hash)
+        if query is None:
+            return None, {"errors": [{"message": PERSISTED_QUERY_NOT_FOUND,
+                                      "extensions": {"code": _as_code(PERSISTED_QUERY_NOT_FOUND)}}]}
+        return query, None
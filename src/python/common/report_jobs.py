@@ -0,0 +1,153 @@
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+# Reports run at once; the rest wait in the queue
+DEFAULT_JOB_WORKERS = int(os.environ.get("REPORT_JOB_WORKERS", 4))
+# Seconds a finished job and its artifact are kept for
+DEFAULT_JOB_RETENTION = int(os.environ.get("REPORT_JOB_RETENTION", 3600))
+DEFAULT_ARTIFACT_DIR = os.environ.get("REPORT_JOB_DIR", os.path.join(tempfile.gettempdir(), "stream_report_jobs"))
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+# Lines of the utility's log kept as the job's progress
+PROGRESS_LINES = 20
+
+
+def submission_key(endpoint, payload):
+    """ Key identical submissions share, credentials included so different users never share a job.
+        :param endpoint (str)   - Report endpoint.
+        :param payload (dict)   - Request payload.
+        :returns (str)          - SHA-256 hex digest.
+    """
+    canonical = json.dumps([endpoint, payload], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ReportJob:
+    def __init__(self, endpoint, key):
+        """ One run of a report utility.
+            :param endpoint (str)   - Report endpoint.
+            :param key (str)        - Submission key, see submission_key.
+        """
+        self.id = uuid.uuid4().hex
+        self.endpoint = endpoint
+        self.key = key
+        self.status = QUEUED
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.progress = []
+        self.log_lines = 0
+        self.artifact = None
+        self.file_name = None
+        self.error = None
+        self.exception = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {"job_id": self.id, "endpoint": self.endpoint, "status": self.status, "created": self.created,
+                "started": self.started, "finished": self.finished, "file_name": self.file_name,
+                "error": self.error, "progress": self.progress[-1] if self.progress else None,
+                "log_lines": self.log_lines}
+
+
+class _ProgressHandler(logging.Handler):
+    """ Route the log records of a job's worker thread to the job's progress. """
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.jobs = {}
+
+    def emit(self, record):
+        job = self.jobs.get(threading.get_ident())
+        if job is not None:
+            job.progress = (job.progress + [record.getMessage()])[-PROGRESS_LINES:]
+            job.log_lines += 1
+
+
+class JobQueue:
+    def __init__(self, max_workers=DEFAULT_JOB_WORKERS, retention=DEFAULT_JOB_RETENTION,
+                 artifact_dir=DEFAULT_ARTIFACT_DIR, logger_name="stream_external_tools"):
+        """ Run report utilities in a bounded pool of worker threads and keep their artifacts for a while.
+            :param max_workers (int)    - Reports run at once.
+            :param retention (int)      - Seconds finished jobs and their artifacts are kept for.
+            :param artifact_dir (str)   - Directory the artifacts are moved to, one sub directory per job.
+            :param logger_name (str)    - Logger whose records become the jobs' progress.
+        """
+        self.retention = retention
+        self.artifact_dir = artifact_dir
+        self.jobs = {}
+        self._active = {}
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers, thread_name_prefix="report-job")
+        self._progress = _ProgressHandler()
+        self._logger = logging.getLogger(logger_name)
+        self._logger.addHandler(self._progress)
+
+    def submit(self, endpoint, key, func, *args, **kwargs):
+        """ Queue a report, or attach to the queued or running job of an identical submission.
+            :param endpoint (str)   - Report endpoint.
+            :param key (str)        - Submission key, see submission_key.
+            :param func (func)      - The utility's main(), called with output set to the job's own directory and
+                                      returning the path of the file it wrote there.
+            :returns (ReportJob)    - The job.
+        """
+        self.purge()
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                return job
+            job = ReportJob(endpoint, key)
+            self.jobs[job.id] = self._active[key] = job
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        job.status, job.started = RUNNING, time.time()
+        self._progress.jobs[threading.get_ident()] = job
+        # Each job writes in its own directory, so jobs of the same report never overwrite each other's file
+        job_dir = os.path.join(self.artifact_dir, job.id)
+        try:
+            os.makedirs(job_dir, exist_ok=True)
+            job.artifact = func(*args, output=job_dir, **kwargs)
+            job.file_name = os.path.basename(job.artifact)
+            job.status = SUCCEEDED
+        except Exception as e:
+            self._logger.error(f"Report job {job.id} ({job.endpoint}) failed: {e}")
+            job.error, job.exception, job.status = str(e), e.with_traceback(None), FAILED
+            shutil.rmtree(job_dir, ignore_errors=True)
+        finally:
+            self._progress.jobs.pop(threading.get_ident(), None)
+            job.finished = time.time()
+            with self._lock:
+                if self._active.get(job.key) is job:
+                    del self._active[job.key]
+            job.done.set()
+
+    def get(self, job_id):
+        """ Get a job.
+            :param job_id (str)     - The job's ID.
+            :returns (ReportJob)    - The job, None if unknown or expired.
+        """
+        self.purge()
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def purge(self):
+        """ Forget the jobs that finished more than retention seconds ago and delete their artifacts. """
+        expired_before = time.time() - self.retention
+        with self._lock:
+            expired = [job for job in self.jobs.values() if job.finished and job.finished < expired_before]
+            for job in expired:
+                del self.jobs[job.id]
+        for job in expired:
+            shutil.rmtree(os.path.join(self.artifact_dir, job.id), ignore_errors=True)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+        self._logger.removeHandler(self._progress)
@@ -0,0 +1,190 @@
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import multiprocessing
+import os
+import threading
+
+# Threads running the I/O bound reports, e.g. the CSV exports waiting on the API
+DEFAULT_POOL_THREADS = int(os.environ.get("REPORT_POOL_THREADS", 8))
+# Processes running the CPU bound reports (XLSX/PDF generation); 0 runs them in the threads as well
+DEFAULT_POOL_PROCESSES = int(os.environ.get("REPORT_POOL_PROCESSES", min(4, os.cpu_count() or 1)))
+# Runs of one endpoint at once, unless overridden in REPORT_ENDPOINT_LIMITS ("endpoint=limit,endpoint=limit")
+DEFAULT_ENDPOINT_LIMIT = int(os.environ.get("REPORT_ENDPOINT_LIMIT", 2))
+
+
+def parse_limits(text):
+    """ Parse per endpoint limits.
+        :param text (str)   - "endpoint=limit" pairs separated by commas, e.g. "generate_compliance_report=1".
+        :returns (dict)     - Limit by endpoint.
+    """
+    limits = {}
+    for pair in filter(None, (part.strip() for part in (text or "").split(","))):
+        endpoint, _, limit = pair.partition("=")
+        if not limit.strip().isdigit() or int(limit) < 1:
+            raise ValueError(f"Invalid endpoint limit {pair!r}, expected endpoint=limit with a positive limit")
+        limits[endpoint.strip()] = int(limit)
+    return limits
+
+
+class EndpointLimit:
+    def __init__(self, limit):
+        """ A cap on the runs of one endpoint, waited on by threads and coroutines alike, in arrival order.
+            :param limit (int) - Runs at once.
+        """
+        self.limit = limit
+        self.running = 0
+        self._waiters = collections.deque()
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self):
+        with self._lock:
+            return sum(not waiter.cancelled() for waiter in self._waiters)
+
+    def acquire(self):
+        """ Ask for a slot.
+            :returns (concurrent.futures.Future) - Resolved once the slot is granted; cancel it to stop waiting.
+        """
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self.running < self.limit:
+                self.running += 1
+                future.set_running_or_notify_cancel()
+                future.set_result(None)
+            else:
+                self._waiters.append(future)
+        return future
+
+    async def acquire_async(self):
+        """ Wait for a slot without blocking the event loop. """
+        future = self.acquire()
+        try:
+            await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # The slot may have been granted just before the cancellation, hand it over
+            if not future.cancel():
+                self.release()
+            raise
+
+    def release(self):
+        """ Give the slot to the next waiter, if any. """
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if waiter.set_running_or_notify_cancel():
+                    waiter.set_result(None)
+                    return
+            self.running -= 1
+
+
+class ReportPool:
+    def __init__(self, threads=DEFAULT_POOL_THREADS, processes=DEFAULT_POOL_PROCESSES, limits=None,
+                 default_limit=DEFAULT_ENDPOINT_LIMIT, initializer=None):
+        """ Run the reports off the event loop: the I/O bound ones in a thread pool and the CPU bound ones in a process
+            pool, so they use every core, and at most a few runs of each endpoint at once.
+            :param threads (int)        - Threads of the thread pool.
+            :param processes (int)      - Processes of the process pool, started on first use; 0 for none.
+            :param limits (dict)        - Runs at once by endpoint; Defaults to REPORT_ENDPOINT_LIMITS.
+            :param default_limit (int)  - Runs at once of the other endpoints.
+            :param initializer (func)   - Called when a worker process starts, e.g. to set up its caches.
+        """
+        self.processes = processes
+        self.default_limit = default_limit
+        self.initializer = initializer
+        self._configured_limits = parse_limits(os.environ.get("REPORT_ENDPOINT_LIMITS")) if limits is None else limits
+        self._limits = {}
+        self._lock = threading.Lock()
+        self._threads = concurrent.futures.ThreadPoolExecutor(threads, thread_name_prefix="report")
+        self._process_pool = None
+
+    def limit(self, endpoint):
+        """ Get an endpoint's cap.
+            :param endpoint (str)       - Report endpoint.
+            :returns (EndpointLimit)    - The cap.
+        """
+        with self._lock:
+            if endpoint not in self._limits:
+                self._limits[endpoint] = EndpointLimit(self._configured_limits.get(endpoint, self.default_limit))
+            return self._limits[endpoint]
+
+    def _executor(self, cpu_bound):
+        if not (cpu_bound and self.processes):
+            return self._threads
+        with self._lock:
+            if self._process_pool is None:
+                # Spawned, forking a process with the server's threads and sockets isn't safe
+                self._process_pool = concurrent.futures.ProcessPoolExecutor(
+                    self.processes, mp_context=multiprocessing.get_context("spawn"), initializer=self.initializer)
+            return self._process_pool
+
+    def submit(self, func, *args, cpu_bound=False, **kwargs):
+        """ Run a function in the pool, outside of any endpoint's cap. CPU bound functions and their arguments must be
+            picklable, e.g. a module level main(), and their log records stay in the worker process.
+            :param func (func)          - The function.
+            :param cpu_bound (bool)     - Run it in the process pool.
+            :returns (concurrent.futures.Future) - Its result.
+        """
+        return self._executor(cpu_bound).submit(functools.partial(func, *args, **kwargs))
+
+    def _submit_in_slot(self, limit, func, args, cpu_bound, kwargs):
+        try:
+            future = self.submit(func, *args, cpu_bound=cpu_bound, **kwargs)
+        except Exception:
+            limit.release()
+            raise
+        # Released when the run ends, even if the caller stopped waiting for it
+        future.add_done_callback(lambda _: limit.release())
+        return future
+
+    async def run(self, endpoint, func, *args, cpu_bound=False, **kwargs):
+        """ Run a report within its endpoint's cap and wait for it without blocking the event loop.
+            :param endpoint (str)   - Report endpoint.
+            :param func (func)      - The report function.
+            :param cpu_bound (bool) - Run it in the process pool.
+            :returns                - The function's result.
+        """
+        limit = self.limit(endpoint)
+        await limit.acquire_async()
+        return await asyncio.wrap_future(self._submit_in_slot(limit, func, args, cpu_bound, kwargs))
+
+    def call(self, endpoint, func, *args, cpu_bound=False, **kwargs):
+        """ Run a report within its endpoint's cap, blocking the calling thread until it's done, e.g. from a job.
+            Unless it runs in the process pool, it runs in the calling thread, so what's tied to that thread (e.g. the
+            job's progress) follows it.
+            :param endpoint (str)   - Report endpoint.
+            :param func (func)      - The report function.
+            :param cpu_bound (bool) - Run it in the process pool.
+            :returns                - The function's result.
+        """
+        limit = self.limit(endpoint)
+        limit.acquire().result()
+        if not (cpu_bound and self.processes):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                limit.release()
+        return self._submit_in_slot(limit, func, args, cpu_bound, kwargs).result()
+
+    async def iterate(self, iterator, on_close=None):
+        """ Iterate a blocking iterator, e.g. the rows of a streamed export, in the thread pool.
+            :param iterator (iterator)  - The iterator.
+            :param on_close (func)      - Called once the iteration ends, fails or is abandoned.
+            :returns (async generator)  - Its items.
+        """
+        done = object()
+        try:
+            while True:
+                item = await asyncio.wrap_future(self._threads.submit(next, iterator, done))
+                if item is done:
+                    return
+                yield item
+        finally:
+            if on_close is not None:
+                on_close()
+
+    def shutdown(self, wait=True):
+        self._threads.shutdown(wait=wait)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=wait)
@@ -0,0 +1,137 @@
+import email.utils
+import random
+import threading
+import time
+
+# Statuses worth retrying: throttling and transient gateway/server failures.
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 30
+# Longest Retry-After honoured; anything longer fails the query rather than stalling the run.
+MAX_RETRY_AFTER = 120
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30
+
+
+class GraphQueryError(Exception):
+    def __init__(self, message, status_code=None):
+        """ Raised when a GraphQL request fails at the HTTP level, after retries.
+            :param message (str)        - Error message.
+            :param status_code (int)    - HTTP status of the last attempt, None for transport errors.
+        """
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(GraphQueryError):
+    pass
+
+
+def parse_retry_after(value):
+    """ Parse a Retry-After header.
+        :param value (str)  - Seconds or an HTTP date.
+        :returns (float)    - Seconds to wait, None if missing or unparsable.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    def __init__(self, max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+        """ Exponential backoff with full jitter.
+            :param max_retries (int)    - Retries after the first attempt; 0 disables retrying.
+            :param base_delay (float)   - Upper bound of the first delay in seconds, doubled on every retry.
+            :param max_delay (float)    - Upper bound of any delay in seconds.
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, retry_after=None):
+        """ Get the delay before a retry.
+            :param attempt (int)        - Zero-based number of the attempt that failed.
+            :param retry_after (float)  - Server's Retry-After in seconds, honoured over the backoff.
+            :returns (float)            - Seconds to wait.
+        """
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        """ Fail fast while an environment's API is down.
+            Opens after failure_threshold consecutive failures; after reset_timeout seconds one trial request is let
+            through, closing the circuit if it succeeds and opening it again if it fails.
+            :param failure_threshold (int)  - Consecutive failures that open the circuit.
+            :param reset_timeout (float)    - Seconds the circuit stays open before a trial request.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_count = 0
+        self.rejected_count = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """ Check the circuit before sending a request; raises CircuitOpenError while it's open. """
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            self.rejected_count += 1
+            raise CircuitOpenError(f"Circuit open after {self.failures} consecutive failures, "
+                                   f"retrying in {self._remaining():.0f}s")
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_neutral(self):
+        """ Record an answer that says nothing about the API's health, e.g. throttling or a client error: the failures
+            so far still count, and a trial request in flight lets the next one through.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self.opened_count += 1
+
+    def _remaining(self):
+        return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)) if self._opened_at else 0.0
+
+    def stats(self):
+        """ Get the breaker state.
+            :returns (dict) - State, consecutive failures, times opened and requests rejected while open.
+        """
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "opened": self.opened_count,
+                    "rejected": self.rejected_count}
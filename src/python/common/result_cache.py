@@ -0,0 +1,212 @@
+import collections
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+DEFAULT_RESULT_CACHE_DIR = os.environ.get("REPORT_CACHE_DIR",
+                                          os.path.join(tempfile.gettempdir(), "stream_report_cache"))
+# Bytes of reports kept, the least recently used are removed beyond it
+DEFAULT_RESULT_CACHE_BYTES = int(os.environ.get("REPORT_CACHE_MAX_BYTES", 1024 ** 3))
+# Payload fields left out of the key: who asks doesn't change the report, and the flag only bypasses the cache
+UNKEYED_FIELDS = ("environment_user_name", "environment_password", "environment_f2a_token", "token",
+                  "force_refresh")
+
+
+def result_key(endpoint, payload):
+    """ Key of a report's result: the endpoint and its payload, workspace included, credentials excluded.
+        :param endpoint (str)   - Report endpoint.
+        :param payload (dict)   - Request payload.
+        :returns (str)          - SHA-256 hex digest.
+    """
+    keyed = {name: value for name, value in payload.items() if name not in UNKEYED_FIELDS}
+    canonical = json.dumps([endpoint, keyed], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class PendingResult:
+    def __init__(self, cache, key, file_name):
+        """ A result being written, e.g. while it's streamed to the client; nothing is cached unless committed.
+            :param cache (ResultCache)  - The cache.
+            :param key (str)            - Its key, see result_key.
+            :param file_name (str)      - Its file name.
+        """
+        self.cache = cache
+        self.key = key
+        self.directory = cache._new_temp_dir()
+        self.file = open(os.path.join(self.directory, file_name), "wb")
+
+    def write(self, data):
+        self.file.write(data)
+
+    def commit(self):
+        """ Add the result to the cache.
+            :returns (str) - Its path, None if it's larger than the whole cache.
+        """
+        self.file.close()
+        return self.cache._commit(self.directory, self.key)
+
+    def discard(self):
+        self.file.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class ResultReader(io.FileIO):
+    def __init__(self, cache, path):
+        """ A result's file opened for reading. It stays readable until closed, even if it's replaced meanwhile, and
+            the cache doesn't evict it while it's open.
+            :param cache (ResultCache)  - The cache.
+            :param path (str)           - Its file.
+        """
+        super().__init__(path, "r")
+        self.cache = cache
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            self.cache._release(self.name)
+
+
+class ResultCache:
+    def __init__(self, directory=DEFAULT_RESULT_CACHE_DIR, max_bytes=DEFAULT_RESULT_CACHE_BYTES):
+        """ Report files on local disk by key, so identical requests are answered without running the report again.
+            One directory per key holds the file; its modification time is when the report ran and its access time
+            when it was last served, for the least recently used eviction. Only the readers of this process are kept in
+            memory, so processes sharing the directory share the results.
+            :param directory (str)  - Where the results are kept.
+            :param max_bytes (int)  - Bytes of results kept.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._readers = collections.Counter()
+        self._lock = threading.Lock()
+
+    def _new_temp_dir(self):
+        path = os.path.join(self.directory, f".pending-{uuid.uuid4().hex}")
+        os.makedirs(path)
+        return path
+
+    @staticmethod
+    def _file_in(directory):
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return None
+        return os.path.join(directory, names[0]) if names else None
+
+    def get(self, key, max_age):
+        """ Get a result.
+            :param key (str)        - Its key, see result_key.
+            :param max_age (int)    - Seconds a result stays fresh.
+            :returns (str)          - Path of its file, None if missing or older than max_age.
+        """
+        path = self._file_in(os.path.join(self.directory, key))
+        if path is None:
+            return None
+        try:
+            created = os.stat(path).st_mtime
+            if time.time() - created > max_age:
+                self._remove(path)
+                return None
+            os.utime(path, (time.time(), created))
+        except OSError:
+            return None
+        return path
+
+    def read(self, key, max_age):
+        """ Open a result for reading, so it can't be removed before it's read; close it once done.
+            :param key (str)        - Its key, see result_key.
+            :param max_age (int)    - Seconds a result stays fresh.
+            :returns (ResultReader) - The open result, None if missing or older than max_age.
+        """
+        path = self.get(key, max_age)
+        if path is None:
+            return None
+        with self._lock:
+            self._readers[path] += 1
+        try:
+            return ResultReader(self, path)
+        except OSError:
+            # Removed by another process in the meantime
+            self._release(path)
+            return None
+
+    def _release(self, path):
+        with self._lock:
+            self._readers[path] -= 1
+            if not self._readers[path]:
+                del self._readers[path]
+
+    def _remove(self, path):
+        # Results being read are left for later
+        with self._lock:
+            if self._readers[path]:
+                return False
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+        return True
+
+    def open(self, key, file_name):
+        """ Start writing a result.
+            :param key (str)        - Its key, see result_key.
+            :param file_name (str)  - Its file name.
+            :returns (PendingResult)
+        """
+        return PendingResult(self, key, file_name)
+
+    def put(self, key, path):
+        """ Move a report's file into the cache.
+            :param key (str)    - Its key, see result_key.
+            :param path (str)   - The file.
+            :returns (str)      - Its path in the cache, None if it's larger than the whole cache, then it's left as is.
+        """
+        if os.path.getsize(path) > self.max_bytes:
+            return None
+        directory = self._new_temp_dir()
+        shutil.move(path, os.path.join(directory, os.path.basename(path)))
+        return self._commit(directory, key)
+
+    def _commit(self, directory, key):
+        now = time.time()
+        os.utime(self._file_in(directory), (now, now))
+        target = os.path.join(self.directory, key)
+        shutil.rmtree(target, ignore_errors=True)
+        try:
+            os.rename(directory, target)
+        except OSError:
+            # The same result committed at the same time by another request, keep theirs
+            shutil.rmtree(directory, ignore_errors=True)
+        self.evict()
+        return self._file_in(target)
+
+    def entries(self):
+        """ The results kept.
+            :returns (list) - (path, size, last used) tuples, least recently used first.
+        """
+        entries = []
+        try:
+            keys = [entry.path for entry in os.scandir(self.directory) if not entry.name.startswith(".")]
+        except OSError:
+            return entries
+        for key_dir in keys:
+            path = self._file_in(key_dir)
+            try:
+                stat = os.stat(path)
+            except (OSError, TypeError):
+                continue
+            entries.append((path, stat.st_size, stat.st_atime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self):
+        """ Remove the least recently used results until the rest fit in max_bytes. """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if self._remove(path):
+                total -= size
@@ -236,5 +236,6 @@ class XlsxFile(object):
         sheet[f"A{row_number}"] = "Generated by Stream Security"
         sheet.row_dimensions[row_number].height = 30
 
-    def save_xlsx(self):
-        self.workbook.save(self.filename)
+    def save_xlsx(self, output=None):
+        # output - path or binary file object to save to; Defaults to the file name in the working directory
+        self.workbook.save(self.filename if output is None else output)
@@ -1,6 +1,5 @@
 import argparse
-import concurrent.futures
-import csv
+import itertools
 import os
 import re
 import sys
@@ -15,6 +14,10 @@ except ModuleNotFoundError:
     from src.python.common.common import *
 
 
+# Detections enriched at a time while streaming; each chunk is looked up in several concurrent batches
+ENRICHMENT_CHUNK_SIZE = 1000
+
+
 def _parse_timestamp(ts):
     if ts is None:
         return datetime.min.replace(tzinfo=timezone.utc)
@@ -40,12 +43,25 @@ def _parse_timestamp(ts):
     return datetime.min.replace(tzinfo=timezone.utc)
 
 
-def enrich_detections(graph_client, detection):
-    detection_enrichment = graph_client.get_detection_enrichment(detection['_id'])[0]
+def enrich_detections(detection, detection_enrichment):
     detection["enrichment"] = {k: v for k, v in detection_enrichment.items() if k not in detection}
 
 
-def main(environment, ll_username, ll_password, ll_f2a, ws_name, start_time, end_time, token=None, stage=None):
+def main(environment, ll_username, ll_password, ll_f2a, ws_name, start_time, end_time, token=None, stage=None,
+         output=None):
+    export = export_rows(environment, ll_username, ll_password, ll_f2a, ws_name, start_time, end_time, token, stage)
+    log.info(f'Generating CSV file, file name: "{export.file_name}"')
+    # A partially-written file is cleaned up so it doesn't linger on disk
+    csv_file = write_csv(export, output)
+    log.info("File generated successfully, export complete!")
+
+    return csv_file
+
+
+def export_rows(environment, ll_username, ll_password, ll_f2a, ws_name, start_time, end_time, token=None, stage=None):
+    """ Get the detections in the time range and enrich them.
+        :returns (CsvExport) - The export.
+    """
     # Parse and validate dates once (ValueError surfaces as 400 in main.py)
     try:
         start_dt = datetime.strptime(start_time, "%Y-%m-%d").replace(tzinfo=timezone.utc)
@@ -75,17 +91,12 @@ def main(environment, ll_username, ll_password, ll_f2a, ws_name, start_time, end
         # LookupError is mapped to HTTP 404 in main.py — request was valid, nothing matched.
         raise LookupError(f"No detections found in the range {start_time} to {end_time}")
 
-    # Enrich detections — surface individual failures in the log rather than silently discarding
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = [executor.submit(enrich_detections, graph_client, detection)
-                   for detection in filtered_detections]
-        for future in concurrent.futures.as_completed(futures):
-            exc = future.exception()
-            if exc is not None:
-                log.warning(f"Detection enrichment failed: {exc}")
+    # Enrich detections chunk by chunk as the rows are consumed; the first one (for the column names) right away
+    detections = enriched_detections(graph_client, filtered_detections)
+    first_detection = next(detections)
 
     # Get column names
-    column_names = list(filtered_detections[0].keys())
+    column_names = list(first_detection.keys())
 
     # Sanitize the user-supplied environment slug before using it in a filesystem
     # path (defense-in-depth against path traversal — login would normally fail
@@ -93,23 +104,18 @@ def main(environment, ll_username, ll_password, ll_f2a, ws_name, start_time, end
     safe_env = re.sub(r'[^A-Za-z0-9._-]', '_', environment).upper() or 'EXPORT'
     csv_file = f'{safe_env} enriched detections export {start_time} {end_time}.csv'
 
-    log.info(f'Generating CSV file, file name: "{csv_file}"')
-    try:
-        with open(csv_file, mode='w', newline='') as file:
-            writer = csv.DictWriter(file, fieldnames=column_names, extrasaction='ignore')
-            writer.writeheader()
-            writer.writerows(filtered_detections)
-    except Exception:
-        # Clean up partially-written file so it doesn't linger on disk
-        if os.path.exists(csv_file):
-            try:
-                os.unlink(csv_file)
-            except OSError:
-                pass
-        raise
-    log.info("File generated successfully, export complete!")
+    return CsvExport(csv_file, column_names, itertools.chain([first_detection], detections))
 
-    return csv_file
+
+def enriched_detections(graph_client, detections):
+    for start in range(0, len(detections), ENRICHMENT_CHUNK_SIZE):
+        chunk = detections[start:start + ENRICHMENT_CHUNK_SIZE]
+        # Enrich detections in batches — batch_lookup logs individual failures rather than silently discarding them
+        enrichments = batch_lookup(graph_client.get_detections_enrichment, [d['_id'] for d in chunk])
+        for detection in chunk:
+            if detection['_id'] in enrichments:
+                enrich_detections(detection, enrichments[detection['_id']])
+            yield detection
 
 
 if __name__ == "__main__":
@@ -1,7 +1,5 @@
 #!/usr/bin/python
 import argparse
-import concurrent.futures
-import csv
 import os
 import sys
 from termcolor import colored as color
@@ -18,52 +16,47 @@ except ModuleNotFoundError:
 AMIS = dict()
 
 
-def main(environment, ll_username, ll_password, ll_f2a, ws_name, stage=None):
+def main(environment, ll_username, ll_password, ll_f2a, ws_name, stage=None, output=None):
+    export = export_rows(environment, ll_username, ll_password, ll_f2a, ws_name, stage)
+    print(color(f'Generating CSV file, file name: "{export.file_name}"'), "blue")
+    csv_file = write_csv(export, output)
+    print(color("File generated successfully, export complete!", "green"))
+
+    return csv_file
+
+
+def export_rows(environment, ll_username, ll_password, ll_f2a, ws_name, stage=None):
+    """ Get the EC2 instances and enrich them with the OS of their AMI.
+        :returns (CsvExport) - The export.
+    """
     print(color("Trying to login into Stream Security", "blue"))
-    graph_client = get_graph_client(environment, ll_username, ll_password, ll_f2a, ws_name, stage)
+    # Configurations are kept on disk between runs and re-downloaded only when the resource changed
+    graph_client = get_graph_client(environment, ll_username, ll_password, ll_f2a, ws_name, stage,
+                                    disk_cache=ResourceStore())
     print(color("Logged in successfully!", "green"))
 
     print(color("Getting all EC2 instances", "blue"))
-    ec2_instances = [{"id": i["id"]} for i in graph_client.get_resources_by_type("instance")]
+    ec2_instances = graph_client.get_resources_by_type("instance", fields=("id",))
     print(color(f"Found {len(ec2_instances)} EC2 instances", "green"))
 
     print(color("Enriching each EC2 with AMI information", "blue"))
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = [executor.submit(enrich_instances_info, graph_client, instance) for instance in ec2_instances]
-        print(color(f"Number of threads created: {len(futures)}", "blue"))
-        completed_count = 0
-        for _ in concurrent.futures.as_completed(futures):
-            completed_count += 1
-            if completed_count % 50 == 0:
-                completed_percentage = int(completed_count / len(futures) * 100)
-                print(f"{completed_count} threads completed out of {len(futures)} ({completed_percentage}%)")
-        print(color("All threads completed"), "green")
+    # Configurations are fetched in batches, one request per batch_size instances instead of one per instance
+    instances_details = batch_lookup(graph_client.get_resources_configuration_by_id, [i['id'] for i in ec2_instances])
+    ami_ids = {d.get("ImageId") for d in instances_details.values()} - AMIS.keys() - {None}
+    AMIS.update(batch_lookup(graph_client.get_resources_configuration_by_id, list(ami_ids)))
+    for instance in ec2_instances:
+        enrich_instances_info(instance, instances_details.get(instance['id'], {}))
     print(color("Enrichment finished successfully!", "green"))
 
     # Get columns names
     column_names = list(ec2_instances[0].keys())
 
-    # Set CSV file name
-    csv_file = f'{environment.upper()} EC2 OS info.csv'
-
-    print(color(f'Generating CSV file, file name: "{csv_file}"'), "blue")
-    with open(csv_file, mode='w', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=column_names, extrasaction='ignore')
-        writer.writeheader()
-        writer.writerows(ec2_instances)
-    print(color("File generated successfully, export complete!", "green"))
-
-    return csv_file
+    return CsvExport(f'{environment.upper()} EC2 OS info.csv', column_names, ec2_instances)
 
 
-def enrich_instances_info(graph_client, instance):
-    resource_details = graph_client.get_resource_configuration_by_id(instance['id'])
+def enrich_instances_info(instance, resource_details):
     instance['ami_id'] = resource_details.get("ImageId")
-    if instance['ami_id'] in AMIS:
-        ami_metadata = AMIS[instance['ami_id']]
-    else:
-        ami_metadata = graph_client.get_resource_configuration_by_id(instance['ami_id'])
-        AMIS[instance['ami_id']] = ami_metadata
+    ami_metadata = AMIS.get(instance['ami_id']) or {}
     instance['ami_platform'] = ami_metadata.get("PlatformDetails", "N/A")
     instance['ami_name'] = ami_metadata.get("Name", "N/A")
     instance['ami_description'] = ami_metadata.get("Description", "N/A")
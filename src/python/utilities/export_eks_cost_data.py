@@ -1,7 +1,6 @@
 #!/usr/bin/python
 import argparse
 import concurrent.futures
-import csv
 import os
 import sys
 
@@ -15,11 +14,20 @@ except ModuleNotFoundError:
     from src.python.common.common import *
 
 
-def main(environment, ll_username, ll_password, ll_f2a, ws_name, start_timestamp, end_timestamp, stage=None):
+def main(environment, ll_username, ll_password, ll_f2a, ws_name, start_timestamp, end_timestamp, stage=None,
+         output=None):
+    return write_csv(export_rows(environment, ll_username, ll_password, ll_f2a, ws_name, start_timestamp,
+                                 end_timestamp, stage), output)
+
+
+def export_rows(environment, ll_username, ll_password, ll_f2a, ws_name, start_timestamp, end_timestamp, stage=None):
+    """ Get the cost of every EKS cluster; one row per cluster.
+        :returns (CsvExport) - The export.
+    """
     # Connecting to Stream
     graph_client = get_graph_client(environment, ll_username, ll_password, ll_f2a, ws_name, stage)
 
-    eks_clusters = graph_client.get_resources_by_type("eks")
+    eks_clusters = graph_client.get_resources_by_type("eks", fields=("id",))
     eks_cost_dict = dict()
 
     with concurrent.futures.ThreadPoolExecutor() as executor:
@@ -29,19 +37,8 @@ def main(environment, ll_username, ll_password, ll_f2a, ws_name, start_timestamp
     # Define the headers based on the keys of the inner dictionary
     headers = ['cluster name'] + list(next(iter(eks_cost_dict.values())).keys())
 
-    # Set CSV file name
-    csv_file = f'{environment.upper()} kubernetes cost export.csv'
-
-    # Write to CSV
-    with open(csv_file, 'w', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=headers)
-        writer.writeheader()
-        for cluster, data in eks_cost_dict.items():
-            row = {'cluster name': cluster}
-            row.update(data)
-            writer.writerow(row)
-
-    return csv_file
+    rows = (dict(data, **{'cluster name': cluster}) for cluster, data in eks_cost_dict.items())
+    return CsvExport(f'{environment.upper()} kubernetes cost export.csv', headers, rows)
 
 
 def get_clusters_cost(graph_client, eks_cost_dict, eks_cluster, start_timestamp, end_timestamp):
@@ -1,6 +1,6 @@
 #!/usr/bin/python
 import argparse
-import csv
+import itertools
 import os
 import sys
 
@@ -15,7 +15,21 @@ except ModuleNotFoundError:
 
 
 def main(environment, ll_username, ll_password, ll_f2a, ws_name, action=None, dst_resource_id=None, start_time=None,
-         end_time=None, src_public=None, protocols=None, stage=None):
+         end_time=None, src_public=None, protocols=None, stage=None, output=None):
+    export = export_rows(environment, ll_username, ll_password, ll_f2a, ws_name, action, dst_resource_id, start_time,
+                         end_time, src_public, protocols, stage)
+    log.info(f'Generating CSV file, file name: "{export.file_name}"')
+    csv_file = write_csv(export, output)
+    log.info("File generated successfully, export complete!")
+
+    return csv_file
+
+
+def export_rows(environment, ll_username, ll_password, ll_f2a, ws_name, action=None, dst_resource_id=None,
+                start_time=None, end_time=None, src_public=None, protocols=None, stage=None):
+    """ Get the first flow log (for the columns); the rest are fetched page by page as the rows are consumed.
+        :returns (CsvExport) - The export.
+    """
     # Connecting to Stream
     graph_client = get_graph_client(environment, ll_username, ll_password, ll_f2a, ws_name, stage)
 
@@ -25,30 +39,22 @@ def main(environment, ll_username, ll_password, ll_f2a, ws_name, action=None, ds
     if end_time:
         end_time += "T23:59:59.999Z"
 
-    # Get flow logs
-    flow_logs = graph_client.get_flow_logs(
+    # Get flow logs, streamed page by page
+    flow_logs = graph_client.iter_flow_logs(
         action=action, dst_resource_id=dst_resource_id, start_time=start_time,
         end_time=end_time, src_public=src_public, protocols=protocols
     )
 
     # Check if there are results
-    if len(flow_logs) == 0:
+    first_flow_log = next(flow_logs, None)
+    if first_flow_log is None:
         raise Exception("Couldn't find flow logs for the requested filters")
 
     # Get columns names
-    column_names = list(flow_logs[0].keys())[0:-1]
+    column_names = list(first_flow_log.keys())[0:-1]
 
-    # Set CSV file name
-    csv_file = f'{environment.upper()} flow logs export.csv'
-
-    log.info(f'Generating CSV file, file name: "{csv_file}"')
-    with open(csv_file, mode='w', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=column_names, extrasaction='ignore')
-        writer.writeheader()
-        writer.writerows(flow_logs)
-    log.info("File generated successfully, export complete!")
-
-    return csv_file
+    return CsvExport(f'{environment.upper()} flow logs export.csv', column_names,
+                     itertools.chain([first_flow_log], flow_logs))
 
 
 if __name__ == "__main__":
@@ -1,6 +1,5 @@
 import argparse
 import concurrent.futures
-import csv
 import os
 import sys
 
@@ -13,7 +12,21 @@ except ModuleNotFoundError:
     from src.python.common.common import *
 
 
-def main(environment, ll_username, ll_password, ll_f2a, ws_name, resource_type, accounts=None, tags=None, stage=None):
+def main(environment, ll_username, ll_password, ll_f2a, ws_name, resource_type, accounts=None, tags=None, stage=None,
+         output=None):
+    export = export_rows(environment, ll_username, ll_password, ll_f2a, ws_name, resource_type, accounts, tags, stage)
+    log.info(f"Generating CSV file, file name: {export.file_name}")
+    csv_file = write_csv(export, output)
+    log.info("File generated successfully, export complete!")
+
+    return csv_file
+
+
+def export_rows(environment, ll_username, ll_password, ll_f2a, ws_name, resource_type, accounts=None, tags=None,
+                stage=None):
+    """ Log in and get the accounts, then search the resources account by account as the rows are consumed.
+        :returns (CsvExport) - The export.
+    """
     # Setting up variables
     if accounts:
         accounts = accounts.replace(" ", "").split(",")
@@ -31,48 +44,36 @@ def main(environment, ll_username, ll_password, ll_f2a, ws_name, resource_type,
         all_accounts = [a for a in all_accounts if a in accounts]
         log.info(f"{len(all_accounts)} accounts remained")
 
-    report_details = {
-        "environment_name": environment.upper(),
-        "environment_workspace": ws_name,
-        "ws_id": graph_client.customer_id,
-        "ll_url": graph_client.url,
-        "accounts": {}
-    }
-
     parsed_tags = []
     if tags:
         tags = tags.split(",")
         for tag in tags:
             parsed_tags.append(process_tag(tag))
 
-    log.info("Searching resources in each account")
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future_account_mapping = {}
-        futures = []
-        for account in all_accounts:
-            future = executor.submit(graph_client.resources_search, account, resource_type, parsed_tags)
-            future_account_mapping[future] = account
-            futures.append(future)
-        for future in futures:
-            account = future_account_mapping[future]
-            report_details["accounts"][account] = future.result()
-    log.info("Finished adding resources!")
-    log.info(f'Found {sum([len(r) for r in report_details["accounts"].values()])} resources of type "{resource_type}"')
-
-    csv_file = f'Stream inventory export - {environment}.csv'
-
-    log.info(f"Generating CSV file, file name: {csv_file}")
-    with open(csv_file, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(['Account', 'Account name', 'Resource ID', 'Resource Name', 'Resource Tags'])
-        for account, resources in report_details['accounts'].items():
-            for resource in resources:
-                account_name = [a['display_name'] for a in all_accounts_raw if a['cloud_account_id'] == account][0]
-                row = [account, account_name, resource['id'], resource['display_name'], resource['cloud_tags']]
-                writer.writerow(row)
-    log.info("File generated successfully, export complete!")
+    account_names = {a['cloud_account_id']: a['display_name'] for a in all_accounts_raw}
+    header = ['Account', 'Account name', 'Resource ID', 'Resource Name', 'Resource Tags']
+    rows = resource_rows(graph_client, all_accounts, account_names, resource_type, parsed_tags)
+    return CsvExport(f'Stream inventory export - {environment}.csv', header, rows)
 
-    return csv_file
+
+def resource_rows(graph_client, all_accounts, account_names, resource_type, parsed_tags):
+    log.info("Searching resources in each account")
+    executor = concurrent.futures.ThreadPoolExecutor()
+    try:
+        futures = [executor.submit(graph_client.resources_search, account, resource_type, parsed_tags,
+                                   ("id", "display_name", {"cloud_tags": ("Key", "Value", "__typename")}))
+                   for account in all_accounts]
+        resources_count = 0
+        # Accounts in order, each as soon as its search is done
+        for account, future in zip(all_accounts, futures):
+            for resource in future.result():
+                resources_count += 1
+                yield [account, account_names[account], resource['id'], resource['display_name'],
+                       resource['cloud_tags']]
+        log.info(f'Found {resources_count} resources of type "{resource_type}"')
+    finally:
+        # Stop searching if the consumer stopped reading
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 def process_tag(tag):
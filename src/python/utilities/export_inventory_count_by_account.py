@@ -1,5 +1,4 @@
 import argparse
-import csv
 import os
 import sys
 
@@ -12,7 +11,17 @@ except ModuleNotFoundError:
     from src.python.common.common import *
 
 
-def main(environment, ll_username, ll_password, ll_f2a, ws_name, accounts=None, stage=None):
+def main(environment, ll_username, ll_password, ll_f2a, ws_name, accounts=None, stage=None, output=None):
+    csv_file = write_csv(export_rows(environment, ll_username, ll_password, ll_f2a, ws_name, accounts, stage), output)
+    log.info("File generated successfully, export complete!")
+
+    return csv_file
+
+
+def export_rows(environment, ll_username, ll_password, ll_f2a, ws_name, accounts=None, stage=None):
+    """ Count the resources of each type in each account; one row per resource type, one column per account.
+        :returns (CsvExport) - The export.
+    """
     # Setting up variables
     if accounts:
         accounts = accounts.replace(" ", "").split(",")
@@ -56,17 +65,9 @@ def main(environment, ll_username, ll_password, ll_f2a, ws_name, accounts=None,
     # Convert accounts to a sorted list to ensure consistent column order
     accounts = sorted(accounts)
 
-    # Write to CSV
-    with open(csv_file, mode='w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(['Resource'] + [f'="{a}"' for a in accounts])
-        for resource, counts in resources.items():
-            row = [resource] + [counts.get(account, 0) for account in accounts]
-            writer.writerow(row)
-
-    log.info("File generated successfully, export complete!")
-
-    return csv_file
+    header = ['Resource'] + [f'="{a}"' for a in accounts]
+    rows = ([resource] + [counts.get(account, 0) for account in accounts] for resource, counts in resources.items())
+    return CsvExport(csv_file, header, rows)
 
 
 if __name__ == "__main__":
@@ -1,7 +1,6 @@
 #!/usr/bin/python
 import argparse
-import concurrent.futures
-import csv
+import itertools
 import os
 import sys
 from datetime import datetime, timedelta, timezone
@@ -16,34 +15,30 @@ except ModuleNotFoundError:
     from src.python.common.common import *
 
 
-def main(environment, ll_username, ll_password, ll_f2a, ws_name, stage=None):
+def main(environment, ll_username, ll_password, ll_f2a, ws_name, stage=None, output=None):
     # Connecting to Stream
     graph_client = get_graph_client(environment, ll_username, ll_password, ll_f2a, ws_name, stage)
 
     # Get "Internet facing Load Balancer (NLB)" rule ID
-    rules = graph_client.get_all_rules()
+    rules = graph_client.get_all_rules(fields=("id", "name"))
     rule_id = [r['id'] for r in rules if r['name'] == "Ensure access keys unused for 90 days are deleted"][0]
 
     # Get rule violations
-    unused_access_keys = graph_client.export_csv_rule(rule_id)
-    violations = unused_access_keys['violations']
-    log.info(f"Found {len(violations)} violations")
+    violations = graph_client.iter_csv_rule(rule_id)
 
-    # Enrich rule violations
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        [executor.submit(enrich_violations, graph_client, violation) for violation in violations]
+    # Enrich rule violations as they're read and written
+    violations = enrich_rows(violations, enrich_violations, graph_client)
 
     # Get columns names
-    column_names = list(violations[0].keys())
+    first = next(violations, None)
+    column_names = list(first.keys()) if first else []
+    violations = itertools.chain([first], violations) if first else []
 
     # Set CSV file name
     csv_file = f'{environment.upper()} enriched violations export.csv'
 
     log.info(f'Generating CSV file, file name: "{csv_file}"')
-    with open(csv_file, mode='w', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=column_names, extrasaction='ignore')
-        writer.writeheader()
-        writer.writerows(violations)
+    csv_file = write_csv(CsvExport(csv_file, column_names, violations), output)
     log.info("File generated successfully, export complete!")
 
     return csv_file
@@ -21,7 +21,7 @@ def main(environment, ll_username, ll_password, ll_f2a, ws_name, stage=None):
     graph_client = get_graph_client(environment, ll_username, ll_password, ll_f2a, ws_name, stage)
 
     log.info("Getting all ENIs")
-    enis = graph_client.get_resources_by_type("network_interface")
+    enis = graph_client.get_resources_by_type("network_interface", fields=("id", "addresses"))
     log.info(f"Found {len(enis)} ENIs")
 
     # Create IP Addresses list
@@ -32,7 +32,7 @@ def main(environment, ll_username, ll_password, ll_f2a, ws_name, stage=None):
         ip_addresses.extend(ip_list)
 
     log.info("Getting all Elastic IPs")
-    ip_addresses.extend([eip['id'] for eip in graph_client.get_resources_by_type("elastic_ip")])
+    ip_addresses.extend(graph_client.get_resources_by_type("elastic_ip", get_only_ids=True))
 
     log.info("Filtering Internal IPs")
     external_ip_addresses = [ip for ip in list(set(ip_addresses)) if is_external_ip(ip)]
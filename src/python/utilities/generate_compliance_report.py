@@ -18,13 +18,15 @@ except ModuleNotFoundError:
     from src.python.common.xlsx_tools import XlsxFile
 
 
-def main(environment, ll_username, ll_password, ll_f2a, ws_name, compliance, accounts=None, label=None, stage=None):
+def main(environment, ll_username, ll_password, ll_f2a, ws_name, compliance, accounts=None, label=None, stage=None,
+         output=None):
     # Setting up variables
     if accounts:
         accounts = accounts.replace(" ", "").split(",")
 
-    # Connecting to Stream
-    graph_client = get_graph_client(environment, ll_username, ll_password, ll_f2a, ws_name, stage)
+    # Connecting to Stream; rules share resource type counts per account, so responses are cached for the run
+    graph_client = get_graph_client(environment, ll_username, ll_password, ll_f2a, ws_name, stage,
+                                    cache=ResponseCache())
 
     log.info(f"Verifying that '{compliance}' compliance standard exist")
     compliance_list = graph_client.get_compliance_standards()
@@ -35,7 +37,8 @@ def main(environment, ll_username, ll_password, ll_f2a, ws_name, compliance, acc
     log.info("Compliance standard OK!")
 
     log.info(f"Getting all compliance rules")
-    compliance_rules = graph_client.get_rules_by_compliance(compliance)
+    compliance_rules = graph_client.get_rules_by_compliance(
+        compliance, fields=("id", "name", "severity", "labels", "compliance"))
     compliance_rules_count = len(compliance_rules)
     log.info(f"Found {compliance_rules_count} compliance rules!")
 
@@ -86,6 +89,7 @@ def main(environment, ll_username, ll_password, ll_f2a, ws_name, compliance, acc
     log.info("Enriching rules with accounts information")
     enrich_accounts(report_details, ws_accounts, graph_client)
     log.info("Enriching finished successfully")
+    log.info(f"Response cache: {graph_client.cache.stats()}")
 
     log.info("Generating XLSX file")
     xlsx_file_name = f"{environment.upper()} {compliance}{f' {label}' if label else ''} Compliance report.xlsx"
@@ -94,9 +98,13 @@ def main(environment, ll_username, ll_password, ll_f2a, ws_name, compliance, acc
     for i, violated_rule in enumerate(report_details["violated_rules"]):
         rule_number = i + 1
         xlsx.create_new_rule_sheet(report_details, violated_rule, rule_number, ws_accounts)
-    xlsx.save_xlsx()
+    if is_stream(output):
+        xlsx.save_xlsx(output)
+        return output
+    xlsx_path = output_path(output, xlsx_file_name)
+    xlsx.save_xlsx(xlsx_path)
 
-    return xlsx_file_name
+    return xlsx_path
 
 
 def process_rule(rule, graph_client, report_details):
@@ -1,6 +1,5 @@
 import argparse
 import concurrent.futures
-import csv
 import os
 import sys
 
@@ -13,25 +12,26 @@ except ModuleNotFoundError:
     from src.python.common.common import *
 
 
-def main(environment, ll_username, ll_password, ll_f2a, ws_name, stage=None):
+def main(environment, ll_username, ll_password, ll_f2a, ws_name, stage=None, output=None):
+    export = export_rows(environment, ll_username, ll_password, ll_f2a, ws_name, stage)
+    log.info(f'Generating CSV file, file name: "{export.file_name}"')
+    csv_file = write_csv(export, output)
+    log.info("File generated successfully, export complete!")
+
+    return csv_file
+
+
+def export_rows(environment, ll_username, ll_password, ll_f2a, ws_name, stage=None):
+    """ Get the cost rules; their violations are exported rule by rule as the rows are consumed.
+        :returns (CsvExport) - The export.
+    """
     # Connecting to Stream
     graph_client = get_graph_client(environment, ll_username, ll_password, ll_f2a, ws_name, stage)
 
     log.info("Getting all cost rules")
-    cost_rules = graph_client.get_cost_rules()
+    cost_rules = graph_client.get_cost_rules(fields=("id", "labels"))
     log.info(f"Found {len(cost_rules)} cost rules!")
 
-    log.info(f"Processing cost rules violations")
-    recommendations = {}
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = [executor.submit(get_recommendations, rule_id, graph_client, recommendations)
-                   for rule_id in cost_rules]
-        for future in futures:
-            future.result()
-    log.info(f"Finished processing cost rules violations successfully!")
-
-    csv_file = f'{environment.upper()} cost recommendations.csv'
-
     fieldnames = [
         'resource_id',
         'account',
@@ -40,24 +40,34 @@ def main(environment, ll_username, ll_password, ll_f2a, ws_name, stage=None):
         'cost_label',
         'predicted_monthly_cost_savings'
     ]
+    return CsvExport(f'{environment.upper()} cost recommendations.csv', fieldnames,
+                     recommendation_rows(graph_client, cost_rules))
+
 
-    log.info(f'Generating CSV file, file name: "{csv_file}"')
-    with open(csv_file, 'w', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for key, value in recommendations.items():
-            for violation in value['violations']:
-                writer.writerow({
+def recommendation_rows(graph_client, cost_rules):
+    log.info(f"Processing cost rules violations")
+    recommendations = {}
+    executor = concurrent.futures.ThreadPoolExecutor()
+    try:
+        futures = [executor.submit(get_recommendations, rule_id, graph_client, recommendations)
+                   for rule_id in cost_rules]
+        # Rules in order, each as soon as its violations are exported
+        for rule, future in zip(cost_rules, futures):
+            future.result()
+            value = recommendations.pop(rule['id'], None)
+            for violation in (value or {}).get('violations', []):
+                yield {
                     'resource_id': violation['resource_id'],
                     'account': violation['account_id'],
                     'region': violation['region'],
                     'name': value['name'],
                     'cost_label': value['cost_label'],
                     'predicted_monthly_cost_savings': violation.get('monthly_cost', 0) or 0
-                })
-    log.info("File generated successfully, export complete!")
-
-    return csv_file
+                }
+    finally:
+        # Stop exporting if the consumer stopped reading
+        executor.shutdown(wait=False, cancel_futures=True)
+    log.info(f"Finished processing cost rules violations successfully!")
 
 
 def get_recommendations(rule, graph_client, recommendations):
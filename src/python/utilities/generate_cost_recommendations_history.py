@@ -1,5 +1,4 @@
 import argparse
-import csv
 import os
 import pandas as pd
 import sys
@@ -14,7 +13,7 @@ except ModuleNotFoundError:
     from src.python.common.common import *
 
 
-def main(environment, ll_username, ll_password, ll_f2a, ws_name, request_date, stage=None):
+def main(environment, ll_username, ll_password, ll_f2a, ws_name, request_date, stage=None, output=None):
     # Connecting to Stream
     graph_client = get_graph_client(environment, ll_username, ll_password, ll_f2a, ws_name, stage)
 
@@ -54,19 +53,16 @@ def main(environment, ll_username, ll_password, ll_f2a, ws_name, request_date, s
         'predicted_monthly_cost_savings'
     ]
 
+    rows = ({
+        'resource_id': violation['resource_id'],
+        'account': violation['account_id'],
+        'region': violation['region'],
+        'name': value['name'],
+        'predicted_monthly_cost_savings': violation.get('monthly_cost', 0) or 0
+    } for value in recommendations.values() for violation in value['violations'])
+
     log.info(f'Generating CSV file, file name: "{csv_file}"')
-    with open(csv_file, 'w', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for key, value in recommendations.items():
-            for violation in value['violations']:
-                writer.writerow({
-                    'resource_id': violation['resource_id'],
-                    'account': violation['account_id'],
-                    'region': violation['region'],
-                    'name': value['name'],
-                    'predicted_monthly_cost_savings': violation.get('monthly_cost', 0) or 0
-                })
+    csv_file = write_csv(CsvExport(csv_file, fieldnames, rows), output)
     log.info("File generated successfully, export complete!")
 
     return csv_file
@@ -1,5 +1,4 @@
 import argparse
-import csv
 import os
 import sys
 from datetime import datetime
@@ -15,7 +14,21 @@ except ModuleNotFoundError:
 
 
 def main(environment, ll_username, ll_password, ll_f2a, ws_name, start_timestamp, end_timestamp, period,
-         ignore_discounts=False, stage=None):
+         ignore_discounts=False, stage=None, output=None):
+    export = export_rows(environment, ll_username, ll_password, ll_f2a, ws_name, start_timestamp, end_timestamp, period,
+                         ignore_discounts, stage)
+    log.info(f'Generating CSV file, file name: "{export.file_name}"')
+    csv_file = write_csv(export, output)
+    log.info("File generated successfully, export complete!")
+
+    return csv_file
+
+
+def export_rows(environment, ll_username, ll_password, ll_f2a, ws_name, start_timestamp, end_timestamp, period,
+                ignore_discounts=False, stage=None):
+    """ Validate the dates and get the cost data.
+        :returns (CsvExport) - The export.
+    """
     for date_to_check in [start_timestamp, end_timestamp]:
         if not verify_date_format(date_to_check):
             raise ValueError(f"The date: {date_to_check} is not in the correct format: YYYY-MM-DD")
@@ -47,8 +60,6 @@ def main(environment, ll_username, ll_password, ll_f2a, ws_name, start_timestamp
         start_ts, end_ts, group_by=period, ignore_discounts="gross_cost" if ignore_discounts else "net_cost")
     log.info("Fetched cost information successfully!")
 
-    csv_file = f'{environment.upper()} cost report {start_timestamp} {end_timestamp}.csv'
-
     fieldnames = [
         period,
         'resource_type',
@@ -59,14 +70,8 @@ def main(environment, ll_username, ll_password, ll_f2a, ws_name, start_timestamp
         'total_cost'
     ]
 
-    log.info(f'Generating CSV file, file name: "{csv_file}"')
-    with open(csv_file, mode='w', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames, extrasaction='ignore')
-        writer.writeheader()
-        writer.writerows(cost_chart)
-    log.info("File generated successfully, export complete!")
-
-    return csv_file
+    csv_file = f'{environment.upper()} cost report {start_timestamp} {end_timestamp}.csv'
+    return CsvExport(csv_file, fieldnames, cost_chart)
 
 
 def verify_date_format(date_string):
@@ -1,6 +1,5 @@
 import argparse
 import concurrent.futures
-import csv
 import os
 import sys
 
@@ -24,7 +23,19 @@ except ModuleNotFoundError:
 
 
 def main(environment, ll_username, ll_password, ll_f2a, ws_name,
-         publicly_exposed=False, exploit_available=False, fix_available=False, cve_id=None, severity=None, stage=None):
+         publicly_exposed=False, exploit_available=False, fix_available=False, cve_id=None, severity=None, stage=None,
+         output=None):
+    export = export_rows(environment, ll_username, ll_password, ll_f2a, ws_name, publicly_exposed, exploit_available,
+                         fix_available, cve_id, severity, stage)
+    return write_csv(export, output)
+
+
+def export_rows(environment, ll_username, ll_password, ll_f2a, ws_name,
+                publicly_exposed=False, exploit_available=False, fix_available=False, cve_id=None, severity=None,
+                stage=None):
+    """ Get the CVEs; their affected resources are looked up as the rows are consumed.
+        :returns (CsvExport) - The export.
+    """
     # Connecting to Stream
     graph_client = get_graph_client(environment, ll_username, ll_password, ll_f2a, ws_name, stage)
 
@@ -34,31 +45,28 @@ def main(environment, ll_username, ll_password, ll_f2a, ws_name,
         cve_id=cve_id, severity=severity)
     log.info(f"Found {len(cve_list)} CVEs")
 
-    cve_data = [
-        [
-            "CVE ID", "Severity", "Score", "Packages Names", "Publicly Exposed", "Fix Available", "Has Exploit",
-            "Resource Name", "Resource Type", "Account ID", "Deployment (if pod)"
-        ]
+    header = [
+        "CVE ID", "Severity", "Score", "Packages Names", "Publicly Exposed", "Fix Available", "Has Exploit",
+        "Resource Name", "Resource Type", "Account ID", "Deployment (if pod)"
     ]
+    return CsvExport(f"{environment}_vulnerabilities.csv", header, cve_rows(graph_client, cve_list))
+
+
+def cve_rows(graph_client, cve_list):
     completed_threads = 0
-    filename = f"{environment}_vulnerabilities.csv"
-
-    with open(filename, mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerows(cve_data)
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            # Submit each cve for processing and store the Future objects
-            futures = [executor.submit(process_cve, graph_client, cve) for cve in cve_list]
-            # Retrieve results as they become available
-            for future in concurrent.futures.as_completed(futures):
-                cve_data = future.result()
-                if cve_data:
-                    writer.writerows(cve_data)
-                completed_threads += 1
-                if completed_threads % 50 == 0:
-                    log.info(f"{completed_threads} threads completed")
-
-    return filename
+    executor = concurrent.futures.ThreadPoolExecutor()
+    try:
+        # Submit each cve for processing and store the Future objects
+        futures = [executor.submit(process_cve, graph_client, cve) for cve in cve_list]
+        # Retrieve results as they become available
+        for future in concurrent.futures.as_completed(futures):
+            yield from future.result()
+            completed_threads += 1
+            if completed_threads % 50 == 0:
+                log.info(f"{completed_threads} threads completed")
+    finally:
+        # Stop looking up the remaining CVEs if the consumer stops early, e.g. a client disconnecting
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 def process_cve(graph_client, cve):
@@ -68,12 +76,25 @@ def process_cve(graph_client, cve):
         log.error(f"Something went wrong when getting resources from {cve['cve_id']} | Error: {e}")
         return []
     try:
+        prefetch_resources_info(graph_client, cve_resources)
         return [process_resource(graph_client, cve, r) for r in cve_resources]
     except Exception as e:
         log.error(f"Something went wrong when processing resources in {cve['cve_id']} | Error: {e}")
         return []
 
 
+def prefetch_resources_info(graph_client, cve_resources):
+    # Look up the resources (and the deployments of pods) in batches instead of one request per resource
+    new_ids = [r['resource_id'] for r in cve_resources if r['resource_id'] not in RESOURCE_METADATA]
+    RESOURCE_METADATA.update(batch_lookup(graph_client.get_resources_metadata, new_ids))
+    new_pods = [r['resource_id'] for r in cve_resources
+                if r['resource_type'] == "pod" and r['resource_id'] not in RESOURCE_ANCESTORS]
+    RESOURCE_ANCESTORS.update(batch_lookup(graph_client.get_resources_ancestors, new_pods))
+    deployments = [a['id'] for r in cve_resources for a in RESOURCE_ANCESTORS.get(r['resource_id']) or []
+                   if a['type'] == 'deployment' and a['id'] not in RESOURCE_METADATA]
+    RESOURCE_METADATA.update(batch_lookup(graph_client.get_resources_metadata, deployments))
+
+
 def process_resource(graph_client, cve, resource):
     resource_id = resource['resource_id']
     if resource_id in RESOURCE_METADATA:
@@ -104,7 +125,9 @@ def process_resource(graph_client, cve, resource):
             log.warning(f"Can't find deployment for {resource_metadata.get('display_name', resource['resource_id'])}")
             row.append('No deployment')
         else:
-            row.append(graph_client.get_resource_metadata(deployment[0])['display_name'])
+            if deployment[0] not in RESOURCE_METADATA:
+                RESOURCE_METADATA[deployment[0]] = graph_client.get_resource_metadata(deployment[0])
+            row.append(RESOURCE_METADATA[deployment[0]]['display_name'])
     else:
         row.append('Not a pod')
     return row
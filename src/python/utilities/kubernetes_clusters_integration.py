@@ -53,7 +53,7 @@ def main(environment, ll_username, ll_password, ll_f2a, ws_name, stage=None):
     print(color("Logged in successfully!", "green"))
 
     print(color("Getting all EKS clusters ARNs", "blue"))
-    eks_clusters = graph_client.get_resources_by_type(resource_type="eks")
+    eks_clusters = graph_client.get_resources_by_type(resource_type="eks", fields=("id", "display_name"))
     print(color(f"Found {len(eks_clusters)} clusters", "green"))
 
     print(color("Getting all Kubernetes existing integrations", "blue"))
@@ -17,9 +17,11 @@ except ModuleNotFoundError:
 
 def main(environment, ll_username, ll_password, ll_f2a, ws_name, stage=None):
     # Connecting to Stream
-    graph_client = get_graph_client(environment, ll_username, ll_password, ll_f2a, ws_name, stage)
+    # Configurations are kept on disk between runs and re-downloaded only when the resource changed
+    graph_client = get_graph_client(environment, ll_username, ll_password, ll_f2a, ws_name, stage,
+                                    disk_cache=ResourceStore())
 
-    hosted_zones = graph_client.get_resources_by_type("route53")
+    hosted_zones = graph_client.get_resources_by_type("route53", fields=("id", "display_name"))
     for hosted_zone in hosted_zones:
         records = graph_client.get_resource_configuration_by_id(hosted_zone['id'])['record']
         filtered_records = [rec for rec in records if rec['RecordType'] in ['A', 'CNAME', 'NAME']]
@@ -192,13 +192,7 @@ document.addEventListener("DOMContentLoaded", function () {
         playLottieAnimation();
 
         try {
-            const response = await fetch(endpoint, {
-                method: "POST",
-                headers: {
-                    "Content-Type": "application/json"
-                },
-                body: requestData
-            });
+            const response = await runJob(endpoint, requestData);
 
             const contentType = response.headers.get("content-type");
             const contentDisposition = response.headers.get("content-disposition");
@@ -244,6 +238,30 @@ document.addEventListener("DOMContentLoaded", function () {
     apiEndpointSelect.dispatchEvent(new Event("change"));
 });
 
+// Run a report as a background job: submit it, poll until it finishes, then fetch its file (or error)
+async function runJob(endpoint, requestData) {
+    const submitted = await fetch("/jobs" + endpoint, {
+        method: "POST",
+        headers: {
+            "Content-Type": "application/json"
+        },
+        body: requestData
+    });
+    if (!submitted.ok) {
+        return submitted;
+    }
+    const job = await submitted.json();
+    while (job.status === "queued" || job.status === "running") {
+        await new Promise(resolve => setTimeout(resolve, 2000));
+        const status = await fetch(`/jobs/${job.job_id}`);
+        if (!status.ok) {
+            return status;
+        }
+        job.status = (await status.json()).status;
+    }
+    return fetch(`/jobs/${job.job_id}/artifact`);
+}
+
 // Define the animation variable outside the event handler
 let animation = null;
 
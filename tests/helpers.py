@@ -0,0 +1,18 @@
+import json
+from unittest.mock import MagicMock
+
+
+def graph_response(body, status_code=200, headers=None):
+    """ Fake HTTP response of the GraphQL API, as returned by a session's post().
+        :param body (dict/str)      - Response body, encoded as JSON unless already a string.
+        :param status_code (int)    - HTTP status.
+        :param headers (dict)       - Response headers.
+        :returns (MagicMock)        - The response.
+    """
+    res = MagicMock()
+    res.__bool__.return_value = status_code < 400
+    res.status_code = status_code
+    res.headers = headers or {}
+    res.text = body if isinstance(body, str) else json.dumps(body)
+    res.content = res.text.encode()
+    return res
@@ -0,0 +1,117 @@
+import os
+import sys
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+from src.python.common import common
+from src.python.common.client_cache import ClientCache
+from graph_standin import StandInServer
+from synthetic_workspace import SyntheticWorkspace
+
+
+def _client(token="Bearer t", expires_in=3600, customer_id="ws-1"):
+    return MagicMock(token=token, token_expires_at=time.time() + expires_in, customer_id=customer_id)
+
+
+class TestClientCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = ClientCache(max_sessions=2, idle_ttl=60, expiry_margin=30)
+
+    def test_key_covers_every_credential_and_hides_them(self):
+        key = self.cache.key("url", "ws", "me", "pw")
+        self.assertEqual(key, self.cache.key("url", "ws", "me", "pw"))
+        for other in (("url2", "ws", "me", "pw"), ("url", "ws2", "me", "pw"), ("url", "ws", "me", "pw2"),
+                      ("url", "ws", None, None, "token")):
+            self.assertNotEqual(key, self.cache.key(*other))
+        self.assertNotIn("pw", key)
+        # Keyed with a secret of this cache, so keys can't be guessed from the credentials
+        self.assertNotEqual(key, ClientCache().key("url", "ws", "me", "pw"))
+
+    def test_get_and_put(self):
+        self.assertIsNone(self.cache.get("k"))
+        self.cache.put("k", _client())
+        session = self.cache.get("k")
+        self.assertEqual(("Bearer t", "ws-1"), (session.token, session.customer_id))
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+
+    def test_sessions_about_to_expire_are_dropped(self):
+        self.cache.put("expiring", _client(expires_in=10))
+        self.assertIsNone(self.cache.get("expiring"))
+        self.cache.put("k", _client())
+        with patch("src.python.common.client_cache.time.time", return_value=time.time() + 3590):
+            self.assertIsNone(self.cache.get("k"))
+        self.assertEqual(0, len(self.cache))
+
+    def test_idle_sessions_are_dropped(self):
+        self.cache.put("k", _client())
+        with patch("src.python.common.client_cache.time.time", return_value=time.time() + 61):
+            self.assertIsNone(self.cache.get("k"))
+
+    def test_least_recently_used_is_dropped(self):
+        for key in ("a", "b"):
+            self.cache.put(key, _client())
+        self.cache.get("a")
+        self.cache.put("c", _client())
+        self.assertIsNone(self.cache.get("b"))
+        self.assertIsNotNone(self.cache.get("a"))
+
+
+class TestGetGraphClient(unittest.TestCase):
+    def setUp(self):
+        self.server = StandInServer(SyntheticWorkspace(resources=100, accounts=2))
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        for patcher in (patch.dict(os.environ, STREAM_GRAPHQL_URL=self.server.url),
+                        # Its summary would be logged at exit, after the test run closed the streams
+                        patch.object(common, "register_metrics_summary")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # main.py enables it for the whole process when imported
+        self.addCleanup(common.enable_client_cache if common._client_cache else common.disable_client_cache)
+        common.disable_client_cache()
+
+    def login(self, password="pw", ws_name="Stand-in", otp=None):
+        return common.get_graph_client("demo", "me@example.com", password, otp, ws_name, None)
+
+    def test_follow_up_requests_skip_the_login(self):
+        common.enable_client_cache()
+        first = self.login()
+        second = self.login()
+        self.assertEqual(1, self.server.stats["Login"])
+        self.assertIsNot(first, second)
+        self.assertEqual((first.token, first.customer_id), (second.token, second.customer_id))
+        self.assertEqual(2, len(second.get_accounts()))
+        # Other credentials log in again
+        self.login(password="other")
+        self.assertEqual(2, self.server.stats["Login"])
+
+    def test_two_factor_logins_are_never_reused(self):
+        common.enable_client_cache()
+        self.login(otp="111111")
+        # Every request has to pass the second factor again
+        self.login(otp="222222")
+        self.assertEqual((2, 2), (self.server.stats["Login"], self.server.stats["authenticateTwoFactor"]))
+        # ... and a password alone never gets the session of one
+        self.login()
+        self.assertEqual(3, self.server.stats["Login"])
+        self.assertEqual(0, common._client_cache.hits)
+
+    def test_persisted_queries_and_compression_are_opt_in(self):
+        client = self.login()
+        self.assertEqual((False, False), (client.persisted_queries, client.compress_requests))
+        with patch.dict(os.environ, STREAM_PERSISTED_QUERIES="1", STREAM_COMPRESS_REQUESTS="true"):
+            client = self.login()
+        self.assertEqual((True, True), (client.persisted_queries, client.compress_requests))
+        self.assertEqual(2, len(client.get_accounts()))
+
+    def test_disabled_by_default(self):
+        self.login()
+        self.login()
+        self.assertEqual(2, self.server.stats["Login"])
+
+
+if __name__ == '__main__':
+    unittest.main()
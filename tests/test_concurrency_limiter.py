@@ -0,0 +1,99 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.python.common.concurrency_limiter import AdaptiveLimiter
+from src.python.common.graph_common import GraphCommon, get_shared_limiter
+
+URL = "https://env.streamsec.io/graphql"
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+    def test_additive_increase_after_a_full_window(self):
+        limiter = AdaptiveLimiter(initial_limit=4, max_limit=5)
+        for _ in range(4):
+            with limiter.slot():
+                pass
+        self.assertEqual(limiter.limit, 5)
+        for _ in range(10):
+            with limiter.slot():
+                pass
+        self.assertEqual(limiter.limit, 5)
+
+    def test_multiplicative_decrease_once_per_round_trip(self):
+        limiter = AdaptiveLimiter(initial_limit=8, max_limit=8)
+        first, second = limiter.acquire(), limiter.acquire()
+        limiter.release(first, overloaded=True)
+        limiter.release(second, overloaded=True)
+        self.assertEqual(limiter.limit, 4)
+        limiter.release(limiter.acquire(), overloaded=True)
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.stats()["decreases"], 2)
+
+    def test_exceptions_count_as_overload(self):
+        limiter = AdaptiveLimiter(initial_limit=4, max_limit=4)
+        with self.assertRaises(TimeoutError):
+            with limiter.slot():
+                raise TimeoutError()
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.in_flight, 0)
+
+    @patch("src.python.common.concurrency_limiter.time.monotonic")
+    def test_latency_spike_decreases(self, monotonic):
+        limiter = AdaptiveLimiter(initial_limit=8, max_limit=8)
+        monotonic.side_effect = [0, 1, 2, 3]
+        limiter.release(limiter.acquire(), kind="Search")
+        self.assertEqual(limiter.limit, 8)
+        monotonic.side_effect = [10, 13, 13]
+        limiter.release(limiter.acquire(), kind="Search")
+        self.assertEqual(limiter.limit, 4)
+
+    def test_latency_is_compared_per_kind(self):
+        limiter = AdaptiveLimiter(initial_limit=8, max_limit=8)
+        limiter.baseline_latency["Search"] = 0.01
+        limiter.release(time.monotonic() - 5, kind="RuleCsv")
+        self.assertEqual(limiter.limit, 8)
+
+    def test_bounds_requests_in_flight(self):
+        limiter = AdaptiveLimiter(initial_limit=2, max_limit=2)
+        release = threading.Event()
+        peak = []
+
+        def work():
+            with limiter.slot():
+                peak.append(limiter.in_flight)
+                release.wait(5)
+        threads = [threading.Thread(target=work) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while limiter.stats()["queue_depth"] < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(limiter.stats()["queue_depth"], 3)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(max(peak), 2)
+
+
+class TestGraphCommonLimiter(unittest.TestCase):
+    def test_throttled_responses_cut_the_shared_limit(self):
+        limiter = AdaptiveLimiter(initial_limit=8, max_limit=8)
+        session = MagicMock()
+        body = '{"errors": [{"message": "slow down"}]}'
+        session.post.return_value = MagicMock(status_code=429, text=body, content=body.encode())
+        client = GraphCommon(URL, token="abc", customer_id="ws", session=session, limiter=limiter)
+        client.graph_query("Accounts", {}, "query Accounts{accounts{_id}}")
+        self.assertEqual(limiter.limit, 4)
+
+    def test_shared_limiter_per_environment(self):
+        self.assertIs(get_shared_limiter(URL), get_shared_limiter("https://env.streamsec.io/other"))
+        self.assertIsNot(get_shared_limiter(URL), get_shared_limiter("https://other.streamsec.io/graphql"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import gzip
+import io
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+import zlib
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.python.common.csv_stream import CsvExport, csv_chunks, gzip_chunks, write_csv
+
+
+class TestCsvChunks(unittest.TestCase):
+    def test_dict_and_list_rows(self):
+        export = CsvExport("x.csv", ["a", "b"], iter([{"a": 1, "b": "x,y", "c": "ignored"}, {"a": 2}, [3, 4]]))
+        self.assertEqual(b'a,b\r\n1,"x,y"\r\n2,\r\n3,4\r\n', b"".join(csv_chunks(export)))
+
+    def test_rows_are_consumed_lazily(self):
+        consumed = []
+
+        def rows():
+            for i in range(100):
+                consumed.append(i)
+                yield [i, "x" * 10]
+        chunks = csv_chunks(CsvExport("x.csv", ["i", "x"], rows()), chunk_size=50)
+        first = next(chunks)
+        self.assertTrue(first.startswith(b"i,x\r\n"))
+        self.assertLess(len(consumed), 10)
+        self.assertEqual(101, b"".join([first] + list(chunks)).count(b"\r\n"))
+
+    def test_empty(self):
+        self.assertEqual(b"a\r\n", b"".join(csv_chunks(CsvExport("x.csv", ["a"], []))))
+
+
+class TestGzipChunks(unittest.TestCase):
+    def test_round_trip(self):
+        chunks = [b"a,b\r\n", b"1,2\r\n" * 1000, b"3,4\r\n"]
+        compressed = list(gzip_chunks(iter(chunks)))
+        self.assertEqual(b"".join(chunks), gzip.decompress(b"".join(compressed)))
+        # Each chunk is flushed, so the first can be decompressed on its own
+        self.assertEqual(chunks[0], zlib.decompressobj(31).decompress(compressed[0]))
+
+
+class TestWriteCsv(unittest.TestCase):
+    def test_writes_the_file(self):
+        path = os.path.join(tempfile.mkdtemp(), "x.csv")
+        self.assertEqual(path, write_csv(CsvExport("ignored.csv", ["a"], [{"a": 1}]), path))
+        with open(path, newline="") as file:
+            self.assertEqual("a\r\n1\r\n", file.read())
+
+    def test_output_sinks(self):
+        export = CsvExport("x.csv", ["a"], [{"a": 1}])
+        directory = tempfile.mkdtemp()
+        self.assertEqual(os.path.join(directory, "x.csv"), write_csv(export, directory))
+        text = io.StringIO()
+        self.assertIs(text, write_csv(export, text))
+        self.assertEqual("a\r\n1\r\n", text.getvalue())
+        with tempfile.SpooledTemporaryFile() as spooled:
+            self.assertIs(spooled, write_csv(export, spooled))
+            spooled.seek(0)
+            self.assertEqual(b"a\r\n1\r\n", spooled.read())
+        rows = []
+        writer = MagicMock(writerow=rows.append, writerows=lambda values: rows.extend(values))
+        write_csv(export, writer)
+        self.assertEqual([["a"], [1]], rows)
+
+    def test_partial_file_is_removed(self):
+        def rows():
+            yield [1]
+            raise RuntimeError("API down")
+        path = os.path.join(tempfile.mkdtemp(), "x.csv")
+        with self.assertRaises(RuntimeError):
+            write_csv(CsvExport("x.csv", ["a"], rows()), path)
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
 import contextlib
 import io
 import os
+import shutil
 import sys
+import tempfile
 import unittest
 from unittest.mock import patch
 
@@ -10,6 +12,14 @@ from src.python.utilities import organization_delete_integration as mod
 
 
 class TestLambdaScanErrorsAffectExit(unittest.TestCase):
+    def setUp(self):
+        # The lambda mode writes its delete plan into the working directory
+        cwd = os.getcwd()
+        workdir = tempfile.mkdtemp()
+        os.chdir(workdir)
+        self.addCleanup(shutil.rmtree, workdir, True)
+        self.addCleanup(os.chdir, cwd)
+
     def test_scan_gap_causes_nonzero_exit_even_on_just_print(self):
         accounts = [("111", "acct-a")]
 
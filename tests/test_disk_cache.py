@@ -0,0 +1,82 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.python.common.disk_cache import ResourceStore
+from src.python.common.graph_common import GraphCommon
+
+URL = "https://env.streamsec.io/graphql"
+
+
+class TestResourceStore(unittest.TestCase):
+    def test_served_only_for_the_stored_version(self):
+        store = ResourceStore(":memory:")
+        store.put("ws", "i-1", "metadata", 100, {"id": "i-1"})
+        self.assertEqual(store.get("ws", "i-1", "metadata", 100), {"id": "i-1"})
+        self.assertIsNone(store.get("ws", "i-1", "metadata", 101))
+        self.assertIsNone(store.get("other", "i-1", "metadata", 100))
+        self.assertEqual(store.stats(), {"hits": 1, "misses": 2, "size": 1})
+
+    def test_persists_across_instances(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache", "resources.db")
+            store = ResourceStore(path)
+            store.put("ws", "i-1", "configuration:translated", 100, {"ImageId": "ami-1"})
+            store.close()
+            self.assertEqual(ResourceStore(path).get("ws", "i-1", "configuration:translated", 100),
+                             {"ImageId": "ami-1"})
+
+    def test_unversioned_documents_are_not_stored(self):
+        store = ResourceStore(":memory:")
+        store.put("ws", "i-1", "metadata", None, {"id": "i-1"})
+        self.assertEqual(store.stats()["size"], 0)
+
+
+class TestGraphCommonDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.client = GraphCommon(URL, token="abc", customer_id="ws", session=MagicMock(),
+                                  disk_cache=ResourceStore(":memory:"))
+        self.versions = {"i-1": 100, "i-2": 200}
+        self.fetched = []
+
+        def graph_query(operation_name, variables, query):
+            ids = list(variables.values())
+            if operation_name == "ResourceConfigurationVersions":
+                return {"data": {"configuration_versions": [{"timestamp": self.versions[variables["id"]]}]}}
+            if operation_name == "ResourceConfiguration":
+                self.fetched.append(variables["id"])
+                return {"data": {"configuration": {"translated": {"id": variables["id"]}}}}
+            if operation_name == "ResourcesConfigurationVersionsBatch":
+                return {"data": {f"r{i}": [{"timestamp": self.versions[v]}] for i, v in enumerate(ids)}}
+            self.fetched.extend(ids)
+            return {"data": {f"r{i}": {"translated": {"id": v}} for i, v in enumerate(ids)}}
+        self.client.graph_query = MagicMock(side_effect=graph_query)
+
+    def test_unchanged_resources_are_served_from_disk(self):
+        self.client.get_resources_configuration_by_id(["i-1", "i-2"])
+        self.versions["i-2"] = 201
+
+        configurations = self.client.get_resources_configuration_by_id(["i-1", "i-2"])
+
+        self.assertEqual(configurations, {"i-1": {"id": "i-1"}, "i-2": {"id": "i-2"}})
+        self.assertEqual(self.fetched, ["i-1", "i-2", "i-2"])
+
+    def test_single_lookup_shares_the_store(self):
+        self.client.get_resources_configuration_by_id(["i-1"])
+        self.assertEqual(self.client.get_resource_configuration_by_id("i-1"), {"id": "i-1"})
+        self.assertEqual(self.fetched, ["i-1"])
+
+    def test_latest_version_is_looked_up_once(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get_resource_configuration_by_id("i-1", get_from_latest_timestamp=True),
+                             {"id": "i-1"})
+        operations = [c.args[0] for c in self.client.graph_query.call_args_list]
+        self.assertEqual(["ResourceConfigurationVersions", "ResourceConfiguration", "ResourceConfigurationVersions"],
+                         operations)
+
+
+if __name__ == "__main__":
+    unittest.main()
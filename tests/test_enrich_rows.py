@@ -0,0 +1,65 @@
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.python.common import common
+from src.python.common.common import enrich_rows
+from src.python.utilities import export_exposed_alb_violations
+
+
+class TestEnrichRows(unittest.TestCase):
+    def test_in_order_within_the_window(self):
+        read = []
+
+        def violations():
+            for i in range(10):
+                read.append(i)
+                yield {"resource_id": f"r{i}"}
+
+        def enrich(suffix, violation):
+            violation["enriched"] = violation["resource_id"] + suffix
+
+        rows = enrich_rows(violations(), enrich, "!", window=3)
+        self.assertEqual({"resource_id": "r0", "enriched": "r0!"}, next(rows))
+        # Only the window was read ahead of the first row
+        self.assertEqual([0, 1, 2], read)
+        self.assertEqual([f"r{i}!" for i in range(1, 10)], [row["enriched"] for row in rows])
+
+    def test_failed_enrichment_keeps_the_item(self):
+        def enrich(violation):
+            if violation["resource_id"] == "bad":
+                raise ValueError("gone")
+            violation["enriched"] = True
+
+        with patch.object(common.log, "warning") as warning:
+            rows = list(enrich_rows([{"resource_id": "bad"}, {"resource_id": "ok"}], enrich))
+        self.assertEqual([{"resource_id": "bad"}, {"resource_id": "ok", "enriched": True}], rows)
+        warning.assert_called_once()
+
+
+class TestViolationsExport(unittest.TestCase):
+    def test_enriched_violations_are_written(self):
+        graph_client = MagicMock()
+        graph_client.get_all_rules.return_value = [{"id": "rule", "name": "Internet facing Load Balancer (ALB)"}]
+        graph_client.iter_csv_rule.return_value = iter([{"resource_id": "alb-1"}, {"resource_id": "alb-2"}])
+        graph_client.get_resource_configuration_by_id.return_value = {"DNSName": "alb.example.com"}
+        graph_client.get_resource_associated_resources.return_value = []
+        exports = []
+
+        def write_csv(export, output):
+            exports.append((export.header, list(export.rows)))
+            return export.file_name
+
+        with patch.object(export_exposed_alb_violations, "get_graph_client", return_value=graph_client), \
+                patch.object(export_exposed_alb_violations, "write_csv", side_effect=write_csv):
+            export_exposed_alb_violations.main("demo", "me", "pw", None, "ws")
+        (header, rows), = exports
+        self.assertEqual(["resource_id", "dns_name", "exposed_ports", "CNAME"], header)
+        self.assertEqual(["alb-1", "alb-2"], [row["resource_id"] for row in rows])
+        self.assertTrue(all(row["dns_name"] == "alb.example.com" for row in rows))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.python.common.graph_cache import ResponseCache
+from src.python.common.graph_common import GraphCommon
+from helpers import graph_response
+
+URL = "https://env.streamsec.io/graphql"
+
+
+class TestResponseCache(unittest.TestCase):
+    def test_key_ignores_variables_order(self):
+        self.assertEqual(ResponseCache.make_key("ws", "Op", {"a": 1, "b": 2}, "q"),
+                         ResponseCache.make_key("ws", "Op", {"b": 2, "a": 1}, "q"))
+        self.assertNotEqual(ResponseCache.make_key("ws", "Op", {}, "q"),
+                            ResponseCache.make_key("other", "Op", {}, "q"))
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_size=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    @patch("src.python.common.graph_cache.time.monotonic")
+    def test_ttl_expiry(self, monotonic):
+        cache = ResponseCache(ttl=10)
+        monotonic.return_value = 100
+        cache.put("a", {"x": 1})
+        monotonic.return_value = 109
+        self.assertEqual(cache.get("a"), {"x": 1})
+        monotonic.return_value = 111
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "evictions": 0, "size": 0})
+
+    def test_cached_values_are_copies(self):
+        cache = ResponseCache()
+        cache.put("a", {"x": [1]})
+        cache.get("a")["x"].append(2)
+        self.assertEqual(cache.get("a"), {"x": [1]})
+
+
+class TestGraphCommonCache(unittest.TestCase):
+    def setUp(self):
+        self.session = MagicMock()
+        self.session.post.return_value = graph_response('{"data": {"accounts": []}}')
+        self.client = GraphCommon(URL, token="abc", customer_id="ws", session=self.session, cache=ResponseCache())
+
+    def test_repeated_reads_are_served_from_cache(self):
+        self.client.get_accounts()
+        self.client.get_accounts()
+        self.assertEqual(self.session.post.call_count, 1)
+        self.assertEqual(self.client.cache.stats()["hits"], 1)
+
+    def test_workspace_is_part_of_the_key(self):
+        self.client.get_accounts()
+        self.client.change_client_ws("other")
+        self.client.get_accounts()
+        self.assertEqual(self.session.post.call_count, 2)
+
+    def test_mutations_bypass_and_invalidate(self):
+        self.client.get_accounts()
+        self.client.graph_query("DeleteKubernetes", {"id": "k"}, "mutation DeleteKubernetes($id: ID!){x}")
+        self.client.graph_query("DeleteKubernetes", {"id": "k"}, "mutation DeleteKubernetes($id: ID!){x}")
+        self.client.get_accounts()
+        self.assertEqual(self.session.post.call_count, 4)
+
+    def test_errors_are_not_cached(self):
+        self.session.post.return_value = graph_response('{"errors": [{"message": "boom"}]}')
+        self.client.graph_query("Accounts", {}, "query Accounts{accounts{_id}}")
+        self.client.graph_query("Accounts", {}, "query Accounts{accounts{_id}}")
+        self.assertEqual(self.session.post.call_count, 2)
+
+    def test_disabled_by_default(self):
+        client = GraphCommon(URL, token="abc", customer_id="ws", session=self.session)
+        client.get_accounts()
+        client.get_accounts()
+        self.assertEqual(self.session.post.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import json
+import os
+import sys
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.python.common.graph_common import GraphCommon, GraphBatchError
+
+URL = "https://env.streamsec.io/graphql"
+
+
+class TestGraphCommonBatching(unittest.TestCase):
+    def setUp(self):
+        self.client = GraphCommon(URL, token="abc", customer_id="ws", session=MagicMock())
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def _serve(self, handler):
+        def graph_query(operation_name, variables, query):
+            with self.lock:
+                self.requests.append((operation_name, variables, query))
+            return handler(variables)
+        self.client.graph_query = MagicMock(side_effect=graph_query)
+
+    def test_resources_metadata_aliases_ids_in_batches(self):
+        self._serve(lambda variables: {"data": {f"r{k[2:]}": {"id": v, "display_name": v.upper()}
+                                                for k, v in variables.items()}})
+        ids = [f"res-{i}" for i in range(7)]
+
+        metadata = self.client.get_resources_metadata(ids, batch_size=3)
+
+        self.assertEqual(metadata, {i: {"id": i, "display_name": i.upper()} for i in ids})
+        self.assertEqual(sorted(len(variables) for _, variables, _ in self.requests), [1, 3, 3])
+        self.assertIn("r0: resource(resource_id: $id0 return_deleted: true)", self.requests[0][2])
+
+    def test_duplicate_ids_are_looked_up_once(self):
+        self._serve(lambda variables: {"data": {f"r{k[2:]}": {"account_id": "123"} for k in variables}})
+
+        self.assertEqual(self.client.get_resources_account_id(["a", "b", "a"]), {"a": "123", "b": "123"})
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.requests[0][1], {"id0": "a", "id1": "b"})
+
+    def test_errors_map_back_to_their_ids(self):
+        self._serve(lambda variables: {
+            "data": {"r0": {"translated": {"ImageId": "ami-1"}}, "r1": None},
+            "errors": [{"message": "Resource not found", "path": ["r1"]}]})
+
+        with self.assertRaises(GraphBatchError) as ctx:
+            self.client.get_resources_configuration_by_id(["i-1", "i-2"])
+
+        self.assertEqual(ctx.exception.errors, {"i-2": "Resource not found"})
+        self.assertEqual(ctx.exception.results, {"i-1": {"ImageId": "ami-1"}})
+
+    def test_detections_enrichment_uses_id_list_filter(self):
+        def handler(variables):
+            ids = variables["filters"]["_id"]
+            return {"data": {"get_detections": {"results": [{"_id": i, "title": i} for i in ids if i != "d-2"]}}}
+        self._serve(handler)
+
+        with self.assertRaises(GraphBatchError) as ctx:
+            self.client.get_detections_enrichment(["d-1", "d-2", "d-3"], batch_size=2)
+
+        self.assertEqual(ctx.exception.results, {"d-1": {"_id": "d-1", "title": "d-1"},
+                                                 "d-3": {"_id": "d-3", "title": "d-3"}})
+        self.assertEqual(list(ctx.exception.errors), ["d-2"])
+        self.assertEqual(sorted(json.dumps(v["filters"]) for _, v, _ in self.requests),
+                         ['{"_id": ["d-1", "d-2"]}', '{"_id": ["d-3"]}'])
+
+
+if __name__ == "__main__":
+    unittest.main()
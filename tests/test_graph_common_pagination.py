@@ -0,0 +1,102 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.python.common.graph_common import GraphCommon
+
+
+def _paged_collection(items, collection, count_key="total_count"):
+    """ Build a graph_query stand-in serving `items` through skip/limit. """
+    calls = []
+
+    def graph_query(operation_name, variables, query):
+        calls.append((variables["skip"], variables["limit"]))
+        page = items[variables["skip"]:variables["skip"] + variables["limit"]]
+        return {"data": {collection: {count_key: len(items), "results": page}}}
+    return graph_query, calls
+
+
+class TestPaginate(unittest.TestCase):
+    def setUp(self):
+        self.client = GraphCommon("https://env.streamsec.io/graphql", token="abc", customer_id="ws",
+                                  session=MagicMock())
+
+    def test_reads_every_page_and_stops_at_total_count(self):
+        items = list(range(10))
+        self.client.graph_query, calls = _paged_collection(items, "ruleViolations")
+        self.assertEqual(list(self.client.paginate("Op", {}, "q", "ruleViolations", page_size=5)), items)
+        # Exactly two pages: the total count says there is nothing after the second full page
+        self.assertEqual(calls, [(0, 5), (5, 5)])
+
+    def test_total_count_camel_case(self):
+        items = list(range(7))
+        self.client.graph_query, calls = _paged_collection(items, "search", count_key="totalCount")
+        self.assertEqual(list(self.client.paginate("Op", {}, "q", "search", page_size=3)), items)
+        self.assertEqual(len(calls), 3)
+
+    def test_is_lazy(self):
+        self.client.graph_query, calls = _paged_collection(list(range(10)), "search")
+        pages = self.client.paginate("Op", {}, "q", "search", page_size=2)
+        self.assertEqual(next(pages), 0)
+        self.assertEqual(len(calls), 1)
+
+    def test_max_items(self):
+        self.client.graph_query, calls = _paged_collection(list(range(100)), "IPTraffic")
+        self.assertEqual(len(list(self.client.paginate("Op", {}, "q", "IPTraffic", page_size=30, max_items=45))), 45)
+        self.assertEqual(calls, [(0, 30), (30, 15)])
+
+    def test_remaining_pages_fetched_concurrently_and_yielded_in_order(self):
+        items = list(range(100))
+        graph_query, calls = _paged_collection(items, "get_detections")
+        in_flight = {"now": 0, "max": 0}
+        lock = threading.Lock()
+
+        def slow_graph_query(*args):
+            with lock:
+                in_flight["now"] += 1
+                in_flight["max"] = max(in_flight["max"], in_flight["now"])
+            # Later offsets answer faster, so completion order differs from offset order
+            time.sleep(0.05 - args[1]["skip"] / 10000)
+            with lock:
+                in_flight["now"] -= 1
+            return graph_query(*args)
+
+        self.client.graph_query = slow_graph_query
+        results = list(self.client.paginate("Op", {}, "q", "get_detections", page_size=10, fan_out=4))
+        self.assertEqual(results, items)
+        self.assertEqual(sorted(calls), [(skip, 10) for skip in range(0, 100, 10)])
+        self.assertEqual(in_flight["max"], 4)
+
+    def test_fan_out_of_one_is_sequential(self):
+        self.client.graph_query, calls = _paged_collection(list(range(25)), "cves")
+        self.assertEqual(list(self.client.paginate("Op", {}, "q", "cves", page_size=10, fan_out=1)), list(range(25)))
+        self.assertEqual(calls, [(0, 10), (10, 10), (20, 10)])
+
+    def test_no_prefetch_without_total_count(self):
+        graph_query, calls = _paged_collection(list(range(25)), "search")
+
+        def without_count(*args):
+            res = graph_query(*args)
+            del res["data"]["search"]["total_count"]
+            return res
+        self.client.graph_query = without_count
+        self.assertEqual(list(self.client.paginate("Op", {}, "q", "search", page_size=10)), list(range(25)))
+        self.assertEqual(calls, [(0, 10), (10, 10), (20, 10)])
+
+    def test_missing_collection_raises(self):
+        self.client.graph_query = lambda *_: {"errors": [{"message": "boom"}]}
+        with self.assertRaises(Exception):
+            list(self.client.paginate("Op", {}, "q", "search"))
+
+    def test_rule_violations_no_longer_sends_limit_zero(self):
+        self.client.graph_query, calls = _paged_collection(list(range(3)), "ruleViolations")
+        self.assertEqual(self.client.get_rule_violations("rule"), [0, 1, 2])
+        self.assertNotIn(0, [limit for _, limit in calls])
+
+
+if __name__ == "__main__":
+    unittest.main()
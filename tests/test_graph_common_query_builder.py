@@ -0,0 +1,63 @@
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.python.common.graph_common import (
+    GraphCommon, RESOURCE_FIELDS, build_resource_query, build_rules_query, build_search_query, build_selection,
+)
+from helpers import graph_response
+
+URL = "https://env.streamsec.io/graphql"
+
+
+class TestQueryBuilder(unittest.TestCase):
+    def test_nested_selection(self):
+        self.assertEqual(build_selection(("id", {"network_interfaces": ("id", {"tags": ("Key",)})})),
+                         "{id network_interfaces{id tags{Key}}}")
+
+    def test_empty_selection_is_rejected(self):
+        with self.assertRaises(ValueError):
+            build_selection(())
+
+    def test_queries_request_only_the_given_fields(self):
+        self.assertTrue(build_search_query(("id",)).endswith("{totalCount results{id}}}"))
+        self.assertTrue(build_resource_query(("account_id",)).endswith("return_deleted: true){account_id}}"))
+        self.assertTrue(build_rules_query(("id", "name")).endswith("{total_count results{id name}}}"))
+
+
+class TestGraphCommonProjection(unittest.TestCase):
+    def setUp(self):
+        self.session = MagicMock()
+        self.client = GraphCommon(URL, token="abc", customer_id="ws", session=self.session)
+
+    def sent(self):
+        return self.session.post.call_args.kwargs["json"]
+
+    def test_get_only_ids_fetches_only_ids(self):
+        self.session.post.return_value = graph_response(
+            {"data": {"search": {"totalCount": 2, "results": [{"id": "a"}, {"id": "b"}]}}})
+        self.assertEqual(self.client.get_resources_by_type("eks", get_only_ids=True), ["a", "b"])
+        payload = self.sent()
+        self.assertIn("results{id}", payload["query"])
+        self.assertEqual(payload["variables"]["filters"]["resource_type"], ["eks"])
+
+    def test_wrappers_keep_their_default_fields(self):
+        self.session.post.return_value = graph_response({"data": {"resource": {"id": "a"}}})
+        self.client.get_resource_metadata("a")
+        self.assertIn(build_selection(RESOURCE_FIELDS), self.sent()["query"])
+        self.session.post.return_value = graph_response({"data": {"resource": {"account_id": "123"}}})
+        self.assertEqual(self.client.get_resource_account_id("a"), "123")
+        self.assertIn("{account_id}", self.sent()["query"])
+
+    def test_rules_projection_keeps_the_filtered_fields(self):
+        self.session.post.return_value = graph_response({"data": {"rules": {"results": [
+            {"id": "1", "labels": [], "category": "Cost", "status": "active"},
+            {"id": "2", "labels": [], "category": "Cost", "status": "inactive"}]}}})
+        self.assertEqual([r["id"] for r in self.client.get_cost_rules(fields=("id", "labels"))], ["1"])
+        self.assertIn("results{id labels category status}", self.sent()["query"])
+
+
+if __name__ == "__main__":
+    unittest.main()
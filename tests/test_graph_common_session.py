@@ -0,0 +1,79 @@
+import gzip
+import json
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.python.common.graph_common import (
+    GraphCommon,
+    create_session,
+    get_shared_session,
+    DEFAULT_TIMEOUT,
+    COMPRESS_MIN_SIZE,
+)
+from helpers import graph_response
+
+URL = "https://env.streamsec.io/graphql"
+
+
+@patch("src.python.common.graph_common.time.sleep", lambda _: None)
+class TestGraphCommonSession(unittest.TestCase):
+    def test_queries_go_through_the_given_session_with_timeout(self):
+        session = MagicMock()
+        session.post.return_value = graph_response('{"data": {"accounts": []}}')
+        client = GraphCommon(URL, token="abc", customer_id="ws", session=session)
+
+        self.assertEqual(client.get_accounts(), [])
+        _, kwargs = session.post.call_args
+        self.assertEqual(kwargs["timeout"], DEFAULT_TIMEOUT)
+        self.assertEqual(kwargs["headers"], {"Authorization": "Bearer abc", "customer": "ws"})
+
+    def test_custom_timeout(self):
+        session = MagicMock()
+        session.post.return_value = graph_response('{"data": {"accounts": []}}')
+        client = GraphCommon(URL, token="abc", customer_id="ws", session=session, timeout=(1, 2))
+        client.get_accounts()
+        self.assertEqual(session.post.call_args[1]["timeout"], (1, 2))
+
+    def test_large_request_bodies_are_gzipped_when_enabled(self):
+        session = MagicMock()
+        session.post.return_value = graph_response('{"data": {"get_detections": {"results": []}}}')
+        client = GraphCommon(URL, token="abc", customer_id="ws", session=session, compress_requests=True)
+        ids = [f"{i:024x}" for i in range(COMPRESS_MIN_SIZE // 24)]
+        client.graph_query("Detection", {"filters": {"_id": ids}}, "query Detection{x}")
+
+        kwargs = session.post.call_args[1]
+        self.assertEqual(kwargs["headers"]["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(kwargs["data"]))["variables"]["filters"]["_id"], ids)
+
+    def test_small_request_bodies_are_sent_as_is(self):
+        session = MagicMock()
+        session.post.return_value = graph_response('{"data": {"accounts": []}}')
+        GraphCommon(URL, token="abc", customer_id="ws", session=session, compress_requests=True).get_accounts()
+        kwargs = session.post.call_args[1]
+        self.assertNotIn("Content-Encoding", kwargs["headers"])
+        self.assertEqual(json.loads(kwargs["data"])["operationName"], "Accounts")
+
+    def test_close_keeps_shared_session_open(self):
+        session = MagicMock()
+        GraphCommon(URL, token="abc", customer_id="ws", session=session).close()
+        session.close.assert_not_called()
+
+
+class TestSessions(unittest.TestCase):
+    def test_negotiates_compressed_responses(self):
+        self.assertIn("gzip", create_session().headers["Accept-Encoding"])
+
+    def test_pool_size_applied_to_adapter(self):
+        adapter = create_session(pool_size=7).get_adapter("https://env.streamsec.io")
+        self.assertEqual(adapter._pool_maxsize, 7)
+
+    def test_shared_session_per_environment(self):
+        self.assertIs(get_shared_session(URL), get_shared_session("https://env.streamsec.io/other"))
+        self.assertIsNot(get_shared_session(URL), get_shared_session("https://other.streamsec.io/graphql"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import concurrent.futures
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.python.common.graph_common import GraphCommon
+from helpers import graph_response
+
+URL = "https://env.streamsec.io/graphql"
+
+
+class TestGraphCommonSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.session = MagicMock()
+
+        def post(*args, **kwargs):
+            self.release.wait(5)
+            return graph_response('{"data": {"resource": {"id": "i-1"}}}')
+        self.session.post.side_effect = post
+        self.client = GraphCommon(URL, token="abc", customer_id="ws", session=self.session)
+
+    def _wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_identical_concurrent_queries_share_one_request(self):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+            futures = [executor.submit(self.client.get_resource_metadata, "i-1") for _ in range(5)]
+            self._wait_for(lambda: self.client.coalesced_calls == 4)
+            self.release.set()
+            results = [f.result() for f in futures]
+
+        self.assertEqual(self.session.post.call_count, 1)
+        self.assertEqual(self.client.coalesced_calls, 4)
+        self.assertEqual(results, [{"id": "i-1"}] * 5)
+        self.assertEqual(len({id(r) for r in results}), 5)
+
+    def test_different_variables_are_not_coalesced(self):
+        self.release.set()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(self.client.get_resource_metadata, ["i-1", "i-2"]))
+        self.assertEqual(self.session.post.call_count, 2)
+        self.assertEqual(self.client.coalesced_calls, 0)
+
+    def test_waiters_get_the_leaders_error(self):
+        def post(*args, **kwargs):
+            self.release.wait(5)
+            raise ConnectionError("boom")
+        self.session.post.side_effect = post
+        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(self.client.get_resource_metadata, "i-1") for _ in range(3)]
+            self._wait_for(lambda: self.client.coalesced_calls == 2)
+            self.release.set()
+            for future in futures:
+                self.assertRaises(ConnectionError, future.result)
+        self.assertEqual(self.session.post.call_count, 1)
+
+    def test_disabled(self):
+        self.release.set()
+        self.client.single_flight = False
+        self.client.get_resource_metadata("i-1")
+        self.assertEqual(self.client.coalesced_calls, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
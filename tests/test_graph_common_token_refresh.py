@@ -0,0 +1,99 @@
+import base64
+import concurrent.futures
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.python.common.graph_common import GraphCommon, SessionExpiredError, get_token_expiry
+from helpers import graph_response
+
+URL = "https://env.streamsec.io/graphql"
+
+
+def _jwt(exp):
+    claims = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).decode().rstrip("=")
+    return f"header.{claims}.signature"
+
+
+class TestTokenExpiry(unittest.TestCase):
+    def test_reads_jwt_exp(self):
+        self.assertEqual(get_token_expiry("Bearer " + _jwt(1700000000)), 1700000000)
+
+    def test_not_a_jwt(self):
+        self.assertIsNone(get_token_expiry("Bearer opaque-api-token"))
+        self.assertIsNone(get_token_expiry(None))
+
+
+class TestGraphCommonTokenRefresh(unittest.TestCase):
+    def setUp(self):
+        self.logins = 0
+        self.tokens = [_jwt(time.time() + 3600), _jwt(time.time() + 7200)]
+        self.session = MagicMock()
+        self.session.post.side_effect = self._post
+
+    def _post(self, url, json=None, headers=None, **kwargs):
+        if json["operationName"] == "Login":
+            self.logins += 1
+            return graph_response({"data": {"login": {"access_token": self.tokens[self.logins - 1]}}})
+        if json["operationName"] == "authenticateTwoFactor":
+            return graph_response({"data": {"authenticateTwoFactor": {"access_token": self.tokens[0]}}})
+        if headers["Authorization"] != f"Bearer {self.tokens[-1]}":
+            self.on_stale_token()
+            return graph_response({"errors": [{"extensions": {"code": "UNAUTHENTICATED"}}]})
+        return graph_response({"data": {"accounts": []}})
+
+    def on_stale_token(self):
+        pass
+
+    def test_init_does_not_sleep(self):
+        with patch("src.python.common.graph_common.time.sleep") as sleep:
+            GraphCommon(URL, "user@example.com", "pw", customer_id="ws", session=self.session)
+        sleep.assert_not_called()
+
+    def test_concurrent_unauthenticated_queries_log_in_once(self):
+        client = GraphCommon(URL, "user@example.com", "pw", customer_id="ws", session=self.session,
+                             single_flight=False)
+        barrier = threading.Barrier(8, timeout=5)
+        self.on_stale_token = barrier.wait
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: client.get_accounts(), range(8)))
+
+        self.assertEqual(results, [[]] * 8)
+        self.assertEqual(self.logins, 2)
+        self.assertEqual(client.token_generation, 1)
+
+    def test_refreshes_ahead_of_expiry(self):
+        self.tokens[0] = _jwt(time.time() + 10)
+        client = GraphCommon(URL, "user@example.com", "pw", customer_id="ws", session=self.session)
+
+        self.assertEqual(client.get_accounts(), [])
+        self.assertEqual(self.logins, 2)
+        self.assertEqual(client.token_expires_at, get_token_expiry(self.tokens[1]))
+
+    def test_api_tokens_are_not_refreshed(self):
+        client = GraphCommon(URL, token=_jwt(time.time() + 10), customer_id="ws", session=self.session)
+        client.get_accounts()
+        self.assertEqual(self.logins, 0)
+
+    def test_two_factor_sessions_are_not_renewed_with_the_password(self):
+        client = GraphCommon(URL, "user@example.com", "pw", otp="123456", customer_id="ws", session=self.session)
+        with self.assertRaises(SessionExpiredError):
+            client.get_accounts()
+        self.assertEqual(self.logins, 1)
+
+    def test_expired_two_factor_sessions_are_not_renewed_with_the_password(self):
+        self.tokens[0] = _jwt(time.time() - 1)
+        client = GraphCommon(URL, "user@example.com", "pw", otp="123456", customer_id="ws", session=self.session)
+        with self.assertRaises(SessionExpiredError):
+            client.get_accounts()
+        self.assertEqual(self.logins, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
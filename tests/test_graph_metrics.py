@@ -0,0 +1,80 @@
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.python.common.graph_cache import ResponseCache
+from src.python.common.graph_common import GraphCommon
+from src.python.common.graph_metrics import GraphMetrics
+from src.python.common.resilience import GraphQueryError, RetryPolicy
+from helpers import graph_response
+
+URL = "https://env.streamsec.io/graphql"
+
+
+class TestGraphMetrics(unittest.TestCase):
+    def test_histogram_is_cumulative(self):
+        metrics = GraphMetrics(buckets=(0.1, 1))
+        for latency in (0.05, 0.5, 0.5, 3):
+            metrics.record_call("Search", latency, request_bytes=10, response_bytes=100)
+        stats = metrics.snapshot()["Search"]
+        self.assertEqual(stats["latency"]["buckets"], {0.1: 1, 1: 3, "+Inf": 4})
+        self.assertEqual((stats["calls"], stats["request_bytes"], stats["response_bytes"]), (4, 40, 400))
+        self.assertEqual(GraphMetrics.percentile(stats["latency"], 0.5), 1)
+        self.assertEqual(GraphMetrics.percentile(stats["latency"], 0.95), 3)
+
+    def test_unknown_counter_is_rejected(self):
+        with self.assertRaises(ValueError):
+            GraphMetrics().increment("Search", "hits")
+
+    def test_prometheus_format(self):
+        metrics = GraphMetrics(buckets=(1,))
+        metrics.record_call('Odd"Name', 0.5)
+        metrics.increment('Odd"Name', "retries", 2)
+        text = metrics.to_prometheus()
+        self.assertIn('stream_graphql_retries_total{operation="Odd\\"Name"} 2', text)
+        self.assertIn('stream_graphql_latency_seconds_bucket{operation="Odd\\"Name",le="+Inf"} 1', text)
+        self.assertIn("# TYPE stream_graphql_latency_seconds histogram", text)
+
+    def test_summary_table(self):
+        metrics = GraphMetrics()
+        self.assertEqual(metrics.summary_table(), "")
+        metrics.record_call("Fast", 0.01)
+        metrics.record_call("Slow", 5)
+        lines = metrics.summary_table().splitlines()
+        self.assertTrue(lines[2].startswith("Slow"))
+        self.assertTrue(lines[3].startswith("Fast"))
+
+
+class TestGraphCommonMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = GraphMetrics()
+        self.session = MagicMock()
+        self.client = GraphCommon(URL, token="abc", customer_id="ws", session=self.session, cache=ResponseCache(),
+                                  metrics=self.metrics, retry_policy=RetryPolicy(max_retries=1))
+
+    def test_calls_bytes_and_cache_hits(self):
+        self.session.post.return_value = graph_response({"data": {"accounts": []}})
+        self.client.get_accounts()
+        self.client.get_accounts()
+        stats = self.metrics.snapshot()["Accounts"]
+        self.assertEqual((stats["calls"], stats["cache_hits"]), (1, 1))
+        self.assertEqual(stats["response_bytes"], len(b'{"data": {"accounts": []}}'))
+
+    @patch("src.python.common.graph_common.time.sleep")
+    def test_retries_and_failures(self, _):
+        self.session.post.return_value = graph_response({}, status_code=503)
+        with self.assertRaises(GraphQueryError):
+            self.client.get_accounts()
+        stats = self.metrics.snapshot()["Accounts"]
+        self.assertEqual((stats["calls"], stats["failures"], stats["retries"]), (1, 1, 1))
+
+    def test_graphql_errors(self):
+        self.session.post.return_value = graph_response({"errors": [{"message": "boom"}]})
+        self.client.graph_query("Accounts", {}, "query Accounts{accounts{_id}}")
+        self.assertEqual(self.metrics.snapshot()["Accounts"]["graphql_errors"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
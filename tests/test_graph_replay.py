@@ -0,0 +1,109 @@
+import gzip
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+from src.python.common.graph_common import GraphCommon, LOGIN_QUERY, get_shared_session
+from src.python.common.graph_metrics import GraphMetrics
+from src.python.common.resilience import GraphQueryError, RetryPolicy
+from graph_replay import GraphRecorder, ReplaySession, SCRUBBED, load_fixture, replaying
+from helpers import graph_response
+
+URL = "https://replay.streamsec.io/graphql"
+SEARCH = {"operationName": "ResourceSearch", "query": "query ResourceSearch{search{totalCount results{id}}}"}
+
+
+def _page(skip, limit, total=5):
+    return {"request": dict(SEARCH, variables={"phrase": "", "skip": skip, "limit": limit}), "status_code": 200,
+            "response": {"data": {"search": {"totalCount": total, "results": [
+                {"id": f"r{i}"} for i in range(skip, min(total, skip + limit))]}}}}
+
+
+class TestGraphRecorder(unittest.TestCase):
+    def test_scrubs_credentials_and_tokens(self):
+        session = MagicMock()
+        session.post.return_value = graph_response({"data": {"login": {"access_token": "secret-jwt"}}})
+        recorder = GraphRecorder(session)
+        GraphCommon(URL, "me@example.com", "hunter2", customer_id="ws", session=recorder)
+        exchange = recorder.exchanges[0]
+        self.assertEqual(exchange["request"]["variables"]["credentials"],
+                         {"email": SCRUBBED, "password": SCRUBBED})
+        self.assertEqual(exchange["response"]["data"]["login"]["access_token"], SCRUBBED)
+        self.assertNotIn("hunter2", json.dumps(recorder.exchanges))
+
+    def test_fixture_round_trip(self):
+        session = MagicMock()
+        session.post.return_value = graph_response({"data": {"accounts": []}})
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "accounts.jsonl.gz")
+            recorder = GraphRecorder(session, path)
+            GraphCommon(URL, token="abc", customer_id="ws", session=recorder, compress_requests=True).get_accounts()
+            recorder.save()
+            with gzip.open(path, "rt") as fixture:
+                self.assertNotIn("Bearer", fixture.read())
+            client = GraphCommon(URL, token="abc", customer_id="ws", session=ReplaySession(path))
+            self.assertEqual(client.get_accounts(), [])
+            self.assertEqual(len(load_fixture(path)), 1)
+
+
+class TestReplaySession(unittest.TestCase):
+    def test_replays_login_with_the_scrubbed_credentials(self):
+        replay = ReplaySession([{"request": {"operationName": "Login", "query": LOGIN_QUERY, "variables": {
+            "credentials": {"email": SCRUBBED, "password": SCRUBBED}}}, "status_code": 200,
+            "response": {"data": {"login": {"access_token": SCRUBBED}}}}])
+        client = GraphCommon(URL, "anyone@example.com", "any", customer_id="ws", session=replay)
+        self.assertEqual(client.token, f"Bearer {SCRUBBED}")
+
+    def test_serves_pages_of_any_size(self):
+        replay = ReplaySession([_page(3, 3), _page(0, 3)])
+        client = GraphCommon(URL, token="abc", customer_id="ws", session=replay, page_fan_out=1)
+        results = list(client.paginate("ResourceSearch", {"phrase": ""}, SEARCH["query"], "search", page_size=2))
+        self.assertEqual([r["id"] for r in results], [f"r{i}" for i in range(5)])
+        self.assertEqual(replay.requests, 3)
+
+    def test_max_page_size_caps_pages(self):
+        replay = ReplaySession([_page(0, 5)], max_page_size=2)
+        client = GraphCommon(URL, token="abc", customer_id="ws", session=replay, page_fan_out=1)
+        results = list(client.paginate("ResourceSearch", {"phrase": ""}, SEARCH["query"], "search", page_size=5))
+        self.assertEqual(len(results), 2)
+
+    @patch("src.python.common.graph_common.time.sleep")
+    def test_injected_errors_are_repeatable(self, _):
+        outcomes = []
+        for _ in range(2):
+            replay = ReplaySession([_page(0, 5)], error_rate=0.5, seed=3)
+            client = GraphCommon(URL, token="abc", customer_id="ws", session=replay, metrics=GraphMetrics(),
+                                 retry_policy=RetryPolicy(max_retries=0), single_flight=False)
+            run = []
+            for _ in range(10):
+                try:
+                    client.graph_query("ResourceSearch", {"phrase": "", "skip": 0, "limit": 5}, SEARCH["query"])
+                    run.append(True)
+                except GraphQueryError as e:
+                    self.assertEqual(e.status_code, 503)
+                    run.append(False)
+            outcomes.append(run)
+        self.assertEqual(outcomes[0], outcomes[1])
+        self.assertIn(False, outcomes[0])
+        self.assertIn(True, outcomes[0])
+
+    def test_unrecorded_requests_fail(self):
+        client = GraphCommon(URL, token="abc", customer_id="ws", session=ReplaySession([]),
+                             retry_policy=RetryPolicy(max_retries=0))
+        with self.assertRaises(GraphQueryError):
+            client.get_accounts()
+
+    def test_replaying_installs_the_shared_session(self):
+        original = get_shared_session(URL)
+        with replaying(URL, []) as replay:
+            self.assertIs(get_shared_session(URL), replay)
+        self.assertIs(get_shared_session(URL), original)
+
+
+if __name__ == "__main__":
+    unittest.main()
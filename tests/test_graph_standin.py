@@ -0,0 +1,156 @@
+import gzip
+import json
+import os
+import sys
+import unittest
+import urllib.request
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+from src.python.common.graph_common import GraphCommon, get_token_expiry
+from src.python.common.graph_metrics import GraphMetrics
+from src.python.common.resilience import GraphQueryError, RetryPolicy
+from graph_standin import StandInServer
+from graphql_lite import execute
+from synthetic_workspace import RESOURCE_TYPES, SyntheticWorkspace, build_resolvers
+
+
+class TestGraphQLLite(unittest.TestCase):
+    def test_aliases_arguments_and_directives(self):
+        resolvers = {"search": lambda arguments, context: {"totalCount": 2, "results": [
+            {"id": arguments["phrase"], "tags": [{"Key": "k"}]}, {"id": "b", "tags": []}]}}
+        document = 'query Q($p: String, $tags: Boolean!){found: search(phrase: $p){totalCount results{id ' \
+                   'tags @include(if: $tags){Key}}}}'
+        response = execute(document, resolvers, {"p": "a", "tags": False})
+        self.assertEqual({"data": {"found": {"totalCount": 2, "results": [{"id": "a"}, {"id": "b"}]}}}, response)
+
+    def test_unknown_field_is_an_error(self):
+        response = execute("query Q{nothing{id}}", {})
+        self.assertIsNone(response["data"]["nothing"])
+        self.assertIn("Cannot query field", response["errors"][0]["message"])
+
+    def test_syntax_error(self):
+        self.assertEqual("GRAPHQL_PARSE_FAILED", execute("query {", {})["errors"][0]["extensions"]["code"])
+
+
+class TestSyntheticWorkspace(unittest.TestCase):
+    def setUp(self):
+        self.workspace = SyntheticWorkspace(resources=1000000, accounts=5000, detections=500000)
+        self.resolvers = build_resolvers(self.workspace)
+
+    def test_resource_ids_round_trip(self):
+        for index in (0, 1, 11, 999999):
+            self.assertEqual(index, self.workspace.resource_index(self.workspace.resource_id(index)))
+        self.assertIsNone(self.workspace.resource_index("i-ffffffffffffffff"))
+
+    def test_search_pages_without_materializing(self):
+        filters = {"resource_type": "instance", "account_id": self.workspace.account_id(7)}
+        page = self.resolvers["search"]({"filters": filters, "skip": 10, "limit": 5}, None)
+        self.assertEqual(self.workspace.count("instance", 7), page["totalCount"])
+        self.assertEqual(5, len(page["results"]))
+        self.assertTrue(all(r["type"] == "instance" and r["account_id"] == filters["account_id"]
+                            for r in page["results"]))
+
+    def test_inventory_summary_adds_up(self):
+        summary = self.resolvers["inventorySummary"]({}, None)
+        self.assertEqual(len(RESOURCE_TYPES), len(summary))
+        self.assertEqual(1000000, sum(s["count"] for s in summary))
+
+    def test_detections_default_limit_and_id_filter(self):
+        self.assertEqual(100, len(self.resolvers["get_detections"]({"filters": {}}, None)["results"]))
+        detection = self.workspace.detection(1234)
+        found = self.resolvers["get_detections"]({"filters": {"_id": [detection["_id"]]}}, None)["results"]
+        self.assertEqual([detection], found)
+
+
+class TestStandInServer(unittest.TestCase):
+    def setUp(self):
+        self.workspace = SyntheticWorkspace(resources=2400, accounts=4, detections=300)
+        self.server = StandInServer(self.workspace).start()
+        self.addCleanup(self.server.stop)
+
+    def client(self, **kwargs):
+        kwargs.setdefault("metrics", GraphMetrics())
+        return GraphCommon(self.server.url, "me@example.com", "pw", **kwargs)
+
+    def test_login_and_workspace(self):
+        graph_client = self.client()
+        self.assertEqual(self.workspace.workspace_id, graph_client.customer_id)
+        self.assertIsNotNone(get_token_expiry(graph_client.token))
+
+    def test_requires_a_token(self):
+        request = urllib.request.Request(self.server.url, data=json.dumps(
+            {"operationName": "Accounts", "query": "query Accounts{accounts{cloud_account_id}}"}).encode())
+        with urllib.request.urlopen(request) as res:
+            self.assertEqual("UNAUTHENTICATED", json.loads(res.read())["errors"][0]["extensions"]["code"])
+
+    def test_search_pagination(self):
+        ids = self.client(page_fan_out=4).get_resources_by_type("instance", get_only_ids=True)
+        self.assertEqual(self.workspace.count("instance"), len(ids))
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_persisted_queries(self):
+        graph_client = self.client(persisted_queries=True)
+        graph_client.get_compliance_standards()
+        graph_client.get_compliance_standards()
+        self.assertEqual(1, len(self.server.persisted_queries.queries))
+        self.assertEqual(3, self.server.stats["Compliances"])
+
+    def test_gzipped_responses(self):
+        request = urllib.request.Request(self.server.url, headers={"Authorization": "t", "Accept-Encoding": "gzip"},
+                                         data=json.dumps({"query": "{rules{results{id name}}}"}).encode())
+        with urllib.request.urlopen(request) as res:
+            self.assertEqual("gzip", res.headers["Content-Encoding"])
+            self.assertEqual(len(self.workspace.rules), len(json.loads(gzip.decompress(res.read()))["data"]["rules"]
+                                                                ["results"]))
+
+    def test_rule_csv_streams_violations(self):
+        graph_client = self.client()
+        rule = self.workspace.rules[0]
+        document = {}
+        violations = list(graph_client.iter_csv_rule(rule["id"], document))
+        self.assertEqual(len(list(self.workspace.violating_indices(rule))), len(violations))
+        self.assertEqual(len(violations), document["data"]["ruleCsv"]["violation_count"])
+        self.assertEqual(len(violations), len(graph_client.get_rule_violations(rule["id"])))
+
+    def test_detections_enrichment(self):
+        graph_client = self.client()
+        detections = graph_client.get_detections(page_size=50)
+        self.assertEqual(300, len(detections))
+        enriched = graph_client.get_detections_enrichment([d["_id"] for d in detections[:10]])
+        self.assertEqual(10, len(enriched))
+
+    def test_configuration_and_cves(self):
+        graph_client = self.client()
+        instance = self.workspace.resource_id(0)
+        self.assertEqual(instance, graph_client.get_resource_configuration_by_id(instance)["InstanceId"])
+        cves = graph_client.get_cves()
+        self.assertEqual(self.workspace.cves, len(cves))
+        self.assertEqual(cves[0]["affected_resources_count"], len(graph_client.get_affected_resources(
+            cves[0]["cve_id"])))
+        # Severities are numbers, 4 (critical) to 1 (low), as the API's
+        self.assertEqual({1, 2, 3, 4}, {cve["severity"] for cve in cves})
+        critical = graph_client.get_cves(severity=4)
+        self.assertTrue(critical and all(cve["severity"] == 4 for cve in critical))
+
+    @patch("src.python.common.resilience.time.sleep")
+    def test_injected_errors_are_retried(self, sleep):
+        self.server.error_rate = 0.5
+        graph_client = self.client(retry_policy=RetryPolicy(max_retries=10, base_delay=0))
+        self.assertEqual(len(self.workspace.rules), len(graph_client.get_all_rules()))
+        self.assertGreater(self.server.stats["injected_errors"], 0)
+
+    def test_rate_limit_answers_429(self):
+        server = StandInServer(self.workspace, rate_limit=1).start()
+        self.addCleanup(server.stop)
+        graph_client = GraphCommon(server.url, token="t", customer_id="ws", metrics=GraphMetrics(),
+                                   retry_policy=RetryPolicy(max_retries=0))
+        with self.assertRaises(GraphQueryError):
+            for _ in range(3):
+                graph_client.get_compliance_standards()
+        self.assertGreater(server.stats["throttled"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import json
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.python.common.graph_common import GraphCommon
+from src.python.common.json_stream import iter_json_items
+from src.python.common.resilience import GraphQueryError
+
+URL = "https://env.streamsec.io/graphql"
+PATH = ("data", "ruleCsv", "violations")
+
+
+def _chunks(text, size):
+    data = text.encode()
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestIterJsonItems(unittest.TestCase):
+    def setUp(self):
+        self.violations = [{"resource_id": f"i-{i}", "tags": 'a "quoted" \\ tag ✓', "nested": {"x": [1, {"y": "]}"}]},
+                            "monthly_cost": i * 1.5, "vpc_id": None} for i in range(20)]
+        self.body = {"data": {"ruleCsv": {"rule_name": "Public", "violation_count": 20,
+                                          "violations": self.violations, "__typename": "RuleCsv"}}}
+
+    def test_yields_items_across_any_chunking(self):
+        text = json.dumps(self.body, ensure_ascii=False, indent=1)
+        for size in (1, 3, 7, 64, len(text)):
+            document = {}
+            self.assertEqual(list(iter_json_items(_chunks(text, size), PATH, document)), self.violations)
+            self.assertEqual(document, {"data": {"ruleCsv": {"rule_name": "Public", "violation_count": 20,
+                                                             "__typename": "RuleCsv"}}})
+
+    def test_is_lazy(self):
+        consumed = []
+
+        def chunks():
+            for chunk in _chunks(json.dumps(self.body), 16):
+                consumed.append(chunk)
+                yield chunk
+        items = iter_json_items(chunks(), PATH)
+        next(items)
+        self.assertLess(len(consumed), len(_chunks(json.dumps(self.body), 16)) / 2)
+
+    def test_errors_without_data(self):
+        document = {}
+        body = {"errors": [{"message": "boom"}], "data": None}
+        self.assertEqual(list(iter_json_items(_chunks(json.dumps(body), 5), PATH, document)), [])
+        self.assertEqual(document, body)
+
+    def test_empty_array(self):
+        self.assertEqual(list(iter_json_items([b'{"data": {"ruleCsv": {"violations": [ ]}}}'], PATH)), [])
+
+    def test_truncated_stream_raises(self):
+        text = json.dumps(self.body)[:-40]
+        with self.assertRaises(ValueError):
+            list(iter_json_items(_chunks(text, 50), PATH))
+
+
+class TestGraphCommonStreamQuery(unittest.TestCase):
+    def setUp(self):
+        self.session = MagicMock()
+        self.client = GraphCommon(URL, token="abc", customer_id="ws", session=self.session)
+
+    def _stream(self, body):
+        res = MagicMock()
+        res.__bool__.return_value = True
+        res.iter_content.return_value = _chunks(json.dumps(body), 10)
+        return res
+
+    def test_iter_csv_rule_streams_violations(self):
+        self.session.post.return_value = self._stream(
+            {"data": {"ruleCsv": {"rule_name": "Public", "violations": [{"resource_id": "i-1"}]}}})
+        document = {}
+
+        self.assertEqual(list(self.client.iter_csv_rule("rule", document)), [{"resource_id": "i-1"}])
+        self.assertEqual(document["data"]["ruleCsv"]["rule_name"], "Public")
+        self.assertTrue(self.session.post.call_args[1]["stream"])
+        self.session.post.return_value.close.assert_called_once()
+
+    def test_errors_raise(self):
+        self.session.post.return_value = self._stream({"errors": [{"message": "Rule not found"}], "data": None})
+        with self.assertRaisesRegex(Exception, "Rule not found"):
+            list(self.client.iter_csv_rule("rule"))
+
+    def test_errors_after_items_raise(self):
+        self.session.post.return_value = self._stream(
+            {"data": {"ruleCsv": {"violations": [{"resource_id": "i-1"}]}}, "errors": [{"message": "Timed out"}]})
+        violations = self.client.iter_csv_rule("rule")
+        self.assertEqual({"resource_id": "i-1"}, next(violations))
+        with self.assertRaisesRegex(GraphQueryError, "Timed out"):
+            next(violations)
+        self.assertEqual(1, self.session.post.call_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
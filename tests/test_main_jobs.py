@@ -0,0 +1,287 @@
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import ANY, MagicMock, patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.chdir(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from fastapi.testclient import TestClient
+
+import main
+from src.python.common.csv_stream import CsvExport
+
+PAYLOAD = {"environment_sub_domain": "demo", "environment_user_name": "me@example.com",
+           "environment_password": "pw", "ws_name": "ws", "resource_type": "instance"}
+
+
+def _report(content="id\ni-1\n", error=None):
+    def write(*args, output=None, **kwargs):
+        if error:
+            raise error
+        path = os.path.join(output, "DEMO inventory.csv")
+        with open(path, "w") as file:
+            file.write(content)
+        report.paths.append(path)
+        return path
+    report = MagicMock(side_effect=write)
+    report.paths = []
+    return report
+
+
+def _client(test):
+    """ A client of a started app, running the reports in threads and keeping their results in a temp directory. """
+    # MagicMock reports can't be pickled into worker processes
+    pool = main.ReportPool(threads=4, processes=0, limits={}, default_limit=2)
+    cache_dir = tempfile.mkdtemp()
+    results = main.ResultCache(cache_dir)
+    for patcher in (patch.object(main, "ReportPool", return_value=pool),
+                    patch.object(main, "ResultCache", return_value=results)):
+        patcher.start()
+        test.addCleanup(patcher.stop)
+    test.addCleanup(shutil.rmtree, cache_dir, True)
+    client = TestClient(main.create_app())
+    client.__enter__()
+    test.addCleanup(client.__exit__, None, None, None)
+    return client
+
+
+class TestAppSetup(unittest.TestCase):
+    def test_importing_starts_nothing(self):
+        # The report pool's worker processes import main again
+        code = "import threading, main; print(main.pool, main.jobs, main.results, threading.active_count())"
+        res = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        self.assertEqual("None None None 1", res.stdout.strip())
+
+    def test_started_by_the_app(self):
+        with patch.object(main, "ReportPool") as pool, patch.object(main, "JobQueue") as jobs, \
+                TestClient(main.create_app()) as client:
+            self.assertEqual(200, client.get("/metrics").status_code)
+            self.assertIs(pool.return_value, main.pool)
+        pool.return_value.shutdown.assert_called_once()
+        jobs.return_value.shutdown.assert_called_once()
+
+
+class TestJobEndpoints(unittest.TestCase):
+    def setUp(self):
+        self.client = _client(self)
+
+    def wait(self, job_id):
+        for _ in range(100):
+            status = self.client.get(f"/jobs/{job_id}").json()
+            if status["status"] not in ("queued", "running"):
+                return status
+            time.sleep(0.05)
+        self.fail("Job didn't finish")
+
+    def test_submit_poll_and_fetch(self):
+        report = _report()
+        with patch.dict(main.REPORTS, generate_export_inventory=main.REPORTS["generate_export_inventory"]._replace(
+                main=report)):
+            res = self.client.post("/jobs/generate_export_inventory", json=PAYLOAD)
+            self.assertEqual(202, res.status_code)
+            status = self.wait(res.json()["job_id"])
+            self.assertEqual("succeeded", status["status"])
+            artifact = self.client.get(f"/jobs/{status['job_id']}/artifact")
+        self.assertEqual("id\ni-1\n", artifact.text)
+        self.assertIn("DEMO inventory.csv", artifact.headers["content-disposition"])
+        report.assert_called_once_with("demo", "me@example.com", "pw", None, "ws", "instance", None, None,
+                                       output=ANY)
+        progress = self.client.get(f"/jobs/{status['job_id']}/progress").json()
+        self.assertEqual("succeeded", progress["status"])
+
+    def test_failed_job_artifact_reports_the_error(self):
+        detections = main.REPORTS["export_detections"]._replace(main=_report(error=ValueError("bad dates")))
+        with patch.dict(main.REPORTS, export_detections=detections):
+            payload = dict(PAYLOAD, start_time="2024-01-02", end_time="2024-01-01")
+            job_id = self.client.post("/jobs/export_detections", json=payload).json()["job_id"]
+            self.assertEqual("failed", self.wait(job_id)["status"])
+            res = self.client.get(f"/jobs/{job_id}/artifact")
+        self.assertEqual((400, "bad dates"), (res.status_code, res.json()["detail"]))
+
+    def test_unknown_report_and_job(self):
+        self.assertEqual(404, self.client.post("/jobs/nothing", json=PAYLOAD).status_code)
+        self.assertEqual(404, self.client.get("/jobs/nothing").status_code)
+
+    def test_sync_endpoint_still_returns_the_file(self):
+        report = _report()
+        with patch.dict(main.REPORTS, generate_compliance_report=main.REPORTS["generate_compliance_report"]._replace(
+                main=report)):
+            res = self.client.post("/generate_compliance_report", json=dict(PAYLOAD, compliance_standard="CIS"))
+        self.assertEqual((200, "id\ni-1\n"), (res.status_code, res.text))
+        # Written in a directory of its own, removed once sent
+        self.assertFalse(os.path.exists(os.path.dirname(report.paths[0])))
+
+    def test_concurrent_requests_write_to_their_own_directories(self):
+        release = threading.Event()
+        report = _report()
+        blocking = MagicMock(side_effect=lambda *args, **kwargs: release.wait(5) and report(*args, **kwargs))
+        compliance = main.REPORTS["generate_compliance_report"]._replace(main=blocking)
+        with patch.dict(main.REPORTS, generate_compliance_report=compliance):
+            payload = dict(PAYLOAD, compliance_standard="CIS")
+            requests = [threading.Thread(target=self.client.post, args=("/generate_compliance_report",),
+                                         kwargs={"json": dict(payload, force_refresh=True)}) for _ in range(2)]
+            for request in requests:
+                request.start()
+            time.sleep(0.2)
+            release.set()
+            for request in requests:
+                request.join(5)
+        outputs = {call.kwargs["output"] for call in blocking.call_args_list}
+        self.assertEqual(2, len(outputs))
+
+
+class TestStreamingEndpoints(unittest.TestCase):
+    def setUp(self):
+        self.client = _client(self)
+        self.pool = main.pool
+
+    def post(self, rows, headers=None, name="generate_export_inventory", payload=PAYLOAD):
+        with patch.dict(main.REPORTS, **{name: main.REPORTS[name]._replace(rows=rows, main=MagicMock())}):
+            return self.client.post(f"/{name}", json=payload, headers=headers)
+
+    def test_csv_is_streamed_from_the_rows(self):
+        rows = MagicMock(return_value=CsvExport("DEMO inventory.csv", ["id", "name"],
+                                                iter([{"id": "i-1", "name": "a"}, {"id": "i-2"}])))
+        res = self.post(rows, headers={"Accept-Encoding": "identity"})
+        self.assertEqual((200, "id,name\r\ni-1,a\r\ni-2,\r\n"), (res.status_code, res.text))
+        self.assertEqual("text/csv", res.headers["content-type"])
+        self.assertIn("DEMO inventory.csv", res.headers["content-disposition"])
+        self.assertNotIn("content-encoding", res.headers)
+        rows.assert_called_once_with("demo", "me@example.com", "pw", None, "ws", "instance", None, None)
+
+    def test_gzip_when_accepted(self):
+        rows = MagicMock(return_value=CsvExport("DEMO inventory.csv", ["id"], ([f"i-{i}"] for i in range(1000))))
+        res = self.post(rows, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual("gzip", res.headers["content-encoding"])
+        self.assertEqual("id\r\n" + "".join(f"i-{i}\r\n" for i in range(1000)), res.text)
+
+    def test_errors_before_the_rows_keep_their_status(self):
+        rows = MagicMock(side_effect=ValueError("bad dates"))
+        payload = dict(PAYLOAD, start_time="2024-01-02", end_time="2024-01-01")
+        res = self.post(rows, name="export_detections", payload=payload)
+        self.assertEqual((400, "bad dates"), (res.status_code, res.json()["detail"]))
+        self.assertEqual(0, self.pool.limit("export_detections").running)
+
+    def test_slot_is_held_until_the_rows_are_sent(self):
+        rows = MagicMock(return_value=CsvExport("DEMO inventory.csv", ["id"], iter([["i-1"]])))
+        self.post(rows)
+        self.assertEqual(0, self.pool.limit("generate_export_inventory").running)
+
+    def test_slot_is_released_when_the_client_leaves_before_the_rows(self):
+        rows = MagicMock(return_value=CsvExport("DEMO inventory.csv", ["id"], iter([["i-1"]])))
+        report = main.REPORTS["generate_export_inventory"]._replace(rows=rows)
+        limit = self.pool.limit("generate_export_inventory")
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            # The client is gone before the headers are sent, so the body is never read
+            await asyncio.sleep(60)
+
+        async def respond():
+            response = await main._stream_report("generate_export_inventory", report, [], {}, MagicMock(headers={}),
+                                                 main.result_key("generate_export_inventory", PAYLOAD))
+            self.assertEqual(1, limit.running)
+            await response({"type": "http"}, receive, send)
+        asyncio.run(respond())
+        self.assertEqual(0, limit.running)
+        self.assertEqual([], os.listdir(main.results.directory))
+
+
+class TestCachedResults(unittest.TestCase):
+    def setUp(self):
+        self.client = _client(self)
+        patcher = patch.object(main, "_login")
+        self.login = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, rows, payload):
+        report = main.REPORTS["generate_export_inventory"]._replace(rows=rows)
+        with patch.dict(main.REPORTS, generate_export_inventory=report):
+            return self.client.post("/generate_export_inventory", json=payload)
+
+    def test_identical_requests_are_served_from_the_cache(self):
+        rows = MagicMock(side_effect=lambda *args: CsvExport("DEMO inventory.csv", ["id"], iter([["i-1"]])))
+        first = self.post(rows, PAYLOAD)
+        # Other credentials, same report: served from the cache once they could log in to the workspace
+        second = self.post(rows, dict(PAYLOAD, environment_user_name="you@example.com"))
+        self.assertEqual(first.text, second.text)
+        self.assertIn("DEMO inventory.csv", second.headers["content-disposition"])
+        self.assertEqual(1, rows.call_count)
+        self.login.assert_called_once_with(dict(PAYLOAD, environment_user_name="you@example.com"))
+        # Another workspace, or force_refresh, runs the report again
+        self.post(rows, dict(PAYLOAD, ws_name="other"))
+        self.post(rows, dict(PAYLOAD, force_refresh=True))
+        self.assertEqual(3, rows.call_count)
+
+    def test_cached_results_are_sent_even_if_removed_meanwhile(self):
+        rows = MagicMock(side_effect=lambda *args: CsvExport("DEMO inventory.csv", ["id"], iter([["i-1"]])))
+        first = self.post(rows, PAYLOAD)
+        report = main.REPORTS["generate_export_inventory"]
+
+        async def respond():
+            _, response = await main._cached_result("generate_export_inventory", report, PAYLOAD,
+                                                    MagicMock(headers={}))
+            # Removed before it's sent, e.g. by another process sharing the cache directory
+            shutil.rmtree(main.results.directory)
+            return b"".join([chunk async for chunk in response.body_iterator])
+        self.assertEqual(first.content, asyncio.run(respond()))
+
+    def test_requesters_who_cant_log_in_get_nothing(self):
+        rows = MagicMock(side_effect=lambda *args: CsvExport("DEMO inventory.csv", ["id"], iter([["i-1"]])))
+        self.post(rows, PAYLOAD)
+        self.login.side_effect = Exception("Can't find WS")
+        res = self.post(rows, dict(PAYLOAD, environment_password="wrong"))
+        self.assertEqual((500, "Can't find WS"), (res.status_code, res.json()["detail"]))
+
+    def test_failed_streams_are_not_cached(self):
+        def failing():
+            yield ["i-1"]
+            raise RuntimeError("API down")
+        rows = MagicMock(side_effect=lambda *args: CsvExport("DEMO inventory.csv", ["id"], failing()))
+        with self.assertRaises(RuntimeError):
+            self.post(rows, PAYLOAD)
+        self.assertEqual([], main.results.entries())
+
+    def test_file_reports_are_kept(self):
+        report = _report()
+        compliance = main.REPORTS["generate_compliance_report"]._replace(main=report)
+        payload = dict(PAYLOAD, compliance_standard="CIS")
+        with patch.dict(main.REPORTS, generate_compliance_report=compliance):
+            first, second = (self.client.post("/generate_compliance_report", json=payload) for _ in range(2))
+        self.assertEqual((200, 200), (first.status_code, second.status_code))
+        self.assertEqual(first.text, second.text)
+        report.assert_called_once()
+
+
+class TestEventLoopStaysFree(unittest.TestCase):
+    def test_other_requests_are_served_while_a_report_runs(self):
+        client = _client(self)
+        release = threading.Event()
+        report = _report()
+        blocking = MagicMock(side_effect=lambda *args, **kwargs: release.wait(5) and report(*args, **kwargs))
+        compliance = main.REPORTS["generate_compliance_report"]._replace(main=blocking)
+        with patch.dict(main.REPORTS, generate_compliance_report=compliance):
+            responses = []
+            request = threading.Thread(target=lambda: responses.append(client.post(
+                "/generate_compliance_report", json=dict(PAYLOAD, compliance_standard="CIS"))))
+            request.start()
+            try:
+                # Served by the same event loop while the report is still blocked
+                self.assertEqual(200, client.get("/metrics").status_code)
+                self.assertTrue(request.is_alive())
+            finally:
+                release.set()
+                request.join(5)
+        self.assertEqual((200, "id\ni-1\n"), (responses[0].status_code, responses[0].text))
+
+
+if __name__ == '__main__':
+    unittest.main()
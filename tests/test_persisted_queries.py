@@ -0,0 +1,88 @@
+import json
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.python.common.graph_common import ACCOUNTS_QUERY, GraphCommon
+from src.python.common.persisted_queries import (
+    PERSISTED_QUERY_NOT_FOUND, PERSISTED_QUERY_NOT_SUPPORTED, PersistedQueryStore, persisted_query_error,
+    persisted_query_hash,
+)
+from helpers import graph_response
+
+URL = "https://env.streamsec.io/graphql"
+
+
+class FakeAPQServer:
+    """ Answers every query with an empty accounts list, resolving persisted queries like Apollo Server. """
+
+    def __init__(self, supported=True):
+        self.store = PersistedQueryStore()
+        self.supported = supported
+        self.payloads = []
+
+    def post(self, url, json=None, headers=None, **kwargs):
+        self.payloads.append(json)
+        if not self.supported and "query" not in json:
+            return graph_response({"errors": [{"message": PERSISTED_QUERY_NOT_SUPPORTED}]})
+        query, error = self.store.resolve(json)
+        return graph_response(error or {"data": {"accounts": [], "query": query}})
+
+
+class TestPersistedQueryStore(unittest.TestCase):
+    def test_registers_then_resolves_by_hash(self):
+        store = PersistedQueryStore()
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": persisted_query_hash("{a}")}}
+        query, error = store.resolve({"extensions": extensions})
+        self.assertIsNone(query)
+        self.assertEqual(persisted_query_error(error), PERSISTED_QUERY_NOT_FOUND)
+        self.assertEqual(store.resolve({"query": "{a}", "extensions": extensions}), ("{a}", None))
+        self.assertEqual(store.resolve({"extensions": extensions}), ("{a}", None))
+
+    def test_rejects_mismatched_hash(self):
+        store = PersistedQueryStore()
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": persisted_query_hash("{b}")}}
+        query, error = store.resolve({"query": "{a}", "extensions": extensions})
+        self.assertIsNone(query)
+        self.assertIsNone(persisted_query_error(error))
+        self.assertIn("errors", error)
+
+    def test_error_detected_by_code(self):
+        response = {"errors": [{"message": "x", "extensions": {"code": "PERSISTED_QUERY_NOT_FOUND"}}]}
+        self.assertEqual(persisted_query_error(response), PERSISTED_QUERY_NOT_FOUND)
+        self.assertIsNone(persisted_query_error({"data": {}}))
+
+
+class TestGraphCommonPersistedQueries(unittest.TestCase):
+    def test_falls_back_once_then_sends_the_hash_only(self):
+        server = FakeAPQServer()
+        client = GraphCommon(URL, token="abc", customer_id="ws", session=server, persisted_queries=True)
+        self.assertEqual(client.get_accounts(), [])
+        self.assertEqual(client.get_accounts(), [])
+        first, fallback, second = server.payloads
+        self.assertNotIn("query", first)
+        self.assertEqual(first["extensions"]["persistedQuery"]["sha256Hash"], persisted_query_hash(ACCOUNTS_QUERY))
+        self.assertEqual(fallback["query"], ACCOUNTS_QUERY)
+        self.assertNotIn("query", second)
+
+    def test_unsupported_server_turns_it_off(self):
+        server = FakeAPQServer(supported=False)
+        client = GraphCommon(URL, token="abc", customer_id="ws", session=server, persisted_queries=True)
+        client.get_accounts()
+        client.get_accounts()
+        self.assertFalse(client.persisted_queries)
+        self.assertEqual(len(server.payloads), 3)
+        self.assertTrue(all("query" in payload for payload in server.payloads[1:]))
+
+    def test_mutations_and_default_send_the_full_text(self):
+        server = FakeAPQServer()
+        client = GraphCommon(URL, token="abc", customer_id="ws", session=server, persisted_queries=True)
+        client.graph_query("DeleteKubernetes", {"id": "k"}, "mutation DeleteKubernetes($id: ID!){x}")
+        client = GraphCommon(URL, token="abc", customer_id="ws", session=server)
+        client.get_accounts()
+        self.assertTrue(all("query" in payload and "extensions" not in payload for payload in server.payloads))
+
+
+if __name__ == "__main__":
+    unittest.main()
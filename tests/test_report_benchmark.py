@@ -0,0 +1,70 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+from report_benchmark import CASES, compare_to_baseline, count_rows, workspace_for
+
+
+def _result(wall_time=10.0, peak_rss_mb=100.0, api_calls=50, rows=10, error=None):
+    return {"wall_time": wall_time, "peak_rss_mb": peak_rss_mb, "api_calls": api_calls, "rows": rows, "error_logs": 0,
+            "error": error}
+
+
+class TestCompareToBaseline(unittest.TestCase):
+    def test_within_tolerance(self):
+        baseline = {"export_inventory@1000": _result()}
+        self.assertEqual([], compare_to_baseline({"export_inventory@1000": _result(wall_time=12.0)}, baseline))
+
+    def test_flags_each_metric(self):
+        baseline = {"export_inventory@1000": _result()}
+        regressions = compare_to_baseline(
+            {"export_inventory@1000": _result(wall_time=20.0, peak_rss_mb=200.0, api_calls=51)}, baseline)
+        self.assertEqual(3, len(regressions))
+        self.assertTrue(all(r.startswith("export_inventory@1000") for r in regressions))
+
+    def test_ignores_noise_on_small_values(self):
+        baseline = {"export_inventory@1000": _result(wall_time=0.2, peak_rss_mb=30.0)}
+        self.assertEqual([], compare_to_baseline(
+            {"export_inventory@1000": _result(wall_time=0.4, peak_rss_mb=38.0)}, baseline))
+
+    def test_new_failures_and_cases(self):
+        baseline = {"export_inventory@1000": _result()}
+        results = {"export_inventory@1000": _result(error="boom"), "export_detections@1000": _result(wall_time=99)}
+        self.assertEqual(["export_inventory@1000: failed with boom"], compare_to_baseline(results, baseline))
+
+
+    def test_changed_rows(self):
+        baseline = {"export_inventory@1000": _result()}
+        self.assertEqual(["export_inventory@1000: rows 10 -> 0"],
+                         compare_to_baseline({"export_inventory@1000": _result(rows=0)}, baseline))
+
+
+class TestCountRows(unittest.TestCase):
+    def test_csv(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "report.csv")
+            with open(path, "w") as file:
+                file.write('a,b\n1,"multi\nline"\n2,3\n')
+            self.assertEqual(2, count_rows(path))
+            with open(path, "w") as file:
+                file.write("a,b\n")
+            self.assertEqual(0, count_rows(path))
+
+
+class TestWorkspaceFor(unittest.TestCase):
+    def test_sizes(self):
+        workspace = workspace_for(1000000)
+        self.assertEqual((1000000, 1000000, 5000), (workspace.resources, workspace.detections, workspace.accounts))
+        self.assertEqual(1, workspace_for(10).accounts)
+
+    def test_cases_are_importable(self):
+        import importlib
+        for module, _ in CASES.values():
+            self.assertTrue(callable(importlib.import_module(module).main))
+
+
+if __name__ == '__main__':
+    unittest.main()
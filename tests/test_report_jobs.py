@@ -0,0 +1,100 @@
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.python.common.report_jobs import FAILED, SUCCEEDED, JobQueue, submission_key
+from src.python.common.report_pool import ReportPool
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+        self.queue = JobQueue(max_workers=2, retention=60, artifact_dir=os.path.join(self.workdir, "artifacts"),
+                              logger_name="test_report_jobs")
+        self.addCleanup(self.queue.shutdown)
+        logging.getLogger("test_report_jobs").setLevel(logging.INFO)
+
+    def report(self, name="report.csv", release=None):
+        def main(*args, output=None):
+            logging.getLogger("test_report_jobs").info(f"Writing {name}")
+            if release is not None:
+                release.wait(5)
+            path = os.path.join(output, name)
+            with open(path, "w") as file:
+                file.write(",".join(map(str, args)))
+            return path
+        return main
+
+    def test_runs_and_keeps_the_artifact(self):
+        job = self.queue.submit("export", "k", self.report(), 1, 2)
+        self.assertTrue(job.done.wait(5))
+        self.assertEqual(SUCCEEDED, job.status)
+        self.assertEqual("report.csv", job.file_name)
+        with open(job.artifact) as artifact:
+            self.assertEqual("1,2", artifact.read())
+        self.assertEqual(os.path.join(self.workdir, "artifacts", job.id, "report.csv"), job.artifact)
+        self.assertEqual(["Writing report.csv"], job.progress)
+        self.assertIs(job, self.queue.get(job.id))
+
+    def test_progress_of_a_report_run_in_the_pool(self):
+        pool = ReportPool(threads=2, processes=0, limits={})
+        self.addCleanup(pool.shutdown)
+        job = self.queue.submit("export", "k", pool.call, "export", self.report())
+        self.assertTrue(job.done.wait(5))
+        self.assertEqual(SUCCEEDED, job.status)
+        self.assertEqual(["Writing report.csv"], job.progress)
+        self.assertEqual(1, job.log_lines)
+
+    def test_identical_submissions_share_a_job(self):
+        release = threading.Event()
+        first = self.queue.submit("export", "k", self.report(release=release))
+        second = self.queue.submit("export", "k", self.report(release=release))
+        other = self.queue.submit("export", "other", self.report("other.csv", release=release))
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+        release.set()
+        self.assertTrue(first.done.wait(5) and other.done.wait(5))
+        # Once finished, the same submission runs again
+        self.assertIsNot(first, self.queue.submit("export", "k", self.report()))
+
+    def test_concurrent_jobs_of_the_same_report_dont_collide(self):
+        release = threading.Event()
+        jobs = [self.queue.submit("export", key, self.report(release=release), key) for key in ("a", "b")]
+        release.set()
+        for job in jobs:
+            self.assertTrue(job.done.wait(5))
+            with open(job.artifact) as artifact:
+                self.assertEqual(job.key, artifact.read())
+
+    def test_failures_are_kept(self):
+        def main(output=None):
+            raise ValueError("bad date")
+        job = self.queue.submit("export", "k", main)
+        self.assertTrue(job.done.wait(5))
+        self.assertEqual((FAILED, "bad date"), (job.status, job.error))
+        self.assertIsInstance(job.exception, ValueError)
+
+    def test_expired_jobs_are_purged(self):
+        job = self.queue.submit("export", "k", self.report())
+        self.assertTrue(job.done.wait(5))
+        with patch("src.python.common.report_jobs.time.time", return_value=job.finished + 61):
+            self.assertIsNone(self.queue.get(job.id))
+        self.assertFalse(os.path.exists(os.path.dirname(job.artifact)))
+
+
+class TestSubmissionKey(unittest.TestCase):
+    def test_canonical(self):
+        self.assertEqual(submission_key("a", {"x": 1, "y": 2}), submission_key("a", {"y": 2, "x": 1}))
+        self.assertNotEqual(submission_key("a", {"x": 1}), submission_key("b", {"x": 1}))
+        self.assertNotEqual(submission_key("a", {"password": "1"}), submission_key("a", {"password": "2"}))
+
+
+if __name__ == '__main__':
+    unittest.main()
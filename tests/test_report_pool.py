@@ -0,0 +1,105 @@
+import asyncio
+import os
+import sys
+import threading
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.python.common.report_pool import EndpointLimit, ReportPool, parse_limits
+
+
+class TestParseLimits(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual({"a": 1, "b": 3}, parse_limits(" a=1, b=3 ,"))
+        self.assertEqual({}, parse_limits(None))
+        for invalid in ("a", "a=0", "a=x"):
+            with self.assertRaises(ValueError):
+                parse_limits(invalid)
+
+
+class TestEndpointLimit(unittest.TestCase):
+    def test_waiters_get_the_slots_in_order(self):
+        limit = EndpointLimit(1)
+        first, second, third = limit.acquire(), limit.acquire(), limit.acquire()
+        self.assertTrue(first.done())
+        self.assertFalse(second.done() or third.done())
+        second.cancel()
+        self.assertEqual(1, limit.waiting)
+        limit.release()
+        self.assertTrue(third.done())
+        limit.release()
+        self.assertEqual(0, limit.running)
+
+    def test_cancelled_async_waiter_gives_up_its_place(self):
+        limit = EndpointLimit(1)
+        limit.acquire()
+
+        async def wait():
+            task = asyncio.ensure_future(limit.acquire_async())
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        asyncio.run(wait())
+        limit.release()
+        self.assertEqual((0, 0), (limit.running, limit.waiting))
+
+
+class TestReportPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = ReportPool(threads=4, processes=0, limits={"capped": 1}, default_limit=3)
+        self.addCleanup(self.pool.shutdown)
+
+    def peak_concurrency(self, endpoint, runs):
+        lock, active, peak = threading.Lock(), [0], [0]
+        release = threading.Event()
+
+        def report(i):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            release.wait(0.1)
+            with lock:
+                active[0] -= 1
+            return i
+
+        async def run_all():
+            return await asyncio.gather(*(self.pool.run(endpoint, report, i) for i in range(runs)))
+        self.assertEqual(list(range(runs)), asyncio.run(run_all()))
+        return peak[0]
+
+    def test_endpoint_caps(self):
+        self.assertEqual(1, self.peak_concurrency("capped", 3))
+        self.assertEqual(3, self.peak_concurrency("other", 4))
+        self.assertEqual(0, self.pool.limit("capped").running)
+
+    def test_call_from_a_thread(self):
+        self.assertEqual(5, self.pool.call("capped", lambda a, b=0: a + b, 2, b=3))
+        with self.assertRaises(ZeroDivisionError):
+            self.pool.call("capped", lambda: 1 / 0)
+        self.assertEqual(0, self.pool.limit("capped").running)
+        self.assertEqual(threading.get_ident(), self.pool.call("capped", threading.get_ident))
+
+    def test_iterate_runs_the_iterator_in_the_pool(self):
+        closed = []
+
+        def items():
+            for _ in range(3):
+                yield threading.current_thread().name
+
+        async def collect():
+            return [item async for item in self.pool.iterate(items(), lambda: closed.append(True))]
+        names = asyncio.run(collect())
+        self.assertEqual(3, len(names))
+        self.assertTrue(all(name.startswith("report") for name in names))
+        self.assertEqual([True], closed)
+
+    def test_cpu_bound_runs_in_a_process(self):
+        pool = ReportPool(threads=1, processes=1, limits={})
+        self.addCleanup(pool.shutdown)
+        self.assertNotEqual(os.getpid(), pool.call("compliance", os.getpid, cpu_bound=True))
+        self.assertEqual(os.getpid(), pool.call("compliance", os.getpid))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.python.common.graph_common import GraphCommon
+from src.python.common.resilience import (
+    CircuitBreaker, CircuitOpenError, GraphQueryError, RetryPolicy, parse_retry_after,
+)
+from helpers import graph_response
+
+URL = "https://env.streamsec.io/graphql"
+QUERY = "query Accounts{accounts{_id}}"
+ACCOUNTS = {"data": {"accounts": []}}
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_full_jitter_is_bounded(self):
+        policy = RetryPolicy(base_delay=1, max_delay=5)
+        for attempt in range(6):
+            self.assertLessEqual(policy.delay(attempt), min(5, 2 ** attempt))
+
+    def test_retry_after_wins(self):
+        self.assertEqual(RetryPolicy().delay(0, retry_after=7), 7)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("3"), 3)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_threshold_and_fails_fast(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+        self.assertRaises(CircuitOpenError, breaker.before_call)
+        self.assertEqual(breaker.stats(), {"state": "open", "failures": 2, "opened": 1, "rejected": 1})
+
+    @patch("src.python.common.resilience.time.monotonic")
+    def test_half_open_trial(self, monotonic):
+        monotonic.return_value = 0
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        monotonic.return_value = 31
+        breaker.before_call()
+        self.assertRaises(CircuitOpenError, breaker.before_call)
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        breaker.before_call()
+
+    def test_neutral_answers_keep_the_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0)
+        breaker.record_failure()
+        breaker.record_neutral()
+        self.assertEqual(1, breaker.failures)
+        breaker.record_failure()
+        # A throttled trial request neither closes nor reopens the circuit, the next request is the trial
+        breaker.before_call()
+        breaker.record_neutral()
+        self.assertEqual("half_open", breaker.state)
+        breaker.before_call()
+
+
+@patch("src.python.common.graph_common.time.sleep")
+class TestGraphCommonRetries(unittest.TestCase):
+    def setUp(self):
+        self.session = MagicMock()
+        self.client = GraphCommon(URL, token="abc", customer_id="ws", session=self.session,
+                                  retry_policy=RetryPolicy(max_retries=3), breaker=CircuitBreaker(3))
+
+    def test_transient_errors_are_retried(self, sleep):
+        self.session.post.side_effect = [graph_response(ACCOUNTS, 502), requests.ConnectionError("reset"),
+                                         graph_response(ACCOUNTS, 429, {"Retry-After": "2"}),
+                                         graph_response(ACCOUNTS)]
+        self.assertEqual(self.client.get_accounts(), [])
+        self.assertEqual(self.client.retries, {"Accounts": 3})
+        self.assertEqual(sleep.call_args_list[-1].args, (2,))
+
+    def test_raises_instead_of_returning_none(self, sleep):
+        self.client.breaker = None
+        self.session.post.return_value = graph_response(ACCOUNTS, 503)
+        with self.assertRaises(GraphQueryError) as ctx:
+            self.client.graph_query("Accounts", {}, QUERY)
+        self.assertEqual(ctx.exception.status_code, 503)
+        self.assertEqual(self.session.post.call_count, 4)
+
+    def test_client_errors_are_not_retried(self, sleep):
+        self.session.post.return_value = graph_response({"errors": [{"message": "bad query"}]}, 400)
+        self.assertRaises(GraphQueryError, self.client.graph_query, "Accounts", {}, QUERY)
+        self.assertEqual(self.session.post.call_count, 1)
+        self.assertEqual(self.client.breaker.state, "closed")
+
+    def test_mutations_are_not_retried(self, sleep):
+        self.session.post.return_value = graph_response(ACCOUNTS, 502)
+        self.assertRaises(GraphQueryError, self.client.graph_query, "DeleteKubernetes", {"id": "k"},
+                          "mutation DeleteKubernetes($id: ID!){deleteKubernetes(id: $id)}")
+        self.assertEqual(self.session.post.call_count, 1)
+
+    def test_breaker_fails_fast_while_the_api_is_down(self, sleep):
+        self.session.post.return_value = graph_response(ACCOUNTS, 500)
+        self.assertRaises(GraphQueryError, self.client.graph_query, "Accounts", {}, QUERY)
+        self.assertRaises(CircuitOpenError, self.client.graph_query, "Accounts", {"other": 1}, QUERY)
+        self.assertEqual(self.session.post.call_count, 3)
+        self.assertEqual(self.client.breaker.state, "open")
+
+    def test_throttling_does_not_reset_the_breaker(self, sleep):
+        self.client.retry_policy = RetryPolicy(max_retries=0)
+        self.session.post.side_effect = [graph_response(ACCOUNTS, 500), graph_response(ACCOUNTS, 500),
+                                         graph_response(ACCOUNTS, 429), graph_response(ACCOUNTS, 500)]
+        for _ in range(4):
+            self.assertRaises(GraphQueryError, self.client.graph_query, "Accounts", {}, QUERY)
+        self.assertEqual(self.client.breaker.state, "open")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.python.common.result_cache import ResultCache, result_key
+
+
+class TestResultKey(unittest.TestCase):
+    def test_credentials_are_excluded_and_the_workspace_included(self):
+        payload = {"environment_sub_domain": "demo", "ws_name": "ws", "period": "day",
+                   "environment_user_name": "me", "environment_password": "pw"}
+        same = dict(payload, environment_user_name="you", environment_password="other", token="t", force_refresh=True)
+        self.assertEqual(result_key("cost", payload), result_key("cost", dict(reversed(list(same.items())))))
+        self.assertNotEqual(result_key("cost", payload), result_key("cost", dict(payload, ws_name="other")))
+        self.assertNotEqual(result_key("cost", payload), result_key("eks", payload))
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.cache = ResultCache(os.path.join(self.directory, "cache"), max_bytes=25)
+
+    def report(self, content=b"0123456789", name="report.csv"):
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as file:
+            file.write(content)
+        return path
+
+    def test_put_and_get(self):
+        self.assertIsNone(self.cache.get("k", 60))
+        path = self.cache.put("k", self.report())
+        self.assertEqual("report.csv", os.path.basename(path))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "report.csv")))
+        self.assertEqual(path, self.cache.get("k", 60))
+
+    def test_stale_results_are_removed(self):
+        path = self.cache.put("k", self.report())
+        os.utime(path, (time.time(), time.time() - 61))
+        self.assertIsNone(self.cache.get("k", 60))
+        self.assertEqual([], self.cache.entries())
+
+    def test_least_recently_used_are_evicted(self):
+        first = self.cache.put("a", self.report())
+        self.cache.put("b", self.report())
+        os.utime(first, (time.time() - 10, os.stat(first).st_mtime))
+        self.cache.get("b", 60)
+        self.cache.put("c", self.report())
+        self.assertIsNone(self.cache.get("a", 60))
+        self.assertIsNotNone(self.cache.get("b", 60))
+        self.assertIsNotNone(self.cache.get("c", 60))
+
+    def test_results_being_read_are_not_evicted(self):
+        first = self.cache.put("a", self.report())
+        reader = self.cache.read("a", 60)
+        os.utime(first, (time.time() - 10, os.stat(first).st_mtime))
+        self.cache.put("b", self.report())
+        self.cache.put("c", self.report())
+        self.assertIsNotNone(self.cache.get("a", 60))
+        self.assertIsNone(self.cache.get("b", 60))
+        # Replaced while it's read, the reader still gets the result it opened
+        self.cache.put("a", self.report(b"new"))
+        self.assertEqual(b"0123456789", reader.read())
+        reader.close()
+        # ... and once closed it can be evicted again
+        os.utime(first, (time.time() - 10, os.stat(first).st_mtime))
+        self.cache.max_bytes = 10
+        self.cache.evict()
+        self.assertIsNone(self.cache.get("a", 60))
+
+    def test_too_large_results_are_left_alone(self):
+        path = self.report(b"x" * 26)
+        self.assertIsNone(self.cache.put("k", path))
+        self.assertTrue(os.path.exists(path))
+
+    def test_pending_results(self):
+        pending = self.cache.open("k", "report.csv")
+        pending.write(b"a,b\r\n")
+        self.assertIsNone(self.cache.get("k", 60))
+        with open(pending.commit(), "rb") as file:
+            self.assertEqual(b"a,b\r\n", file.read())
+        discarded = self.cache.open("other", "report.csv")
+        discarded.write(b"partial")
+        discarded.discard()
+        self.assertIsNone(self.cache.get("other", 60))
+        self.assertEqual(["k"], os.listdir(self.cache.directory))
+
+
+if __name__ == '__main__':
+    unittest.main()